@@ -0,0 +1,140 @@
+import hashlib
+import numpy
+import os
+from scipy import sparse
+
+
+KMEANS_ITERATIONS = 20
+CALIBRATION_SAMPLE_SIZE = 200
+
+
+def get_fingerprint(vectors: numpy.ndarray):
+    # Identifies the exact vectors an index was built from
+    if sparse.issparse(vectors):
+        vectors = vectors.tocsr()
+        arrays = [vectors.data.astype(numpy.float32), vectors.indices.astype(numpy.int64), vectors.indptr.astype(numpy.int64)]
+        return hashlib.sha256(b"".join(x.tobytes() for x in arrays) + str(vectors.shape).encode("utf-8")).hexdigest()
+    vectors = numpy.ascontiguousarray(vectors, dtype=numpy.float32)
+    return hashlib.sha256(vectors.tobytes() + str(vectors.shape).encode("utf-8")).hexdigest()
+
+
+def to_dense(matrix) -> numpy.ndarray:
+    # The products with sparse vectors can be sparse matrices, the small ones are used dense
+    return matrix.toarray() if sparse.issparse(matrix) else numpy.asarray(matrix)
+
+
+class MentorIndex:
+    """
+    Inverted file (IVF) index: the mentor vectors are clustered with k-means and a query only scans
+    the mentors in the 'probes_count' clusters whose centroids are closest to it.
+    Identical vectors (repeated answers) can leave k-means clusters empty, they are dropped, and the probes
+    skip empty lists anyway so that an index saved before still works.
+    The mentor vectors and the queries can be sparse (csr_matrix), the centroids are always dense.
+    """
+
+    def __init__(self, centroids: numpy.ndarray, list_ids: numpy.ndarray, fingerprint: str, probes_count: int = 1):
+        self.centroids = centroids
+        self.list_ids = list_ids  # the cluster of every mentor
+        self.fingerprint = fingerprint
+        self.probes_count = probes_count
+        order = numpy.argsort(list_ids, kind="stable")
+        bounds = numpy.searchsorted(list_ids[order], numpy.arange(len(centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+        self._sizes = numpy.diff(bounds)
+
+    @staticmethod
+    def build(vectors: numpy.ndarray, lists_count: int = None, random_seed: int = 0):
+        vectors = vectors.tocsr() if sparse.issparse(vectors) else numpy.asarray(vectors, dtype=numpy.float32)
+        vectors_count = vectors.shape[0]
+        if lists_count is None:
+            lists_count = max(1, int(numpy.sqrt(vectors_count)))
+        lists_count = max(1, min(lists_count, vectors_count))
+
+        rng = numpy.random.default_rng(random_seed)
+        centroids = to_dense(vectors[rng.choice(vectors_count, size=lists_count, replace=False)]).astype(numpy.float32)
+        list_ids = numpy.zeros(vectors_count, dtype=numpy.int64)
+        for _ in range(KMEANS_ITERATIONS):
+            # Maximum inner product clustering, the same measure the queries are ranked by
+            list_ids = numpy.argmax(vectors @ centroids.T, axis=1)
+            for i in range(lists_count):
+                members = vectors[list_ids == i]
+                if members.shape[0] > 0:
+                    centroids[i] = numpy.asarray(members.mean(axis=0)).ravel()
+
+        # Drop the empty clusters
+        used, list_ids = numpy.unique(list_ids, return_inverse=True)
+        return MentorIndex(centroids[used], list_ids.reshape(-1), get_fingerprint(vectors))
+
+    def get_lists_count(self):
+        # The non-empty lists
+        return int(numpy.count_nonzero(self._sizes))
+
+    def probe(self, queries: numpy.ndarray, probes_count: int = None, min_candidates: int = 0):
+        # Returns the non-empty clusters every query has to scan, closest first, as a (queries x probes) array.
+        # A query probes more than 'probes_count' clusters until they hold 'min_candidates' mentors (or all of them),
+        # the rows of the queries with fewer probes are padded with -1.
+        non_empty = numpy.flatnonzero(self._sizes)
+        probes_count = max(1, min(probes_count or self.probes_count, len(non_empty)))
+        if len(non_empty) == 0:
+            return numpy.full((queries.shape[0], 0), -1, dtype=numpy.int64)
+
+        centroid_scores = queries @ self.centroids[non_empty].T
+        order = numpy.argsort(-centroid_scores, axis=1, kind="stable")
+        candidates_counts = numpy.cumsum(self._sizes[non_empty][order], axis=1)
+        counts = numpy.maximum(probes_count, numpy.minimum((candidates_counts < min_candidates).sum(axis=1) + 1, len(non_empty)))
+        probes = non_empty[order[:, :counts.max()]]
+        probes[numpy.arange(probes.shape[1]) >= counts[:, None]] = -1
+        return probes
+
+    def get_list(self, list_id: int):
+        return self._lists[list_id]
+
+    def search(self, queries: numpy.ndarray, probes_count: int = None, min_candidates: int = 0):
+        # Returns the candidate mentor indices for every query
+        return [numpy.concatenate([self._lists[i] for i in query_probes if i >= 0] + [numpy.zeros(0, dtype=numpy.int64)])
+                for query_probes in self.probe(queries, probes_count, min_candidates)]
+
+    def calibrate(self, queries: numpy.ndarray, vectors: numpy.ndarray, top_k: int, recall_target: float, random_seed: int = 0,
+                  score=None):
+        # Picks the smallest probes count whose recall@top_k on a sample of the queries reaches the target.
+        # 'score(queries_indices)' gives those queries' scores of all the vectors, the ones the results are ranked by,
+        # the default is the queries' dot products with the vectors.
+        rng = numpy.random.default_rng(random_seed)
+        queries_count = queries.shape[0]
+        sample_indices = rng.choice(queries_count, size=min(CALIBRATION_SAMPLE_SIZE, queries_count), replace=False)
+        sample = queries[sample_indices]
+        top_k = min(top_k, vectors.shape[0])
+        exact_scores = score(sample_indices) if score is not None else to_dense(sample @ vectors.T)
+        for probes_count in range(1, max(self.get_lists_count(), 1) + 1):
+            self.probes_count = probes_count
+            if get_recall(self.search(sample, min_candidates=top_k), exact_scores, top_k) >= recall_target:
+                break
+        return self.probes_count
+
+    def save(self, file_path: str):
+        temp_file_path = f"{file_path}.tmp.npz"
+        numpy.savez(temp_file_path, centroids=self.centroids, list_ids=self.list_ids,
+                    fingerprint=numpy.array(self.fingerprint), probes_count=numpy.array(self.probes_count))
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def load(file_path: str, fingerprint: str):
+        # Returns None when there's no index or it was built from different vectors
+        if not os.path.exists(file_path):
+            return None
+
+        with numpy.load(file_path) as data:
+            if str(data["fingerprint"]) != fingerprint:
+                return None
+            return MentorIndex(data["centroids"], data["list_ids"], fingerprint, int(data["probes_count"]))
+
+
+def get_recall(candidates: list[numpy.ndarray], exact_scores: numpy.ndarray, top_k: int):
+    # Fraction of the best top_k candidates that score as high as the exact top_k-th best. The scores can tie
+    # (integer percents), so any of the tied results counts as found.
+    kth_best_scores = -numpy.partition(-exact_scores, top_k - 1, axis=1)[:, top_k - 1]
+    found = 0
+    for query_candidates, query_scores, kth_best_score in zip(candidates, exact_scores, kth_best_scores):
+        candidates_scores = numpy.sort(query_scores[query_candidates])[::-1][:top_k]
+        found += int((candidates_scores >= kth_best_score).sum())
+    return found / max(1, len(exact_scores) * top_k)
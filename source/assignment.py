@@ -0,0 +1,117 @@
+import numpy
+
+
+def solve_linear_assignment(cost: numpy.ndarray):
+    """
+    Minimum cost assignment of the rows of 'cost' to distinct columns (Hungarian algorithm, shortest augmenting paths).
+    Every row is assigned if rows <= columns, otherwise every column is.
+    Returns two arrays (row indices, column indices) of the assigned cells.
+    """
+    cost = numpy.asarray(cost, dtype=numpy.float64)
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = solve_linear_assignment(cost.T)
+        order = numpy.argsort(rows)
+        return rows[order], cols[order]
+
+    rows_count, cols_count = cost.shape
+    # 1-based potentials and matching, index 0 is the virtual column the augmenting path starts from
+    u = numpy.zeros(rows_count + 1)
+    v = numpy.zeros(cols_count + 1)
+    row_of_col = numpy.zeros(cols_count + 1, dtype=numpy.int64)
+    way = numpy.zeros(cols_count + 1, dtype=numpy.int64)
+    if rows_count == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+
+    # Warm start: reduce the rows (and the columns when square) and match greedily on the zero reduced cost cells.
+    # Only the rows left free need an augmenting path, which is what keeps big score matrices with many ties fast.
+    u[1:] = cost.min(axis=1)
+    if rows_count == cols_count:
+        v[1:] = (cost - u[1:, None]).min(axis=0)
+    tight_rows, tight_cols = numpy.nonzero(cost - u[1:, None] - v[None, 1:] <= 0)
+    matched_rows = numpy.zeros(rows_count + 1, dtype=bool)
+    for row, col in zip(tight_rows + 1, tight_cols + 1):
+        if not matched_rows[row] and row_of_col[col] == 0:
+            matched_rows[row] = True
+            row_of_col[col] = row
+
+    for i in numpy.nonzero(~matched_rows[1:])[0] + 1:
+        row_of_col[0] = i
+        frontier = numpy.zeros(1, dtype=numpy.int64)
+        min_slack = numpy.full(cols_count + 1, numpy.inf)
+        used = numpy.zeros(cols_count + 1, dtype=bool)
+        while True:
+            # Dijkstra step over all columns at the current distance at once, score ties make these sets large
+            used[frontier] = True
+            rows = row_of_col[frontier]
+            free = ~used
+            slack = cost[rows - 1] - u[rows, None] - v[None, 1:]
+            best_frontier = slack.argmin(axis=0)
+            best_slack = slack[best_frontier, numpy.arange(cols_count)]
+            improved = free[1:] & (best_slack < min_slack[1:])
+            min_slack[1:][improved] = best_slack[improved]
+            way[1:][improved] = frontier[best_frontier[improved]]
+
+            free_slack = numpy.where(free, min_slack, numpy.inf)
+            delta = free_slack.min()
+            u[row_of_col[used]] += delta
+            v[used] -= delta
+            min_slack[free] -= delta
+            frontier = numpy.nonzero(free_slack == delta)[0]
+            unmatched = frontier[row_of_col[frontier] == 0]
+            if len(unmatched) > 0:
+                col = unmatched[0]
+                break
+
+        # Flip the matching along the augmenting path
+        while col:
+            prev_col = way[col]
+            row_of_col[col] = row_of_col[prev_col]
+            col = prev_col
+
+    assigned_cols = numpy.nonzero(row_of_col[1:])[0]
+    assigned_rows = row_of_col[assigned_cols + 1] - 1
+    order = numpy.argsort(assigned_rows)
+    return assigned_rows[order], assigned_cols[order]
+
+
+def find_optimal_assignment(scores: numpy.ndarray, capacities: list[int], allowed: numpy.ndarray):
+    """
+    Assigns every row (student) to at most one column (mentor) so that the number of assigned rows is maximal
+    and the sum of their scores is maximal among those assignments.
+    Column j can take up to capacities[j] rows and only cells where 'allowed' is True can be assigned.
+    Returns a list of (row, column) pairs.
+    """
+    slot_cols = numpy.repeat(numpy.arange(scores.shape[1]), capacities)
+    if scores.shape[0] == 0 or len(slot_cols) == 0:
+        return list()
+
+    slot_scores = scores[:, slot_cols].astype(numpy.float64)
+    slot_allowed = allowed[:, slot_cols]
+    max_score = slot_scores.max(initial=0)
+    # Any forbidden cell costs more than all allowed cells of a full assignment together,
+    # so the solver only picks one when there's no way around it. These are dropped afterwards.
+    forbidden_cost = (max_score - slot_scores.min(initial=0) + 1) * (min(slot_scores.shape) + 1)
+    cost = numpy.where(slot_allowed, max_score - slot_scores, forbidden_cost)
+
+    rows, slots = solve_linear_assignment(cost)
+    return [(int(row), int(slot_cols[slot])) for row, slot in zip(rows, slots) if slot_allowed[row, slot]]
+
+
+def find_greedy_assignment(scores: numpy.ndarray, capacities: list[int], allowed: numpy.ndarray):
+    # Baseline: take the best remaining allowed pair while the row is free and the column has capacity
+    remaining = list(capacities)
+    assigned_rows = set()
+    assignment = list()
+    rows, cols = numpy.nonzero(allowed)
+    order = numpy.argsort(-scores[rows, cols], kind="stable")
+    for row, col in zip(rows[order], cols[order]):
+        if row in assigned_rows or remaining[col] == 0:
+            continue
+        assigned_rows.add(row)
+        remaining[col] -= 1
+        assignment.append((int(row), int(col)))
+        if len(assigned_rows) == scores.shape[0]:
+            break
+
+    assignment.sort()
+    return assignment
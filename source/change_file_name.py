@@ -1,6 +1,6 @@
 import os
-import csv
-import math
+from csv_reader import get_column_index, read_records
+from csv_snapshot import get_snapshots_directory
 
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
@@ -9,13 +9,6 @@ REGISTER_FILE_NAME = "student_register.csv"
 REGISTER_FILE_PATH = f"{CURRENT_DIRECTORY}/{REGISTER_FILE_NAME}"
 
 
-def get_column_index(column):
-    decimal_value = 0
-    for idx in reversed(range(0, len(column))):
-        decimal_value += (ord(column[idx]) - ord("A") + 1) * math.pow(26, len(column) - idx - 1)
-    return int(decimal_value - 1)
-
-
 STUDENT_NAME = get_column_index("D")
 MENTOR_NAME = get_column_index("CC")
 
@@ -23,15 +16,11 @@ MENTOR_NAME = get_column_index("CC")
 def rename_existing_profiles():
     mentor_student_map = {}
     try:
-        with open(REGISTER_FILE_PATH, encoding="utf-8", mode="r") as fstream:
-            reader = csv.reader(fstream, delimiter=',', quotechar='"')
-            next(reader)  # Skip header row
-
-            for row in reader:
-                student_name = row[STUDENT_NAME].strip()
-                mentor_name = row[MENTOR_NAME].strip()
-                if mentor_name:
-                    mentor_student_map[student_name] = mentor_name
+        for record in read_records(REGISTER_FILE_PATH, {"student_name": STUDENT_NAME, "mentor_name": MENTOR_NAME}, snapshots_directory=get_snapshots_directory()):
+            student_name = record.student_name.strip()
+            mentor_name = record.mentor_name.strip()
+            if mentor_name:
+                mentor_student_map[student_name] = mentor_name
     except Exception as e:
         print(f"Error reading the CSV file: {e}")
         return
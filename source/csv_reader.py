@@ -0,0 +1,148 @@
+import csv
+import operator
+import os
+from csv_snapshot import CsvColumns, CsvSnapshots, hash_file
+
+
+def get_column_index(column):
+    # 26 number system where [A...Z] is mapped to [1...26], the index is the decimal value minus 1
+    if isinstance(column, int):
+        return column
+
+    decimal_value = 0
+    for letter in column:
+        decimal_value = decimal_value * 26 + (ord(letter) - ord("A") + 1)
+    return decimal_value - 1
+
+
+def create_record_type(type_name: str, field_names: list[str]):
+    def __init__(self, *values):
+        for field_name, value in zip(field_names, values):
+            setattr(self, field_name, value)
+
+    def __repr__(self):
+        return f"{type_name}({', '.join(f'{name}={getattr(self, name)!r}' for name in field_names)})"
+
+    return type(type_name, (), {"__slots__": tuple(field_names), "__init__": __init__, "__repr__": __repr__})
+
+
+class RowProjector:
+    """
+    Picks only the needed columns out of a csv row and puts them in a compact record with __slots__.
+    'columns' maps every field to a column: a letter ("AK"), an index, a list of them (the field gets a tuple of the
+    values, in the given order) or None (the field is always empty).
+    The column letters are resolved and an operator.itemgetter of all the columns is made once, not for every row.
+    Rows that are too short to hold all the columns are projected to None.
+    """
+
+    def __init__(self, columns: dict, type_name: str = "Record"):
+        self.field_names = list(columns.keys())
+        self.record_type = create_record_type(type_name, self.field_names)
+
+        # The fields' column indices, a list of them or None as in 'columns'
+        self.columns = list()
+        # Where every field's values are in the itemgetter's tuple: a position, a slice or None for empty fields
+        self._positions = list()
+        indices = list()
+        for column in columns.values():
+            if column is None:
+                self.columns.append(None)
+                self._positions.append(None)
+            elif isinstance(column, (list, tuple)):
+                self.columns.append([get_column_index(c) for c in column])
+                self._positions.append(slice(len(indices), len(indices) + len(column)))
+                indices += self.columns[-1]
+            else:
+                self.columns.append(get_column_index(column))
+                self._positions.append(len(indices))
+                indices.append(self.columns[-1])
+        self.max_index = max(indices, default=-1)
+
+        # itemgetter returns a single value instead of a tuple for one index
+        if len(indices) == 1:
+            self._get_items = lambda row: (row[indices[0]],)
+        else:
+            self._get_items = operator.itemgetter(*indices) if indices else lambda row: ()
+        self._plain = all(isinstance(position, int) for position in self._positions)
+
+    def get_values(self, row: list[str]):
+        # The fields' values of a row as a tuple, None for short rows
+        if len(row) <= self.max_index:
+            return None
+        items = self._get_items(row)
+        if self._plain:
+            return items
+        return tuple("" if position is None else items[position] for position in self._positions)
+
+    def build(self, values: tuple):
+        return self.record_type(*values)
+
+    def __call__(self, row: list[str]):
+        values = self.get_values(row)
+        return self.build(values) if values is not None else None
+
+
+def read_rows(csv_file_path: str, skip_header: bool = True):
+    with open(csv_file_path, encoding="utf-8", mode="r") as fstream:
+        reader = csv.reader(fstream, delimiter=',', quotechar='"')
+        if skip_header:
+            next(reader, None)
+        yield from reader
+
+
+def iter_projected_values(csv_file_path: str, project: RowProjector, skip_header: bool = True):
+    # Yields the fields' values of every row with all the columns
+    for values in map(project.get_values, read_rows(csv_file_path, skip_header)):
+        if values is not None:
+            yield values
+
+
+def load_csv_columns(csv_file_path: str, snapshots_directory: str):
+    # The whole file parsed into typed columns, from its snapshot when there is one
+    snapshots = CsvSnapshots(snapshots_directory)
+    file_hash = hash_file(csv_file_path)
+    columns = snapshots.load(file_hash)
+    if columns is None:
+        columns = CsvColumns.parse(list(read_rows(csv_file_path, skip_header=False)))
+        snapshots.save(csv_file_path, file_hash, columns)
+    return columns
+
+
+def project_columns(columns: CsvColumns, project: RowProjector, skip_header: bool = True):
+    # The fields' values of every row with all the columns, the same as iter_projected_values gives for the file
+    rows = columns.get_rows(project.max_index + 1, start=1 if skip_header else 0)
+    empty_values = [()] * len(rows)
+    fields_values = list()
+    for column in project.columns:
+        if column is None:
+            fields_values.append([""] * len(rows))
+        elif isinstance(column, list):
+            fields_values.append(list(zip(*[columns.get_values(index, rows) for index in column])) if column else empty_values)
+        else:
+            fields_values.append(columns.get_values(column, rows))
+    return list(zip(*fields_values)) if fields_values else empty_values
+
+
+def load_projected_values(csv_file_path: str, project: RowProjector, skip_header: bool = True, snapshots_directory: str = None):
+    # Same as iter_projected_values, but projected from the file's snapshot (shared by every projection of the file)
+    # when 'snapshots_directory' is given
+    if snapshots_directory is None:
+        return iter_projected_values(csv_file_path, project, skip_header)
+    return project_columns(load_csv_columns(csv_file_path, snapshots_directory), project, skip_header)
+
+
+def read_records(csv_file_path: str, columns: dict, where=None, type_name: str = "Record", skip_header: bool = True,
+                 snapshots_directory: str = None):
+    # Yields a record of every row with all the columns for which where(record) is true (all rows when it's None).
+    # With a 'snapshots_directory' the parsed file is kept there for the next reads of any of its columns,
+    # without one (the default) the file is streamed row by row.
+    project = RowProjector(columns, type_name)
+    for values in load_projected_values(csv_file_path, project, skip_header, snapshots_directory):
+        record = project.build(values)
+        if where is None or where(record):
+            yield record
+
+
+def join_lines(values) -> str:
+    # Joins the values of a multi-column field the way the registry scripts always did, every value on its own line
+    return "".join(f"{value}{os.linesep}" for value in values)
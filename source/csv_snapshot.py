@@ -0,0 +1,160 @@
+import hashlib
+import numpy
+import os
+import sys
+
+
+SNAPSHOTS_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "csv_snapshots").replace("\\", "/")
+SNAPSHOT_VERSION = 3
+HASH_CHUNK_SIZE = 2 ** 20
+
+
+def get_snapshots_directory():
+    # The snapshots are opt-in: '--csv-snapshots' keeps them in SNAPSHOTS_DIRECTORY, '--csv-snapshots=<directory>'
+    # in the given one. Without it (None) the csv files are parsed on every run.
+    for arg in sys.argv[1:]:
+        if arg == "--csv-snapshots":
+            return SNAPSHOTS_DIRECTORY
+        if arg.startswith("--csv-snapshots="):
+            return arg[len("--csv-snapshots="):]
+    return None
+
+
+def hash_file(file_path: str):
+    file_hash = hashlib.sha256()
+    with open(file_path, mode="rb") as file_stream:
+        for chunk in iter(lambda: file_stream.read(HASH_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def encode_values(values: list[str]):
+    # The codes of the values (numpy int32) and the distinct values in the order of their first row
+    codes_by_value = dict()
+    codes = numpy.fromiter((codes_by_value.setdefault(value, len(codes_by_value)) for value in values),
+                           dtype=numpy.int32, count=len(values))
+    categories = numpy.empty(len(codes_by_value), dtype=object)
+    categories[:] = list(codes_by_value)
+    return codes, categories
+
+
+class CsvColumns:
+    """
+    A whole csv file (the header included) parsed once into typed columns, so that any projection of it is made
+    without parsing the text again.
+    Every column keeps the numpy codes of its rows' values and its distinct values, like a pandas categorical.
+    The cells past the end of short rows are empty strings, the rows' lengths tell them apart.
+    The columns of a snapshot keep their distinct values packed (see pack_categories) until they're first used.
+    """
+
+    def __init__(self, lengths: numpy.ndarray, columns: list[tuple], packed: bool = False):
+        self.lengths = lengths
+        self.columns = columns
+        self.packed = [packed] * len(columns)
+
+    @staticmethod
+    def parse(rows: list[list[str]]):
+        lengths = numpy.fromiter(map(len, rows), dtype=numpy.int32, count=len(rows))
+        columns_count = int(lengths.max(initial=0))
+        columns = [encode_values([row[i] if i < len(row) else "" for row in rows]) for i in range(columns_count)]
+        return CsvColumns(lengths, columns)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def get_rows(self, min_length: int, start: int = 0):
+        # The indices of the rows from 'start' on with at least 'min_length' cells
+        return numpy.flatnonzero(self.lengths[start:] >= min_length) + start
+
+    def get_column(self, index: int):
+        # The codes and the distinct values of a column, every row of a column past the last one is empty
+        if index < len(self.columns):
+            if self.packed[index]:
+                codes, text, offsets = self.columns[index]
+                self.columns[index] = (codes, unpack_categories(text, offsets))
+                self.packed[index] = False
+            return self.columns[index]
+        return numpy.zeros(len(self.lengths), dtype=numpy.int32), numpy.array([""], dtype=object)
+
+    def get_values(self, index: int, rows: numpy.ndarray):
+        codes, categories = self.get_column(index)
+        return categories[codes[rows]].tolist()
+
+
+def pack_categories(categories: numpy.ndarray):
+    # The distinct values as one utf-8 text and the values' end offsets in it (in characters), numpy arrays
+    # that are loaded without pickle
+    text = "".join(categories.tolist())
+    offsets = numpy.cumsum(numpy.fromiter(map(len, categories), dtype=numpy.int64, count=len(categories)))
+    return numpy.frombuffer(text.encode("utf-8"), dtype=numpy.uint8), offsets
+
+
+def unpack_categories(text: numpy.ndarray, offsets: numpy.ndarray):
+    text = text.tobytes().decode("utf-8")
+    starts = [0] + offsets[:-1].tolist()
+    categories = numpy.empty(len(offsets), dtype=object)
+    categories[:] = [text[start:end] for start, end in zip(starts, offsets.tolist())]
+    return categories
+
+
+class CsvSnapshots:
+    """
+    The parsed csv files (CsvColumns), stored as numpy arrays (.npz, loaded without pickle) by the sha256 of the
+    files' content, so that the next run of any script reading the same file takes whichever columns it needs
+    without parsing the text again.
+    A changed file has a different hash and gets a new snapshot, which replaces the file's older one.
+    """
+
+    def __init__(self, directory: str = SNAPSHOTS_DIRECTORY):
+        self.directory = directory
+
+    def _snapshot_file_name(self, csv_file_path: str, file_hash: str):
+        # The file's path and content, a file with the same content under another path has the same snapshot
+        path_hash = hashlib.sha256(os.path.realpath(csv_file_path).encode("utf-8")).hexdigest()[:16]
+        return f"{path_hash}.{file_hash}.npz"
+
+    def _find_snapshot_file_path(self, file_hash: str):
+        if os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(f".{file_hash}.npz"):
+                    return f"{self.directory}/{file_name}"
+        return None
+
+    def load(self, file_hash: str):
+        # Returns the file's CsvColumns or None when there's no valid snapshot
+        snapshot_file_path = self._find_snapshot_file_path(file_hash)
+        if snapshot_file_path is None:
+            return None
+
+        try:
+            with numpy.load(snapshot_file_path, allow_pickle=False) as snapshot:
+                if int(snapshot["version"]) != SNAPSHOT_VERSION or str(snapshot["file_hash"]) != file_hash:
+                    return None
+                columns = [(snapshot[f"codes_{i}"], snapshot[f"text_{i}"], snapshot[f"offsets_{i}"])
+                           for i in range(int(snapshot["columns_count"]))]
+                return CsvColumns(snapshot["lengths"], columns, packed=True)
+        except (OSError, ValueError, KeyError, UnicodeDecodeError):
+            return None
+
+    def save(self, csv_file_path: str, file_hash: str, columns: CsvColumns):
+        # The snapshots hold the files' personal data, only the user can open their directory
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+        arrays = {"version": numpy.int64(SNAPSHOT_VERSION), "file_hash": numpy.str_(file_hash),
+                  "lengths": columns.lengths, "columns_count": numpy.int64(len(columns.columns))}
+        for i in range(len(columns.columns)):
+            codes, categories = columns.get_column(i)
+            arrays[f"codes_{i}"] = codes
+            arrays[f"text_{i}"], arrays[f"offsets_{i}"] = pack_categories(categories)
+
+        snapshot_file_name = self._snapshot_file_name(csv_file_path, file_hash)
+        temp_file_path = f"{self.directory}/{snapshot_file_name}.tmp"
+        with open(temp_file_path, mode="wb") as file_stream:
+            numpy.savez(file_stream, **arrays)
+        os.replace(temp_file_path, f"{self.directory}/{snapshot_file_name}")
+
+        # The same file's older snapshots
+        path_prefix = snapshot_file_name.split(".")[0] + "."
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(path_prefix) and file_name.endswith(".npz") and file_name != snapshot_file_name:
+                os.remove(f"{self.directory}/{file_name}")
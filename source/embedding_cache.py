@@ -0,0 +1,157 @@
+import hashlib
+import json
+import numpy
+import os
+from quantization import FLOAT32, QuantizedVectors
+
+
+# Entries above this count are evicted, least recently used first
+DEFAULT_MAX_ENTRIES = 200000
+
+INDEX_FILE_NAME = "index.json"
+VECTORS_FILE_NAME = "vectors.npy"
+SCALES_FILE_NAME = "scales.npy"
+
+
+def hash_text(text: str):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent store of text embeddings for a single model.
+    The vectors live in one memory-mapped .npy file and the index maps sha256(text) to a row in it.
+    They can be stored as float16 or int8 (with the per-vector scales in another .npy file) to make the cache smaller.
+    """
+
+    def __init__(self, directory: str, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES, dtype: str = FLOAT32):
+        model_hash = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16]
+        self.directory = f"{directory}/{model_hash}"
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+        self._clock = 0
+        self._entries = dict()  # text hash -> [row, last used clock]
+        self._vectors = None  # memory-mapped quantized vectors from the previous save
+        self._new_vectors = dict()  # text hash -> vector, added since the last save
+        self._load()
+
+    def _index_file_path(self):
+        return f"{self.directory}/{INDEX_FILE_NAME}"
+
+    def _vectors_file_path(self):
+        return f"{self.directory}/{VECTORS_FILE_NAME}"
+
+    def _scales_file_path(self):
+        return f"{self.directory}/{SCALES_FILE_NAME}"
+
+    def _load_vectors(self):
+        values = numpy.load(self._vectors_file_path(), mmap_mode="r")
+        scales = numpy.load(self._scales_file_path()) if os.path.exists(self._scales_file_path()) else None
+        return QuantizedVectors(values, scales)
+
+    def _load(self):
+        if not os.path.exists(self._index_file_path()) or not os.path.exists(self._vectors_file_path()):
+            return
+
+        with open(self._index_file_path(), mode="r", encoding="utf-8") as file_stream:
+            index = json.load(file_stream)
+
+        if index["model_name"] != self.model_name or index.get("dtype", FLOAT32) != self.dtype:
+            return
+
+        self._clock = index["clock"]
+        self._entries = index["entries"]
+        self._vectors = self._load_vectors()
+
+    def __len__(self):
+        return len(self._entries) + len(self._new_vectors)
+
+    def get(self, text: str):
+        key = hash_text(text)
+        self._clock += 1
+        if key in self._new_vectors:
+            self.hits += 1
+            return self._new_vectors[key]
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry[1] = self._clock
+        return self._vectors[[entry[0]]].dequantize()[0]
+
+    def put(self, text: str, vector: numpy.ndarray):
+        self._new_vectors[hash_text(text)] = numpy.asarray(vector, dtype=numpy.float32)
+
+    def encode(self, model, texts: list[str]) -> numpy.ndarray:
+        # Returns the embeddings of all texts, encoding only the ones missing from the cache in one batch
+        vectors = [self.get(text) for text in texts]
+        missing_indices = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing_indices:
+            encoded = model.encode([texts[i] for i in missing_indices], convert_to_numpy=True)
+            for i, vector in zip(missing_indices, encoded):
+                self.put(texts[i], vector)
+                vectors[i] = vector
+
+        if not vectors:
+            return numpy.zeros((0, 0), dtype=numpy.float32)
+        return numpy.stack(vectors).astype(numpy.float32, copy=False)
+
+    def save(self):
+        if not self._new_vectors:
+            self._save_index()
+            return
+
+        # Keep the most recently used entries, the ones added in this session are always the newest
+        old_keys = sorted(self._entries.keys(), key=lambda k: self._entries[k][1], reverse=True)
+        new_keys = list(self._new_vectors.keys())
+        old_keys = [k for k in old_keys if k not in self._new_vectors]
+        old_keys = old_keys[:max(0, self.max_entries - len(new_keys))]
+        new_keys = new_keys[:self.max_entries]
+
+        dimension = len(next(iter(self._new_vectors.values())))
+        vectors = numpy.empty((len(old_keys) + len(new_keys), dimension), dtype=numpy.float32)
+        entries = dict()
+        if old_keys:
+            vectors[:len(old_keys)] = self._vectors[[self._entries[k][0] for k in old_keys]].dequantize()
+        for row, key in enumerate(old_keys):
+            entries[key] = [row, self._entries[key][1]]
+        for row, key in enumerate(new_keys, start=len(old_keys)):
+            vectors[row] = self._new_vectors[key]
+            entries[key] = [row, self._clock]
+
+        os.makedirs(self.directory, exist_ok=True)
+        quantized = QuantizedVectors.quantize(vectors, self.dtype)
+        temp_vectors_file_path = f"{self._vectors_file_path()}.tmp.npy"
+        numpy.save(temp_vectors_file_path, quantized.values)
+        self._vectors = None  # release the memory map before replacing the file
+        os.replace(temp_vectors_file_path, self._vectors_file_path())
+        if quantized.scales is not None:
+            numpy.save(self._scales_file_path(), quantized.scales)
+        elif os.path.exists(self._scales_file_path()):
+            os.remove(self._scales_file_path())
+
+        self._entries = entries
+        self._new_vectors = dict()
+        self._save_index()
+        self._vectors = self._load_vectors()
+
+    def _save_index(self):
+        if not os.path.exists(self.directory):
+            return
+
+        index = {
+            "model_name": self.model_name,
+            "dtype": self.dtype,
+            "clock": self._clock,
+            "entries": self._entries,
+        }
+        temp_index_file_path = f"{self._index_file_path()}.tmp"
+        with open(temp_index_file_path, mode="w", encoding="utf-8") as file_stream:
+            json.dump(index, file_stream)
+        os.replace(temp_index_file_path, self._index_file_path())
@@ -0,0 +1,66 @@
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+
+DEFAULT_BATCH_SIZE = 32  # the same as SentenceTransformer.encode
+BATCHES_PER_TASK = 4  # batches sent to a worker at once, each still encoded on its own
+
+_worker_model = None
+
+
+def _init_worker(model_name: str):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(1)  # the parallelism comes from the processes, not from torch's threads
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_task(texts: list[str], batch_size: int):
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class EncodingPool:
+    """
+    Encodes texts with a SentenceTransformer model on several processes, each with its own copy of the model.
+    Has the same encode() as the model, so it can be passed wherever the model is. The batches are the same as the
+    model's, the embeddings can differ from a serial encode only in float rounding, as torch runs on one thread
+    in every worker.
+    """
+
+    def __init__(self, model_name: str, workers_count: int, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.model_name = model_name
+        self.workers_count = workers_count
+        self.batch_size = batch_size
+        self._executor = ProcessPoolExecutor(max_workers=workers_count, initializer=_init_worker, initargs=(model_name,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def encode(self, texts: list[str], convert_to_numpy: bool = True, **kwargs) -> numpy.ndarray:
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        if not texts:
+            return numpy.zeros((0, 0), dtype=numpy.float32)
+
+        # SentenceTransformer.encode orders the texts with numpy.argsort([-len(text)]) and cuts the order into batches,
+        # do exactly the same and encode every batch on its own so that it holds the same texts (and padding)
+        # as in a single process
+        order = numpy.argsort([-len(text) for text in texts])
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        results = self._executor.map(_encode_task, [[texts[i] for i in batch] for batch in batches],
+                                     repeat(self.batch_size), chunksize=BATCHES_PER_TASK)
+
+        embeddings = None
+        for batch, batch_embeddings in zip(batches, results):
+            if embeddings is None:
+                embeddings = numpy.empty((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+            embeddings[batch] = batch_embeddings
+        return embeddings
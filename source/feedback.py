@@ -1,7 +1,7 @@
 import os
 import docx
-import math
 import pandas as pd
+from csv_reader import get_column_index
 
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
@@ -10,15 +10,6 @@ FEEDBACK_FILE_NAME = "feedback.csv"
 FEEDBACK_FILE_PATH = f"{CURRENT_DIRECTORY}/{FEEDBACK_FILE_NAME}"
 
 
-def get_column_index(column):
-    # 26 number system where [A...Z] is mapped to [1...26]
-    decimal_value = 0
-    for idx in reversed(range(0, len(column))):
-        decimal_value += (ord(column[idx]) - ord("A") + 1) * math.pow(26, len(column) - idx - 1)
-
-    return int(decimal_value - 1)  # the index is the decimal value minus 1
-
-
 NUM_TABLE_COLUMNS = 3
 EMAIL_IDX = get_column_index("B")
 NAME_IDX = get_column_index("C")
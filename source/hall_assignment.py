@@ -0,0 +1,71 @@
+MAX_LOCAL_SEARCH_ROUNDS = 10000
+
+
+def get_durations_key(counts: list[int], get_duration):
+    # The bins' durations, longest first. A smaller key is a better assignment: a shorter longest bin,
+    # then a shorter second longest one and so on.
+    return sorted((get_duration(count) for count in counts), reverse=True)
+
+
+def find_balanced_assignment(sizes: list[int], bins_count: int, pinned: dict, get_duration):
+    """
+    Assigns indivisible groups of items ('sizes' holds every group's count of items) to bins,
+    so that the longest bin is as short as possible.
+    get_duration(items_count) is a bin's duration, it must not decrease when the count grows.
+    'pinned' maps a group's index to the bin it has to go to.
+    The free groups are placed biggest first in the bin that ends first (LPT), then a local search moves a group
+    out of the longest bin, or swaps it with a smaller group of another bin, for as long as that improves the key.
+    Returns the bin of every group.
+    """
+    bins = [None] * len(sizes)
+    counts = [0] * bins_count
+    for group, pinned_bin in pinned.items():
+        bins[group] = pinned_bin
+        counts[pinned_bin] += sizes[group]
+
+    # Equal sizes keep the groups' order, so the result depends only on the input
+    free_groups = sorted((group for group in range(len(sizes)) if group not in pinned), key=lambda group: -sizes[group])
+    for group in free_groups:
+        first_bin = min(range(bins_count), key=lambda b: (get_duration(counts[b] + sizes[group]), b))
+        bins[group] = first_bin
+        counts[first_bin] += sizes[group]
+
+    if free_groups:
+        refine_assignment(sizes, bins, counts, set(free_groups), get_duration)
+    return bins
+
+
+def refine_assignment(sizes: list[int], bins: list[int], counts: list[int], free_groups: set, get_duration):
+    # Local search on 'bins' and 'counts', in place. Only the groups' sizes matter for the durations, so for every
+    # bin just one group of every size is tried.
+    bins_count = len(counts)
+    key = get_durations_key(counts, get_duration)
+    for _ in range(MAX_LOCAL_SEARCH_ROUNDS):
+        groups_by_size = [dict() for _ in range(bins_count)]
+        for group in free_groups:
+            groups_by_size[bins[group]].setdefault(sizes[group], group)
+
+        longest = max(range(bins_count), key=lambda b: (get_duration(counts[b]), -b))
+        best = None
+        for size, group in groups_by_size[longest].items():
+            for other in range(bins_count):
+                if other == longest:
+                    continue
+
+                # Move the group, or swap it with a smaller one of the other bin
+                candidates = [(0, None)] + [(other_size, other_group) for other_size, other_group in groups_by_size[other].items() if other_size < size]
+                for other_size, other_group in candidates:
+                    new_counts = list(counts)
+                    new_counts[longest] -= size - other_size
+                    new_counts[other] += size - other_size
+                    new_key = get_durations_key(new_counts, get_duration)
+                    if new_key < (best[0] if best is not None else key):
+                        best = (new_key, group, other_group, other, new_counts)
+
+        if best is None:
+            break
+
+        key, group, other_group, other, counts[:] = best
+        bins[group] = other
+        if other_group is not None:
+            bins[other_group] = longest
@@ -1,10 +1,14 @@
-import csv
 import logging
 import os
+import queue
 import smtplib
 import ssl
 import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
+from csv_reader import read_records
+from csv_snapshot import get_snapshots_directory
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
@@ -15,6 +19,9 @@ from email.mime.multipart import MIMEMultipart
 # 1. $ python -m aiosmtpd -n (for python 3.12+)
 # 1. $ python -m smtpd -c DebuggingServer -n localhost:8025 (for python 3.11-)
 # 2. $ python mail_sender.py --debug
+#
+# The mails are sent over a pool of smtp sessions, --connections=N overrides the config's connections,
+# --rate=M the config's messages_per_minute (0 is no limit).
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
 CONFIG_FILE_NAME = "mail_sender.xml"
@@ -30,12 +37,25 @@ CSV_FILE_NAME = "file_name"
 CSV_RECEIVER_NAME_INDEX = "receiver_name_index"
 CSV_RECEIVER_EMAIL_INDEX = "receiver_email_index"
 CSV_ATTACHMENT_FILE_INDEX = "attachment_file_index"
+CONNECTIONS = "connections"
+MESSAGES_PER_MINUTE = "messages_per_minute"
+
+# Delivery, when the config has no delivery node
+DEFAULT_CONNECTIONS = 4
+DEFAULT_MESSAGES_PER_MINUTE = 0
 
 logging.basicConfig(filename=f"{CURRENT_DIRECTORY}/mail_sender.log", filemode="w", level=logging.DEBUG)
 
 
 def in_debug_mode():
-    return len(sys.argv) > 1 and sys.argv[1] == "--debug"
+    return "--debug" in sys.argv[1:]
+
+
+def get_int_arg(name: str, default: int):
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return int(arg[len(f"--{name}="):])
+    return default
 
 
 def log(message: str):
@@ -69,6 +89,13 @@ def get_config():
     config[CSV_RECEIVER_NAME_INDEX] = int(csv_node.find(CSV_RECEIVER_NAME_INDEX).text)
     config[CSV_RECEIVER_EMAIL_INDEX] = int(csv_node.find(CSV_RECEIVER_EMAIL_INDEX).text)
     config[CSV_ATTACHMENT_FILE_INDEX] = int(csv_node.find(CSV_ATTACHMENT_FILE_INDEX).text)
+
+    # Delivery
+    delivery_node = root_node.find("delivery")
+    connections = delivery_node.findtext(CONNECTIONS) if delivery_node is not None else None
+    messages_per_minute = delivery_node.findtext(MESSAGES_PER_MINUTE) if delivery_node is not None else None
+    config[CONNECTIONS] = get_int_arg("connections", int(connections) if connections else DEFAULT_CONNECTIONS)
+    config[MESSAGES_PER_MINUTE] = get_int_arg("rate", int(messages_per_minute) if messages_per_minute else DEFAULT_MESSAGES_PER_MINUTE)
     return config
 
 
@@ -77,6 +104,15 @@ def get_csv_file_path(csv_file_name: str):
     return csv_file_path
 
 
+def get_receivers_columns(config):
+    # A negative attachment index means the mails have no attachments
+    attachment_file_index = config[CSV_ATTACHMENT_FILE_INDEX]
+    return {
+        "email": config[CSV_RECEIVER_EMAIL_INDEX],
+        "attachment_file_name": attachment_file_index if attachment_file_index > -1 else None,
+    }
+
+
 def get_attachments_folder_path(attachments_folder_name: str):
     attachments_folder_path = f"{CURRENT_DIRECTORY}/{attachments_folder_name}"
     return attachments_folder_path
@@ -111,48 +147,129 @@ def create_message(
     return message
 
 
-def send_mails():
-    try:
-        smtp_server = "localhost" if in_debug_mode() else "smtp.gmail.com"
-        port = 8025 if in_debug_mode() else 587  # For starttls
-        server = smtplib.SMTP(smtp_server, port)
+def open_session(config):
+    smtp_server = "localhost" if in_debug_mode() else "smtp.gmail.com"
+    port = 8025 if in_debug_mode() else 587  # For starttls
+    server = smtplib.SMTP(smtp_server, port)
+    server.ehlo()
+    if not in_debug_mode():
+        context = ssl.create_default_context()
+        server.starttls(context=context)  # Secure the connection
         server.ehlo()
-        if not in_debug_mode():
-            context = ssl.create_default_context()
-            server.starttls(context=context)  # Secure the connection
-            server.ehlo()
+        server.login(config[SENDER_EMAIL], config[PASSWORD])
+    return server
 
-        config = get_config()
-        sender_email = config[SENDER_EMAIL]
-        if not in_debug_mode():
-            password = config[PASSWORD]
-            server.login(sender_email, password)
-
-        csv_file_path = get_csv_file_path(config[CSV_FILE_NAME])
-        with open(csv_file_path, encoding="utf-8", mode="r") as fstream:
-            reader = csv.reader(fstream, delimiter=',', quotechar='"')
-            for idx, row in enumerate(reader):
-                if idx == 0:
-                    continue  # skip first row
-                subject = config[SUBJECT]
-                body = config[BODY]
-                receiver_email = row[config[CSV_RECEIVER_EMAIL_INDEX]]
+
+def close_session(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+class RateLimiter:
+    """
+    Spaces the messages evenly so that all sessions together send at most 'messages_per_minute' (0 is no limit).
+    Every call reserves the next free moment and waits for it.
+    """
+
+    def __init__(self, messages_per_minute: int):
+        self.interval = 60 / messages_per_minute if messages_per_minute > 0 else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.interval == 0:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            send_time = max(now, self.next_time)
+            self.next_time = send_time + self.interval
+        time.sleep(max(send_time - now, 0))
+
+
+class Delivery:
+    def __init__(self, receiver_email: str, attachment_file_name: str, attachment_file_path: str):
+        self.receiver_email = receiver_email
+        self.attachment_file_name = attachment_file_name
+        self.attachment_file_path = attachment_file_path
+
+
+def get_deliveries(config):
+    deliveries = list()
+    csv_file_path = get_csv_file_path(config[CSV_FILE_NAME])
+    for record in read_records(csv_file_path, get_receivers_columns(config), snapshots_directory=get_snapshots_directory()):
+        attachment_file_name = None
+        attachment_file_path = None
+        if record.attachment_file_name:
+            attachment_file_name = record.attachment_file_name
+            attachment_file_path = f"{get_attachments_folder_path(config[ATTACHMENTS_FOLDER_NAME])}/{attachment_file_name}"
+            if not os.path.exists(attachment_file_path):
                 attachment_file_name = None
                 attachment_file_path = None
-                if config[CSV_ATTACHMENT_FILE_INDEX] > -1 and row[config[CSV_ATTACHMENT_FILE_INDEX]]:
-                    attachment_file_name = row[config[CSV_ATTACHMENT_FILE_INDEX]]
-                    attachment_file_path = f"{get_attachments_folder_path(config[ATTACHMENTS_FOLDER_NAME])}/{attachment_file_name}"
-                    if not os.path.exists(attachment_file_path):
-                        attachment_file_name = None
-                        attachment_file_path = None
-                message = create_message(sender_email, receiver_email, subject, body, attachment_file_path)
-
-                log(f"Sending email to '{receiver_email}' | Attached file: '{attachment_file_name}'")
-                server.sendmail(sender_email, receiver_email, message.as_string())
+        deliveries.append(Delivery(record.email, attachment_file_name, attachment_file_path))
+    return deliveries
+
+
+def send_from_queue(config, deliveries: queue.Queue, rate_limiter: RateLimiter, results: list):
+    # A worker with its own session, until the queue is empty. A dropped session is opened again,
+    # a message that fails is logged and the worker goes on with the next one.
+    try:
+        server = open_session(config)
     except Exception as ex:
-        log_error(ex)
+        log_error(f"Failed to open an smtp session: {ex}")
+        return
+
+    sender_email = config[SENDER_EMAIL]
+    try:
+        while True:
+            try:
+                delivery = deliveries.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                message = create_message(sender_email, delivery.receiver_email, config[SUBJECT], config[BODY], delivery.attachment_file_path)
+                rate_limiter.wait()
+                log(f"Sending email to '{delivery.receiver_email}' | Attached file: '{delivery.attachment_file_name}'")
+                try:
+                    server.sendmail(sender_email, delivery.receiver_email, message.as_string())
+                except smtplib.SMTPServerDisconnected:
+                    server = open_session(config)
+                    server.sendmail(sender_email, delivery.receiver_email, message.as_string())
+                results.append(True)
+            except Exception as ex:
+                log_error(f"Failed to send email to '{delivery.receiver_email}': {ex}")
+                results.append(False)
     finally:
-        server.quit()
+        close_session(server)
+
+
+def send_mails():
+    try:
+        config = get_config()
+        deliveries = queue.Queue()
+        for delivery in get_deliveries(config):
+            deliveries.put(delivery)
+
+        # Every worker has its own session, the queue and the rate limit are shared
+        rate_limiter = RateLimiter(config[MESSAGES_PER_MINUTE])
+        results = list()
+        workers = [threading.Thread(target=send_from_queue, args=(config, deliveries, rate_limiter, results))
+                   for _ in range(max(min(config[CONNECTIONS], deliveries.qsize()), 1))]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # The messages left in the queue when no session could be opened aren't sent either
+        deliveries_count = len(results) + deliveries.qsize()
+        log(f"Sent {results.count(True)} of {deliveries_count} emails over {len(workers)} connections "
+            f"in {time.perf_counter() - start:.1f}s")
+    except Exception as ex:
+        log_error(ex)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,26 @@
-import csv
-import math
+import json
+import numpy
 import os
-from sentence_transformers import SentenceTransformer, util
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from ann_index import MentorIndex, get_fingerprint
+from assignment import find_optimal_assignment
+from csv_reader import get_column_index, join_lines, read_records
+from csv_snapshot import get_snapshots_directory
+from embedding_cache import EmbeddingCache
+from encoding_pool import EncodingPool
+from match_records import COMPONENTS, MatchRecords
+from profiler import StageProfiler
+from quantization import DTYPES, FLOAT32, QuantizedVectors, as_float32, dot, dot_rows
+from scipy import sparse
+from similarity_state import SimilarityState, hash_fields, update_similarity_state
+from tfidf_encoder import SparseRow, TfidfEncoder, normalize_sparse_rows, split_rows, stack_rows
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
@@ -10,15 +29,41 @@ STUDENTS_CSV_FILE_PATH = f"{CURRENT_DIRECTORY}/{STUDENTS_CSV_FILE_NAME}"
 MENTORS_CSV_FILE_NAME = "match_data_mentors.csv"
 MENTORS_CSV_FILE_PATH = f"{CURRENT_DIRECTORY}/{MENTORS_CSV_FILE_NAME}"
 AI_MODEL_FILE_PATH = f"{CURRENT_DIRECTORY}/ai_models/paraphrase-multilingual-MiniLM-L12-v2"
-
-
-def get_column_index(column):
-    # 26 number system where [A...Z] is mapped to [1...26]
-    decimal_value = 0
-    for idx in reversed(range(0, len(column))):
-        decimal_value += (ord(column[idx]) - ord("A") + 1) * math.pow(26, len(column) - idx - 1)
-
-    return int(decimal_value - 1)  # the index is the decimal value minus 1
+MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+# MODEL_NAME = AI_MODEL_FILE_PATH
+# Scoring backends (--backend=...): the SentenceTransformer model or TF-IDF over character n-grams.
+# TF-IDF doesn't need torch and is good enough for quick iterations on the weights and the threshold.
+TRANSFORMER_BACKEND = "transformer"
+TFIDF_BACKEND = "tfidf"
+BACKENDS = [TRANSFORMER_BACKEND, TFIDF_BACKEND]
+SCORING_BACKEND = TRANSFORMER_BACKEND
+EMBEDDING_CACHE_DIRECTORY = f"{CURRENT_DIRECTORY}/embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+# The embeddings are stored and scored as float32, float16 or int8 (--dtype=...).
+# The smaller types cut the memory and the cache size 2-4x for a small loss of precision (see match_benchmark.py quantization).
+EMBEDDING_DTYPE = FLOAT32
+MATCHES_FILE_NAME = "matches.txt"
+# Structured mode (--structured) also writes every listed pair with its component scores as csv and as binary columns
+# (match_records.MatchRecords.load reads the latter)
+MATCHES_CSV_FILE_NAME = "matches.csv"
+MATCHES_RECORDS_FILE_NAME = "matches.npz"
+STRUCTURED_BATCH_SIZE = 65536
+# Profiling mode (--profile) writes the time and memory of every stage to this file
+PROFILE_FILE_NAME = "match_profile.json"
+# Streaming mode (--stream): the pairs are scored in tiles of STREAM_TILE_SIZE x STREAM_TILE_SIZE and only the best
+# STREAM_TOP_K mentors of every student are kept, so the memory doesn't grow with students x mentors
+STREAM_TILE_SIZE = 1024
+STREAM_TOP_K = 20
+# Encoding on several processes (--workers=N), 1 encodes in this process
+ENCODING_WORKERS_COUNT = 1
+ENCODING_BATCH_SIZE = 32
+# The similarity matrix of the last run, only new or edited people are scored again
+SIMILARITY_STATE_FILE_PATH = f"{CURRENT_DIRECTORY}/match_state.npz"
+
+# Matcher server (match_server.py), used by the client mode (--client)
+MATCH_SERVER_HOST = "localhost"
+MATCH_SERVER_PORT = 8765
 
 
 # Column indices in the students' csv file
@@ -57,6 +102,27 @@ SIMILARITY_PERCENT_DISCARD_THRESHOLD = 50
 MIN_HOURS_PER_WEEK = 1
 MAX_HOURS_PER_WEEK = 6
 
+# Assignment mode (--assign): every student gets at most one mentor and the total similarity is maximized.
+# Pairs below SIMILARITY_PERCENT_DISCARD_THRESHOLD are never assigned.
+ASSIGNMENTS_FILE_NAME = "assignments.txt"
+MENTOR_CAPACITY = 1  # how many students a mentor can take
+MENTOR_CAPACITIES = {
+    # "Mentor Name": 2,
+}
+FORBIDDEN_PAIRS = {
+    # ("Student Name", "Mentor Name"),
+}
+
+# Approximate nearest neighbour mode (--ann): only the mentors in the index's closest clusters are scored
+# and at most ANN_TOP_K suggestions are listed per student
+ANN_INDEX_FILE_PATH = f"{CURRENT_DIRECTORY}/match_data_mentors.ann.npz"
+ANN_LISTS_COUNT = None  # the square root of the mentors' count when None
+ANN_TOP_K = 10
+ANN_RECALL_TARGET = 0.95
+
+
+profiler = StageProfiler()
+
 
 class PersonData:
     def __init__(self):
@@ -79,17 +145,17 @@ class PersonData:
         result += f"Hours/Week: {self.hours_per_week}{os.linesep}"
         return result
 
-    def interests_enc(self, model: SentenceTransformer):
+    def interests_enc(self, model: "SentenceTransformer"):
         if self._encoded_interests is None:
             self._encoded_interests = model.encode(self.interests)
         return self._encoded_interests
 
-    def hobbies_enc(self, model: SentenceTransformer):
+    def hobbies_enc(self, model: "SentenceTransformer"):
         if self._encoded_hobbies is None:
             self._encoded_hobbies = model.encode(self.hobbies)
         return self._encoded_hobbies
 
-    def project_type_enc(self, model: SentenceTransformer):
+    def project_type_enc(self, model: "SentenceTransformer"):
         if self._encoded_project_type is None:
             self._encoded_project_type = model.encode(self.project_type)
         return self._encoded_project_type
@@ -106,80 +172,373 @@ class PersonDataFilter:
         self.hours_per_week_index = None
         self.is_student = False
 
-    def get_max_index(self):
-        max_index = max(self.name_index, self.status_index, self.confirmed_index, *self.interests_indices,
-                        *self.hobbies_indices, self.project_type_index, self.hours_per_week_index)
-        return max_index
+    def get_columns(self):
+        # The multi-column fields are joined in the columns' order
+        return {
+            "name": self.name_index,
+            "status": self.status_index,
+            "confirmed": self.confirmed_index,
+            "interests": sorted(self.interests_indices),
+            "hobbies": sorted(self.hobbies_indices),
+            "project_type": self.project_type_index,
+            "hours_per_week": self.hours_per_week_index,
+        }
 
 
-def parse_hours_per_week(hours_per_week: str):
-    try:
-        return int(hours_per_week)
-    except ValueError:
-        return MAX_HOURS_PER_WEEK
+def in_assignment_mode():
+    return "--assign" in sys.argv[1:]
 
 
-def extract_people_data(csv_file_path: str, filter: PersonDataFilter) -> list[PersonData]:
-    with open(csv_file_path, encoding="utf-8", mode="r") as fstream:
-        people = list()
-        reader = csv.reader(fstream, delimiter=',', quotechar='"')
-        for row_i, row in enumerate(reader):
-            if row_i == 0:
-                continue
+def in_ann_mode():
+    return "--ann" in sys.argv[1:]
 
-            name = row[filter.name_index]
-            if not name:
-                continue
 
-            status = row[filter.status_index].lower()
-            if filter.is_student:
-                if status == "matched" or status.startswith("отпаднал"):
-                    continue
-            else:
-                if status == "matched" or status == "no matching!":
-                    continue
+def in_client_mode():
+    return "--client" in sys.argv[1:]
 
-            confirmed = row[filter.confirmed_index].lower()
-            if filter.is_student:
-                if confirmed != "да":
-                    continue
-            else:
-                if confirmed == "denied":
-                    continue
 
-            interests = ""
-            hobbies = ""
-            project_type = ""
-            hours_per_week = 0
-            for col_i in range(0, len(row)):
-                if col_i in filter.interests_indices:
-                    interests += f"{row[col_i]}{os.linesep}"
+def in_profile_mode():
+    return "--profile" in sys.argv[1:]
 
-                if col_i in filter.hobbies_indices:
-                    hobbies += f"{row[col_i]}{os.linesep}"
 
-                if col_i == filter.project_type_index:
-                    project_type = row[col_i]
+def in_stream_mode():
+    return "--stream" in sys.argv[1:]
 
-                if col_i == filter.hours_per_week_index:
-                    hours_per_week = parse_hours_per_week(row[col_i])
 
-                if col_i >= filter.get_max_index():
-                    person = PersonData()
-                    person.name = name
-                    person.status = status
-                    person.interests = interests
-                    person.hobbies = hobbies
-                    person.project_type = project_type
-                    person.hours_per_week = hours_per_week
-                    people.append(person)
-                    break
+def in_structured_mode():
+    return "--structured" in sys.argv[1:]
 
-        people.sort(key=lambda p: p.name)
-        return people
 
+def get_scoring_backend():
+    for arg in sys.argv[1:]:
+        if arg.startswith("--backend="):
+            backend = arg[len("--backend="):]
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+            return backend
+    return SCORING_BACKEND
 
-def find_matches():
+
+def get_embedding_dtype():
+    for arg in sys.argv[1:]:
+        if arg.startswith("--dtype="):
+            dtype = arg[len("--dtype="):]
+            if dtype not in DTYPES:
+                raise ValueError(f"Unknown dtype '{dtype}', expected one of {DTYPES}")
+            return dtype
+    return EMBEDDING_DTYPE
+
+
+def get_encoding_workers_count():
+    for arg in sys.argv[1:]:
+        if arg.startswith("--workers="):
+            return int(arg[len("--workers="):])
+    return ENCODING_WORKERS_COUNT
+
+
+def parse_hours_per_week(hours_per_week: str):
+    try:
+        return int(hours_per_week)
+    except ValueError:
+        return MAX_HOURS_PER_WEEK
+
+
+def extract_people_data(csv_file_path: str, filter: PersonDataFilter, snapshots_directory: str = None) -> list[PersonData]:
+    # With a 'snapshots_directory' the parsed file is reused from the last run while it doesn't change, see csv_reader.read_records
+    people = list()
+    for record in read_records(csv_file_path, filter.get_columns(), type_name="PersonRecord", snapshots_directory=snapshots_directory):
+        if not record.name:
+            continue
+
+        status = record.status.lower()
+        if filter.is_student:
+            if status == "matched" or status.startswith("отпаднал"):
+                continue
+        else:
+            if status == "matched" or status == "no matching!":
+                continue
+
+        confirmed = record.confirmed.lower()
+        if filter.is_student:
+            if confirmed != "да":
+                continue
+        else:
+            if confirmed == "denied":
+                continue
+
+        person = PersonData()
+        person.name = record.name
+        person.status = status
+        person.interests = join_lines(record.interests)
+        person.hobbies = join_lines(record.hobbies)
+        person.project_type = record.project_type
+        person.hours_per_week = parse_hours_per_week(record.hours_per_week)
+        people.append(person)
+
+    people.sort(key=lambda p: p.name)
+    return people
+
+
+def encode_texts(model: "SentenceTransformer", texts: list[str], cache: EmbeddingCache = None) -> numpy.ndarray:
+    # The same texts repeat across people (the project types are a few options, hobbies are often short and common),
+    # so every distinct text is encoded once and the vectors are mapped back to the people by index
+    unique_texts = list(dict.fromkeys(texts))
+    if not unique_texts:
+        return numpy.zeros((0, 0), dtype=numpy.float32)
+
+    if cache is not None:
+        hits, misses = cache.hits, cache.misses
+        unique_vectors = cache.encode(model, unique_texts)
+        profiler.count("cache hits", cache.hits - hits)
+        profiler.count("cache misses", cache.misses - misses)
+        profiler.count("encoder calls", 1 if cache.misses > misses else 0)
+        profiler.count("encoded texts", cache.misses - misses)
+    else:
+        unique_vectors = model.encode(unique_texts, convert_to_numpy=True)
+        profiler.count("encoder calls")
+        profiler.count("encoded texts", len(unique_texts))
+
+    unique_indices = {text: i for i, text in enumerate(unique_texts)}
+    return unique_vectors[[unique_indices[text] for text in texts]]
+
+
+def encode_people(model: "SentenceTransformer", people: list[PersonData], cache: EmbeddingCache = None):
+    # One batched encode call per field instead of one call per person and field.
+    # With a cache only the texts that were never encoded before are passed to the model.
+    # A sparse field (TF-IDF) is split into rows once, taking its rows one at a time is slow
+    interests, hobbies, project_types = [
+        split_rows(vectors) if sparse.issparse(vectors) else vectors
+        for vectors in [encode_texts(model, [person.interests for person in people], cache),
+                        encode_texts(model, [person.hobbies for person in people], cache),
+                        encode_texts(model, [person.project_type for person in people], cache)]]
+    for i, person in enumerate(people):
+        person._encoded_interests = interests[i]
+        person._encoded_hobbies = hobbies[i]
+        person._encoded_project_type = project_types[i]
+
+
+def normalize_rows(matrix: numpy.ndarray) -> numpy.ndarray:
+    if sparse.issparse(matrix):
+        return normalize_sparse_rows(matrix)
+    norms = numpy.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1  # zero vectors have zero similarity to everything, same as util.cos_sim
+    return matrix / norms
+
+
+class PeopleMatrices:
+    """
+    The encoded fields of a list of people stacked into matrices, one row per person.
+    The embeddings are L2 normalized, so their dot products are cosine similarities.
+    They can also be QuantizedVectors, which are scored without converting the whole matrices back to float32,
+    or sparse csr_matrix (TF-IDF), which are scored a tile at a time and aren't quantized.
+    """
+
+    def __init__(self, interests: numpy.ndarray, hobbies: numpy.ndarray, project_types: numpy.ndarray, hours_per_week: numpy.ndarray):
+        self.interests = interests
+        self.hobbies = hobbies
+        self.project_types = project_types
+        self.hours_per_week = hours_per_week
+
+    def __len__(self):
+        return len(self.hours_per_week)
+
+    def subset(self, indices):
+        return PeopleMatrices(self.interests[indices], self.hobbies[indices], self.project_types[indices], self.hours_per_week[indices])
+
+    def quantize(self, dtype: str):
+        def quantize_vectors(vectors):
+            # The sparse vectors only store their non-zero values, they stay as they are
+            return vectors if sparse.issparse(vectors) else QuantizedVectors.quantize(as_float32(vectors), dtype)
+
+        return PeopleMatrices(quantize_vectors(self.interests), quantize_vectors(self.hobbies),
+                              quantize_vectors(self.project_types), self.hours_per_week)
+
+    def combined(self, weighted: bool):
+        # One vector per person whose dot products give the weighted sum of the three cosine similarities
+        interests_weight, hobbies_weight, project_type_weight = (INTERESTS_WEIGHT, HOBBIES_WEIGHT, PROJECT_TYPE_WEIGHT) if weighted else (1, 1, 1)
+        blocks = [as_float32(self.interests) * interests_weight,
+                  as_float32(self.hobbies) * hobbies_weight,
+                  as_float32(self.project_types) * project_type_weight]
+        if any(sparse.issparse(block) for block in blocks):
+            return sparse.hstack(blocks, format="csr")
+        return numpy.hstack(blocks)
+
+
+def stack_vectors(vectors: list):
+    if vectors and isinstance(vectors[0], SparseRow):
+        return stack_rows(vectors)
+    return numpy.stack(vectors).astype(numpy.float32)
+
+
+def get_people_matrices(model: "SentenceTransformer", people: list[PersonData]) -> PeopleMatrices:
+    return PeopleMatrices(
+        normalize_rows(stack_vectors([p.interests_enc(model) for p in people])),
+        normalize_rows(stack_vectors([p.hobbies_enc(model) for p in people])),
+        normalize_rows(stack_vectors([p.project_type_enc(model) for p in people])),
+        numpy.array([p.hours_per_week for p in people], dtype=numpy.float32))
+
+
+def get_hours_per_week_sim(students_hours_per_week: numpy.ndarray, mentors_hours_per_week: numpy.ndarray) -> numpy.ndarray:
+    return 1 - numpy.abs(students_hours_per_week - mentors_hours_per_week) / (MAX_HOURS_PER_WEEK - MIN_HOURS_PER_WEEK)
+
+
+def score_people_matrices(students: PeopleMatrices, mentors: PeopleMatrices) -> numpy.ndarray:
+    # Returns a (students x mentors) matrix with the similarity percent of every pair
+    interests_sim = dot(students.interests, mentors.interests)
+    hobbies_sim = dot(students.hobbies, mentors.hobbies)
+    project_type_sim = dot(students.project_types, mentors.project_types)
+    hours_per_week_sim = get_hours_per_week_sim(students.hours_per_week[:, None], mentors.hours_per_week[None, :])
+
+    final_sim = (interests_sim * INTERESTS_WEIGHT +
+                 hobbies_sim * HOBBIES_WEIGHT +
+                 project_type_sim * PROJECT_TYPE_WEIGHT +
+                 hours_per_week_sim * HOURS_PER_WEEK_WEIGHT)
+    max_sim = INTERESTS_WEIGHT + HOBBIES_WEIGHT + PROJECT_TYPE_WEIGHT + HOURS_PER_WEEK_WEIGHT
+    return ((final_sim / max_sim) * 100).astype(int)  # truncates towards zero like int()
+
+
+def get_pairs_components(students: PeopleMatrices, mentors: PeopleMatrices, students_indices: numpy.ndarray, mentors_indices: numpy.ndarray):
+    # The component similarities of the given (student, mentor) pairs only, never of all pairs
+    components = {name: numpy.zeros(len(students_indices), dtype=numpy.float32) for name in COMPONENTS}
+    for start in range(0, len(students_indices), STRUCTURED_BATCH_SIZE):
+        batch = slice(start, start + STRUCTURED_BATCH_SIZE)
+        batch_students = students.subset(students_indices[batch])
+        batch_mentors = mentors.subset(mentors_indices[batch])
+        for name, students_vectors, mentors_vectors in [("interests", batch_students.interests, batch_mentors.interests),
+                                                        ("hobbies", batch_students.hobbies, batch_mentors.hobbies),
+                                                        ("project_type", batch_students.project_types, batch_mentors.project_types)]:
+            components[name][batch] = dot_rows(students_vectors, mentors_vectors)
+        components["hours_per_week"][batch] = get_hours_per_week_sim(batch_students.hours_per_week, batch_mentors.hours_per_week)
+    return components
+
+
+def get_mentor_index(mentors: PeopleMatrices) -> MentorIndex:
+    vectors = mentors.combined(weighted=False)
+    index = MentorIndex.load(ANN_INDEX_FILE_PATH, get_fingerprint(vectors))
+    if index is None:
+        index = MentorIndex.build(vectors, ANN_LISTS_COUNT)
+    return index
+
+
+def find_top_mentors_ann(students: PeopleMatrices, mentors: PeopleMatrices, index: MentorIndex = None):
+    # Yields the indices and similarity percents of the best ANN_TOP_K mentors of every student, best first
+    queries = students.combined(weighted=True)
+    if index is None:
+        index = get_mentor_index(mentors)
+        # Calibrated on the percents the mentors are ranked by, the hours per week included
+        index.calibrate(queries, mentors.combined(weighted=False), ANN_TOP_K, ANN_RECALL_TARGET,
+                        score=lambda students_indices: score_people_matrices(students.subset(students_indices), mentors))
+        index.save(ANN_INDEX_FILE_PATH)
+
+    # Score every cluster against all the students probing it at once. Every student probes clusters until
+    # they hold at least ANN_TOP_K mentors.
+    probes = index.probe(queries, min_candidates=ANN_TOP_K)
+    candidates = [list() for _ in range(len(students))]
+    candidates_percents = [list() for _ in range(len(students))]
+    for list_id in range(len(index.centroids)):
+        members = index.get_list(list_id)
+        students_indices = numpy.nonzero((probes == list_id).any(axis=1))[0]
+        if len(members) == 0 or len(students_indices) == 0:
+            continue
+
+        percents = score_people_matrices(students.subset(students_indices), mentors.subset(members))
+        top_k = min(ANN_TOP_K, len(members))
+        top = numpy.argpartition(-percents, top_k - 1, axis=1)[:, :top_k]
+        for row, i_student in enumerate(students_indices):
+            candidates[i_student].append(members[top[row]])
+            candidates_percents[i_student].append(percents[row, top[row]])
+
+    for i_student in range(len(students)):
+        if candidates[i_student]:
+            mentors_indices = numpy.concatenate(candidates[i_student])
+            percents = numpy.concatenate(candidates_percents[i_student])
+        else:
+            # No candidates (an index without mentors in the probed clusters), the student is scored exactly
+            percents = score_people_matrices(students.subset([i_student]), mentors)[0]
+            mentors_indices = numpy.arange(len(percents))
+        order = numpy.lexsort((mentors_indices, -percents))[:ANN_TOP_K]  # equal scores keep the mentors' order
+        yield mentors_indices[order], percents[order]
+
+
+def find_top_mentors(students: PeopleMatrices, mentors: PeopleMatrices):
+    # Yields the indices and similarity percents of all mentors of every student, best first
+    yield from find_top_mentors_in_percents(score_people_matrices(students, mentors))
+
+
+def find_top_mentors_in_percents(sim_percents: numpy.ndarray):
+    for student_percents in sim_percents:
+        # A stable sort keeps the mentors' order for equal scores, same as list.sort(reverse=True)
+        order = numpy.argsort(-student_percents, kind="stable")
+        yield order, student_percents[order]
+
+
+def find_top_mentors_streamed(students: PeopleMatrices, mentors: PeopleMatrices, top_k: int = None, tile_size: int = None):
+    # Yields the indices and similarity percents of the best 'top_k' mentors of every student, best first.
+    # Only one tile of scores and the current best mentors of a tile of students are kept in memory.
+    top_k = top_k or STREAM_TOP_K
+    tile_size = tile_size or STREAM_TILE_SIZE
+    mentors_count = len(mentors)
+    for students_start in range(0, len(students), tile_size):
+        students_tile = students.subset(slice(students_start, students_start + tile_size))
+        best_indices = numpy.zeros((len(students_tile), 0), dtype=numpy.int64)
+        best_percents = numpy.zeros((len(students_tile), 0), dtype=numpy.int64)
+        for mentors_start in range(0, mentors_count, tile_size):
+            mentors_end = min(mentors_start + tile_size, mentors_count)
+            percents = numpy.hstack([best_percents, score_people_matrices(students_tile, mentors.subset(slice(mentors_start, mentors_end)))])
+            indices = numpy.hstack([best_indices, numpy.broadcast_to(numpy.arange(mentors_start, mentors_end), (len(students_tile), mentors_end - mentors_start))])
+            if percents.shape[1] > top_k:
+                # Equal scores rank the lower mentor index first, same as the stable sort of the full matrix
+                keys = percents * (mentors_count + 1) + (mentors_count - indices)
+                keep = numpy.argpartition(-keys, top_k - 1, axis=1)[:, :top_k]
+                percents = numpy.take_along_axis(percents, keep, axis=1)
+                indices = numpy.take_along_axis(indices, keep, axis=1)
+            best_percents, best_indices = percents, indices
+
+        for student_indices, student_percents in zip(best_indices, best_percents):
+            order = numpy.lexsort((student_indices, -student_percents))
+            yield student_indices[order], student_percents[order]
+
+
+def hash_person(person: PersonData):
+    return hash_fields(person.name, person.interests, person.hobbies, person.project_type, person.hours_per_week)
+
+
+def get_scoring_signature():
+    return hash_fields(MODEL_NAME, get_embedding_dtype(), INTERESTS_WEIGHT, HOBBIES_WEIGHT, PROJECT_TYPE_WEIGHT, HOURS_PER_WEEK_WEIGHT,
+                       MIN_HOURS_PER_WEEK, MAX_HOURS_PER_WEEK)
+
+
+def compute_similarity_percents_incremental(students: list[PersonData], mentors: list[PersonData],
+                                            students_matrices: PeopleMatrices, mentors_matrices: PeopleMatrices) -> numpy.ndarray:
+    # Reuses the last run's similarity matrix and only scores the rows and columns of new or edited people
+    signature = get_scoring_signature()
+    previous = SimilarityState.load(SIMILARITY_STATE_FILE_PATH, signature)
+
+    def score(students_indices, mentors_indices):
+        return score_people_matrices(students_matrices.subset(students_indices), mentors_matrices.subset(mentors_indices))
+
+    state, new_students_count, new_mentors_count = update_similarity_state(
+        previous, signature, [hash_person(s) for s in students], [hash_person(m) for m in mentors], score)
+    state.save(SIMILARITY_STATE_FILE_PATH)
+    print(f"scored {new_students_count} new or edited students and {new_mentors_count} new or edited mentors")
+    return state.percents
+
+
+def find_assignments(students: list[PersonData], mentors: list[PersonData], sim_percents: numpy.ndarray):
+    capacities = [MENTOR_CAPACITIES.get(mentor.name, MENTOR_CAPACITY) for mentor in mentors]
+    allowed = sim_percents >= SIMILARITY_PERCENT_DISCARD_THRESHOLD
+    if FORBIDDEN_PAIRS:
+        students_indices = {student.name: i for i, student in enumerate(students)}
+        mentors_indices = {mentor.name: i for i, mentor in enumerate(mentors)}
+        for student_name, mentor_name in FORBIDDEN_PAIRS:
+            if student_name in students_indices and mentor_name in mentors_indices:
+                allowed[students_indices[student_name], mentors_indices[mentor_name]] = False
+
+    assignment = find_optimal_assignment(sim_percents, capacities, allowed)
+    return [(i_student, i_mentor, int(sim_percents[i_student, i_mentor])) for i_student, i_mentor in assignment]
+
+
+def get_students_filter():
     students_filter = PersonDataFilter()
     students_filter.name_index = STUDENT_NAME
     students_filter.status_index = STUDENT_STATUS
@@ -189,8 +548,10 @@ def find_matches():
     students_filter.project_type_index = STUDENT_PROJECT_TYPE
     students_filter.hours_per_week_index = STUDENT_HOURS_PER_WEEK
     students_filter.is_student = True
-    students = extract_people_data(STUDENTS_CSV_FILE_PATH, students_filter)
+    return students_filter
 
+
+def get_mentors_filter():
     mentors_filter = PersonDataFilter()
     mentors_filter.name_index = MENTOR_NAME
     mentors_filter.status_index = MENTOR_STATUS
@@ -200,38 +561,183 @@ def find_matches():
     mentors_filter.project_type_index = MENTOR_PROJECT_TYPE
     mentors_filter.hours_per_week_index = MENTOR_HOURS_PER_WEEK
     mentors_filter.is_student = False
-    mentors = extract_people_data(MENTORS_CSV_FILE_PATH, mentors_filter)
+    return mentors_filter
+
+
+def load_model():
+    # Imported here so that the client mode doesn't pay for importing torch
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
+class LazyModel:
+    """
+    Creates the model (or the encoding pool) on the first encode call, so that a run whose texts are all in the
+    EmbeddingCache neither imports torch nor loads the model.
+    """
+
+    def __init__(self, create_model):
+        self._create_model = create_model
+        self.model = None
+
+    def encode(self, *args, **kwargs):
+        if self.model is None:
+            with profiler.stage("model load"):
+                self.model = self._create_model()
+        return self.model.encode(*args, **kwargs)
+
+    def close(self):
+        if self.model is not None:
+            self.model.close()
+
+
+def iter_match_pairs(students: list[PersonData], mentors: list[PersonData],
+                     students_matrices: PeopleMatrices, mentors_matrices: PeopleMatrices,
+                     assignment_mode: bool, ann_mode: bool, stream_mode: bool = False, sim_percents: numpy.ndarray = None):
+    # Yields the student's index, the mentor's index and the similarity percent of every listed pair.
+    # 'sim_percents' can hold the already computed similarity matrix of all pairs
+    if sim_percents is None and (assignment_mode or not (ann_mode or stream_mode)):
+        sim_percents = score_people_matrices(students_matrices, mentors_matrices)
+
+    if assignment_mode:
+        yield from find_assignments(students, mentors, sim_percents)
+        return
+
+    if ann_mode:
+        top_mentors = find_top_mentors_ann(students_matrices, mentors_matrices)
+    elif stream_mode:
+        top_mentors = find_top_mentors_streamed(students_matrices, mentors_matrices)
+    else:
+        top_mentors = find_top_mentors_in_percents(sim_percents)
+
+    for i_student, (mentors_indices, percents) in enumerate(top_mentors):
+        for i_mentor, sim_percent in zip(mentors_indices, percents):
+            if sim_percent < SIMILARITY_PERCENT_DISCARD_THRESHOLD:
+                break
+            yield i_student, int(i_mentor), int(sim_percent)
 
-    model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-    # model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-mpnet-base-v2")
-    # model = SentenceTransformer(AI_MODEL_FILE_PATH)
 
-    print("find matches:")
-    matches = list()
-    for student in students:
-        mentor_suggestions = list()
-        for mentor in mentors:
-            # find similarity
-            interests_sim = util.cos_sim(student.interests_enc(model), mentor.interests_enc(model)).item() * INTERESTS_WEIGHT
-            hobbies_sim = util.cos_sim(student.hobbies_enc(model), mentor.hobbies_enc(model)).item() * HOBBIES_WEIGHT
-            project_type_sim = util.cos_sim(student.project_type_enc(model), mentor.project_type_enc(model)).item() * PROJECT_TYPE_WEIGHT
-            hours_per_week_sim = (1 - abs(student.hours_per_week - mentor.hours_per_week) / (MAX_HOURS_PER_WEEK - MIN_HOURS_PER_WEEK)) * HOURS_PER_WEEK_WEIGHT
-            final_sim = interests_sim + hobbies_sim + project_type_sim + hours_per_week_sim
-            max_sim = INTERESTS_WEIGHT + HOBBIES_WEIGHT + PROJECT_TYPE_WEIGHT + HOURS_PER_WEEK_WEIGHT
-            sim_percent = int((final_sim / max_sim) * 100)
-            mentor_suggestions.append((mentor, sim_percent))
-
-        mentor_suggestions.sort(key=lambda x: x[1], reverse=True)
-        for mentor_suggestion in mentor_suggestions:
-            if mentor_suggestion[1] < SIMILARITY_PERCENT_DISCARD_THRESHOLD:
-                break
-            match_entry = f"{student.name}(Y) + {mentor_suggestion[0].name}(M) - {mentor_suggestion[1]}"
-            matches.append(match_entry)
-            print(match_entry)
+def format_match_entry(student: PersonData, mentor: PersonData, sim_percent: int):
+    return f"{student.name}(Y) + {mentor.name}(M) - {sim_percent}"
+
 
-    with open("matches.txt", "w", encoding="utf-8") as file:
+def iter_match_entries(students: list[PersonData], mentors: list[PersonData],
+                       students_matrices: PeopleMatrices, mentors_matrices: PeopleMatrices,
+                       assignment_mode: bool, ann_mode: bool, stream_mode: bool = False, sim_percents: numpy.ndarray = None):
+    for i_student, i_mentor, sim_percent in iter_match_pairs(students, mentors, students_matrices, mentors_matrices,
+                                                             assignment_mode, ann_mode, stream_mode, sim_percents):
+        yield format_match_entry(students[i_student], mentors[i_mentor], sim_percent)
+
+
+def get_match_records(students: list[PersonData], mentors: list[PersonData],
+                      students_matrices: PeopleMatrices, mentors_matrices: PeopleMatrices, pairs: list[tuple]) -> MatchRecords:
+    students_indices = numpy.array([i_student for i_student, _, _ in pairs], dtype=numpy.int32)
+    mentors_indices = numpy.array([i_mentor for _, i_mentor, _ in pairs], dtype=numpy.int32)
+    return MatchRecords(numpy.array([student.name for student in students], dtype=str),
+                        numpy.array([mentor.name for mentor in mentors], dtype=str),
+                        students_indices, mentors_indices,
+                        get_pairs_components(students_matrices, mentors_matrices, students_indices, mentors_indices),
+                        numpy.array([sim_percent for _, _, sim_percent in pairs], dtype=numpy.int16))
+
+
+def request_match_entries(assignment_mode: bool, ann_mode: bool, stream_mode: bool, backend: str, dtype: str) -> list[str]:
+    # The server checks that it scores with the same backend and dtype
+    query = urllib.parse.urlencode({"assign": int(assignment_mode), "ann": int(ann_mode), "stream": int(stream_mode),
+                                    "backend": backend, "dtype": dtype})
+    url = f"http://{MATCH_SERVER_HOST}:{MATCH_SERVER_PORT}/matches?{query}"
+    try:
+        with urllib.request.urlopen(url) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as ex:
+        raise ValueError(f"The match server answered {ex.code}: {json.load(ex).get('error')}") from None
+
+
+def iter_local_match_entries():
+    with profiler.stage("csv parsing"):
+        students = extract_people_data(STUDENTS_CSV_FILE_PATH, get_students_filter(), get_snapshots_directory())
+        mentors = extract_people_data(MENTORS_CSV_FILE_PATH, get_mentors_filter(), get_snapshots_directory())
+    profiler.count("students", len(students))
+    profiler.count("mentors", len(mentors))
+    if not students or not mentors:
+        return
+
+    dtype = get_embedding_dtype()
+    backend = get_scoring_backend()
+    if backend == TFIDF_BACKEND:
+        # The TF-IDF vectors depend on all texts of a field, so they're neither cached nor reused between runs
+        with profiler.stage("model load"):
+            model = TfidfEncoder()
+        with profiler.stage("encoding"):
+            encode_people(model, students + mentors)
+    else:
+        # The model is only loaded when the cache misses some texts
+        cache = EmbeddingCache(EMBEDDING_CACHE_DIRECTORY, MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES, dtype)
+        workers_count = get_encoding_workers_count()
+        if workers_count > 1:
+            model = LazyModel(lambda: EncodingPool(MODEL_NAME, workers_count, ENCODING_BATCH_SIZE))
+        else:
+            model = LazyModel(load_model)
+        with profiler.stage("encoding"):
+            encode_people(model, students + mentors, cache)
+            cache.save()
+        if workers_count > 1:
+            model.close()
+    students_matrices = get_people_matrices(model, students)
+    mentors_matrices = get_people_matrices(model, mentors)
+    if dtype != FLOAT32:
+        students_matrices = students_matrices.quantize(dtype)
+        mentors_matrices = mentors_matrices.quantize(dtype)
+
+    # The streaming and ANN modes never build the full similarity matrix
+    stream_mode = in_stream_mode() and not in_assignment_mode()
+    with profiler.stage("scoring"):
+        sim_percents = None
+        if not stream_mode and (in_assignment_mode() or not in_ann_mode()):
+            if backend == TFIDF_BACKEND:
+                sim_percents = score_people_matrices(students_matrices, mentors_matrices)
+            else:
+                sim_percents = compute_similarity_percents_incremental(students, mentors, students_matrices, mentors_matrices)
+        pairs = iter_match_pairs(students, mentors, students_matrices, mentors_matrices,
+                                 in_assignment_mode(), in_ann_mode(), stream_mode, sim_percents)
+        if profiler.enabled or in_structured_mode():
+            # Scored up front when profiling, otherwise the scoring would be timed as part of the writing
+            pairs = list(pairs)
+
+    if in_structured_mode():
+        with profiler.stage("structured output"):
+            records = get_match_records(students, mentors, students_matrices, mentors_matrices, pairs)
+            records.save_csv(MATCHES_CSV_FILE_NAME)
+            records.save(MATCHES_RECORDS_FILE_NAME)
+
+    for i_student, i_mentor, sim_percent in pairs:
+        yield format_match_entry(students[i_student], mentors[i_mentor], sim_percent)
+
+
+def find_matches():
+    if in_profile_mode():
+        profiler.enable()
+
+    print("find matches:")
+    if in_client_mode():
+        if in_structured_mode():
+            raise ValueError("The structured mode needs the embeddings, it can't be used with --client")
+        matches = request_match_entries(in_assignment_mode(), in_ann_mode(), in_stream_mode(), get_scoring_backend(), get_embedding_dtype())
+    else:
+        matches = iter_local_match_entries()
+
+    # The entries are written as they're produced
+    output_file_name = ASSIGNMENTS_FILE_NAME if in_assignment_mode() else MATCHES_FILE_NAME
+    with open(output_file_name, "w", encoding="utf-8") as file:
         for entry in matches:
-            file.write(f"{entry}\n")
+            with profiler.stage("writing"):
+                print(entry)
+                file.write(f"{entry}\n")
+            profiler.count("matches")
+
+    if profiler.enabled:
+        summary = profiler.save(PROFILE_FILE_NAME, {"arguments": sys.argv[1:]})
+        profiler.disable()
+        print(summary)
 
 
 if __name__ == "__main__":
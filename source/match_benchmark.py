@@ -0,0 +1,355 @@
+import json
+import numpy
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from ann_index import MentorIndex
+from assignment import find_greedy_assignment, find_optimal_assignment
+from csv_reader import read_records, read_rows
+from encoding_pool import BATCHES_PER_TASK, EncodingPool
+from quantization import FLOAT16, FLOAT32, INT8
+from tfidf_encoder import TfidfEncoder
+import match
+from match import (CURRENT_DIRECTORY, MENTORS_CSV_FILE_PATH, MODEL_NAME, STUDENTS_CSV_FILE_PATH, TFIDF_BACKEND,
+                   PeopleMatrices, encode_people, extract_people_data, find_top_mentors, find_top_mentors_streamed,
+                   get_mentors_filter, get_people_matrices, get_scoring_backend, get_students_filter, load_model,
+                   normalize_rows, score_people_matrices)
+from match_data_generator import create_match_data, create_synthetic_texts
+
+# Usage: python match_benchmark.py [benchmark name...] [--backend=tfidf] [--save-baseline]
+# Runs all benchmarks when no name is given.
+# The 'suite' benchmark compares its results with match_benchmark_baseline.json, only '--save-baseline' writes the
+# backend's results to it.
+
+RANDOM_SEED = 0
+ASSIGNMENT_SIZES = [500, 1000, 2000, 4000]
+ASSIGNMENT_THRESHOLD = 50
+ANN_STUDENTS_COUNT = 2000
+ANN_MENTORS_COUNT = 20000
+ANN_TOPICS_COUNT = 50
+ANN_TOP_K = 10
+ANN_PROBES_COUNTS = [1, 2, 4, 8, 16, 32]
+EMBEDDING_DIMENSION = 384
+ENCODING_PEOPLE_COUNT = 3000
+ENCODING_BATCH_SIZE = 32
+STREAM_STUDENTS_COUNT = 2000
+STREAM_MENTORS_COUNTS = [2000, 8000, 16000]
+STREAM_TOP_K = 20
+QUANTIZATION_STUDENTS_COUNT = 2000
+QUANTIZATION_MENTORS_COUNT = 4000
+QUANTIZATION_TOP_K = 10
+BACKENDS_TOP_K = 10
+SUITE_SCALES = [100, 1000, 10000]
+CSV_ROWS_COUNT = 20000
+SUITE_BASELINE_FILE_PATH = f"{CURRENT_DIRECTORY}/match_benchmark_baseline.json"
+
+
+def create_synthetic_matrices(rng, count: int, topics: numpy.ndarray) -> PeopleMatrices:
+    # Every person leans to one topic which shows in most of their fields, like a programmer who also
+    # studied programming and wants a technical project. The rest of the fields pick a random topic.
+    main_topics = rng.integers(0, len(topics), size=count)
+
+    def field():
+        field_topics = numpy.where(rng.random(count) < 0.7, main_topics, rng.integers(0, len(topics), size=count))
+        vectors = topics[field_topics] + rng.normal(scale=0.7, size=(count, topics.shape[1]))
+        return normalize_rows(vectors.astype(numpy.float32))
+
+    hours = rng.integers(1, 7, size=count).astype(numpy.float32)
+    return PeopleMatrices(field(), field(), field(), hours)
+
+
+def benchmark_assignment():
+    print("assignment (students x mentors): optimal vs greedy")
+    rng = numpy.random.default_rng(RANDOM_SEED)
+    for size in ASSIGNMENT_SIZES:
+        # Integer percents in the range the matcher produces, ties included
+        scores = rng.integers(20, 95, size=(size, size))
+        allowed = scores >= ASSIGNMENT_THRESHOLD
+        capacities = [1] * size
+
+        start = time.perf_counter()
+        optimal = find_optimal_assignment(scores, capacities, allowed)
+        optimal_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        greedy = find_greedy_assignment(scores, capacities, allowed)
+        greedy_time = time.perf_counter() - start
+
+        optimal_score = sum(int(scores[i, j]) for i, j in optimal)
+        greedy_score = sum(int(scores[i, j]) for i, j in greedy)
+        print(f"{size}x{size}: "
+              f"optimal {optimal_time:.2f}s, {len(optimal)} pairs, score {optimal_score} | "
+              f"greedy {greedy_time:.2f}s, {len(greedy)} pairs, score {greedy_score}")
+
+
+def benchmark_ann():
+    print(f"ann index ({ANN_STUDENTS_COUNT} students x {ANN_MENTORS_COUNT} mentors, top {ANN_TOP_K}): recall vs latency")
+    rng = numpy.random.default_rng(RANDOM_SEED)
+    topics = rng.normal(size=(ANN_TOPICS_COUNT, EMBEDDING_DIMENSION)).astype(numpy.float32)
+    students = create_synthetic_matrices(rng, ANN_STUDENTS_COUNT, topics)
+    mentors = create_synthetic_matrices(rng, ANN_MENTORS_COUNT, topics)
+
+    start = time.perf_counter()
+    exact_percents = score_people_matrices(students, mentors)
+    exact_top = numpy.argpartition(-exact_percents, ANN_TOP_K - 1, axis=1)[:, :ANN_TOP_K]
+    exact_time = time.perf_counter() - start
+    print(f"exact: {exact_time:.2f}s")
+
+    start = time.perf_counter()
+    index = MentorIndex.build(mentors.combined(weighted=False))
+    print(f"index build: {time.perf_counter() - start:.2f}s, {len(index.centroids)} lists")
+
+    for probes_count in ANN_PROBES_COUNTS:
+        index.probes_count = probes_count
+        match.ANN_TOP_K = ANN_TOP_K
+        start = time.perf_counter()
+        top = [indices for indices, _ in match.find_top_mentors_ann(students, mentors, index)]
+        ann_time = time.perf_counter() - start
+        # Integer percents tie a lot, so a mentor counts as found when it scores as high as the exact k-th best
+        kth_best = numpy.take_along_axis(exact_percents, exact_top, axis=1).min(axis=1)
+        found = sum(int((exact_percents[i, t] >= kth_best[i]).sum()) for i, t in enumerate(top))
+        print(f"probes {probes_count}: {ann_time:.2f}s ({exact_time / ann_time:.1f}x), recall@{ANN_TOP_K} {found / exact_top.size:.3f}")
+
+
+def benchmark_encoding():
+    # Three fields per person, as in the matcher
+    texts = create_synthetic_texts(numpy.random.default_rng(RANDOM_SEED), ENCODING_PEOPLE_COUNT * 3)
+    print(f"encoding ({len(texts)} texts, batch size {ENCODING_BATCH_SIZE}): throughput by workers")
+
+    model = load_model()
+    start = time.perf_counter()
+    serial_embeddings = model.encode(texts, batch_size=ENCODING_BATCH_SIZE, convert_to_numpy=True)
+    serial_time = time.perf_counter() - start
+    print(f"serial: {serial_time:.2f}s, {len(texts) / serial_time:.0f} texts/s")
+
+    workers_counts = [1]
+    while workers_counts[-1] * 2 <= os.cpu_count():
+        workers_counts.append(workers_counts[-1] * 2)
+    for workers_count in workers_counts:
+        with EncodingPool(MODEL_NAME, workers_count, ENCODING_BATCH_SIZE) as pool:
+            pool.encode(texts[:ENCODING_BATCH_SIZE * BATCHES_PER_TASK * workers_count])  # load the model in every worker before timing
+            start = time.perf_counter()
+            embeddings = pool.encode(texts)
+            pool_time = time.perf_counter() - start
+        max_difference = float(numpy.abs(embeddings - serial_embeddings).max())
+        print(f"{workers_count} workers: {pool_time:.2f}s, {len(texts) / pool_time:.0f} texts/s "
+              f"({serial_time / pool_time:.1f}x), max difference from serial {max_difference:.2e}")
+
+
+def benchmark_stream():
+    print(f"streamed top {STREAM_TOP_K} vs full matrix ({STREAM_STUDENTS_COUNT} students): time and peak memory")
+    rng = numpy.random.default_rng(RANDOM_SEED)
+    topics = rng.normal(size=(ANN_TOPICS_COUNT, EMBEDDING_DIMENSION)).astype(numpy.float32)
+    students = create_synthetic_matrices(rng, STREAM_STUDENTS_COUNT, topics)
+    for mentors_count in STREAM_MENTORS_COUNTS:
+        mentors = create_synthetic_matrices(rng, mentors_count, topics)
+        for name, find_top in [("full", find_top_mentors), ("streamed", lambda s, m: find_top_mentors_streamed(s, m, STREAM_TOP_K))]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            for _ in find_top(students, mentors):
+                pass
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{mentors_count} mentors, {name}: {elapsed:.2f}s, peak {peak / 2 ** 20:.0f} MiB")
+
+
+def benchmark_quantization():
+    print(f"quantized embeddings ({QUANTIZATION_STUDENTS_COUNT} students x {QUANTIZATION_MENTORS_COUNT} mentors): "
+          f"accuracy against float32")
+    rng = numpy.random.default_rng(RANDOM_SEED)
+    topics = rng.normal(size=(ANN_TOPICS_COUNT, EMBEDDING_DIMENSION)).astype(numpy.float32)
+    students = create_synthetic_matrices(rng, QUANTIZATION_STUDENTS_COUNT, topics)
+    mentors = create_synthetic_matrices(rng, QUANTIZATION_MENTORS_COUNT, topics)
+    exact_percents = score_people_matrices(students, mentors)
+    exact_top = numpy.argsort(-exact_percents, axis=1, kind="stable")[:, :QUANTIZATION_TOP_K]
+    kth_best = numpy.take_along_axis(exact_percents, exact_top, axis=1).min(axis=1)
+
+    for dtype in [FLOAT32, FLOAT16, INT8]:
+        quantized_students = students.quantize(dtype)
+        quantized_mentors = mentors.quantize(dtype)
+        nbytes = sum(m.nbytes for m in [quantized_mentors.interests, quantized_mentors.hobbies, quantized_mentors.project_types])
+
+        start = time.perf_counter()
+        percents = score_people_matrices(quantized_students, quantized_mentors)
+        elapsed = time.perf_counter() - start
+
+        top = numpy.argsort(-percents, axis=1, kind="stable")[:, :QUANTIZATION_TOP_K]
+        # Integer percents tie a lot, so a mentor counts as found when it scores as high as the exact k-th best
+        found = sum(int((exact_percents[i, t] >= kth_best[i]).sum()) for i, t in enumerate(top))
+        same_best = numpy.mean(exact_percents[numpy.arange(len(top)), top[:, 0]] == exact_percents[numpy.arange(len(top)), exact_top[:, 0]])
+        difference = numpy.abs(percents - exact_percents)
+        print(f"{dtype}: mentors' embeddings {nbytes / 2 ** 20:.1f} MiB, scoring {elapsed:.2f}s, "
+              f"equal percents {numpy.mean(difference == 0):.3f}, max difference {difference.max()}, "
+              f"recall@{QUANTIZATION_TOP_K} {found / top.size:.3f}, same best mentor {same_best:.3f}")
+
+
+def get_rank_correlations(a: numpy.ndarray, b: numpy.ndarray):
+    # Spearman correlation of every row of 'a' with the same row of 'b'
+    ranks_a = numpy.argsort(numpy.argsort(a, axis=1), axis=1).astype(numpy.float64)
+    ranks_b = numpy.argsort(numpy.argsort(b, axis=1), axis=1).astype(numpy.float64)
+    ranks_a -= ranks_a.mean(axis=1, keepdims=True)
+    ranks_b -= ranks_b.mean(axis=1, keepdims=True)
+    denominator = numpy.sqrt((ranks_a ** 2).sum(axis=1) * (ranks_b ** 2).sum(axis=1))
+    denominator[denominator == 0] = 1
+    return (ranks_a * ranks_b).sum(axis=1) / denominator
+
+
+def benchmark_backends():
+    # Runs on the matcher's csv files
+    students = extract_people_data(STUDENTS_CSV_FILE_PATH, get_students_filter())
+    mentors = extract_people_data(MENTORS_CSV_FILE_PATH, get_mentors_filter())
+    print(f"tf-idf vs transformer backend ({len(students)} students x {len(mentors)} mentors): ranking agreement")
+
+    percents_by_backend = dict()
+    for backend, create_encoder in [("transformer", load_model), ("tf-idf", TfidfEncoder)]:
+        start = time.perf_counter()
+        encoder = create_encoder()
+        load_time = time.perf_counter() - start
+        for person in students + mentors:
+            person._encoded_interests = person._encoded_hobbies = person._encoded_project_type = None
+
+        start = time.perf_counter()
+        encode_people(encoder, students + mentors)
+        percents_by_backend[backend] = score_people_matrices(get_people_matrices(encoder, students), get_people_matrices(encoder, mentors))
+        print(f"{backend}: load {load_time:.2f}s, encode and score {time.perf_counter() - start:.2f}s")
+
+    transformer_percents = percents_by_backend["transformer"]
+    tfidf_percents = percents_by_backend["tf-idf"]
+    top_k = min(BACKENDS_TOP_K, len(mentors))
+    transformer_top = numpy.argsort(-transformer_percents, axis=1, kind="stable")[:, :top_k]
+    tfidf_top = numpy.argsort(-tfidf_percents, axis=1, kind="stable")[:, :top_k]
+    overlap = numpy.mean([len(numpy.intersect1d(a, b)) / top_k for a, b in zip(transformer_top, tfidf_top)])
+    same_best = numpy.mean(transformer_top[:, 0] == tfidf_top[:, 0])
+    correlations = get_rank_correlations(transformer_percents, tfidf_percents)
+    print(f"mean spearman correlation {correlations.mean():.3f} (min {correlations.min():.3f}), "
+          f"top {top_k} overlap {overlap:.3f}, same best mentor {same_best:.3f}")
+
+
+def extract_people_data_per_column(csv_file_path: str, filter):
+    # The reading loop extract_people_data had before csv_reader.py, kept for comparison: it walks every column of
+    # every row, checks it against all the needed indices and recomputes the highest index on every column
+    def get_max_index():
+        return max(filter.name_index, filter.status_index, filter.confirmed_index, *filter.interests_indices,
+                   *filter.hobbies_indices, filter.project_type_index, filter.hours_per_week_index)
+
+    people = list()
+    for row in read_rows(csv_file_path):
+        interests = ""
+        hobbies = ""
+        project_type = ""
+        hours_per_week = 0
+        for col_i in range(0, len(row)):
+            if col_i in filter.interests_indices:
+                interests += f"{row[col_i]}{os.linesep}"
+            if col_i in filter.hobbies_indices:
+                hobbies += f"{row[col_i]}{os.linesep}"
+            if col_i == filter.project_type_index:
+                project_type = row[col_i]
+            if col_i == filter.hours_per_week_index:
+                hours_per_week = row[col_i]
+            if col_i >= get_max_index():
+                people.append((row[filter.name_index], interests, hobbies, project_type, hours_per_week))
+                break
+    return people
+
+
+def benchmark_csv():
+    print(f"csv reading ({CSV_ROWS_COUNT} students' rows): time per row")
+    with tempfile.TemporaryDirectory() as directory:
+        students_csv_file_path, _ = create_match_data(directory, CSV_ROWS_COUNT, 0)
+        students_filter = get_students_filter()
+        readers = {
+            "csv.reader only": lambda: list(read_rows(students_csv_file_path)),
+            "per column loop": lambda: extract_people_data_per_column(students_csv_file_path, students_filter),
+            "projected records": lambda: list(read_records(students_csv_file_path, students_filter.get_columns(), snapshots_directory=None)),
+            "extract_people_data": lambda: extract_people_data(students_csv_file_path, students_filter, None),
+            # The first read parses the file and writes the snapshot, the next ones load it
+            "extract_people_data, new snapshot": lambda: extract_people_data(students_csv_file_path, students_filter, directory),
+            "extract_people_data, from snapshot": lambda: extract_people_data(students_csv_file_path, students_filter, directory),
+        }
+        for name, read in readers.items():
+            start = time.perf_counter()
+            read()
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed:.3f}s, {elapsed / CSV_ROWS_COUNT * 1e6:.2f}us per row")
+
+
+def run_suite_scale(scale: int, backend: str):
+    with tempfile.TemporaryDirectory() as directory:
+        students_csv_file_path, mentors_csv_file_path = create_match_data(directory, scale, scale)
+
+        start = time.perf_counter()
+        students = extract_people_data(students_csv_file_path, get_students_filter(), None)
+        mentors = extract_people_data(mentors_csv_file_path, get_mentors_filter(), None)
+        extract_time = time.perf_counter() - start
+
+    encoder = TfidfEncoder() if backend == TFIDF_BACKEND else load_model()
+    start = time.perf_counter()
+    encode_people(encoder, students + mentors)
+    students_matrices = get_people_matrices(encoder, students)
+    mentors_matrices = get_people_matrices(encoder, mentors)
+    encoding_time = time.perf_counter() - start
+
+    # Streamed, so that the largest scale doesn't need the full matrix in memory
+    start = time.perf_counter()
+    for _ in find_top_mentors_streamed(students_matrices, mentors_matrices):
+        pass
+    scoring_time = time.perf_counter() - start
+
+    return {
+        "students": len(students),
+        "mentors": len(mentors),
+        "extract_people_data": extract_time,
+        "encoding": encoding_time,
+        "scoring": scoring_time,
+    }
+
+
+def benchmark_suite():
+    backend = get_scoring_backend()
+    print(f"suite on synthetic csv files ({backend} backend): scales {SUITE_SCALES}")
+    baseline = dict()
+    if os.path.exists(SUITE_BASELINE_FILE_PATH):
+        with open(SUITE_BASELINE_FILE_PATH, mode="r", encoding="utf-8") as file_stream:
+            baseline = json.load(file_stream)
+
+    results = dict()
+    for scale in SUITE_SCALES:
+        result = run_suite_scale(scale, backend)
+        results[str(scale)] = result
+        baseline_result = baseline.get(backend, dict()).get(str(scale))
+        line = f"{scale} rows ({result['students']} students x {result['mentors']} mentors):"
+        for stage in ["extract_people_data", "encoding", "scoring"]:
+            line += f" {stage} {result[stage]:.3f}s"
+            if baseline_result is not None:
+                line += f" ({result[stage] / baseline_result[stage]:.2f}x baseline)"
+        if baseline_result is None:
+            line += " (no baseline)"
+        print(line)
+
+    if "--save-baseline" in sys.argv[1:]:
+        baseline[backend] = results
+        with open(SUITE_BASELINE_FILE_PATH, mode="w", encoding="utf-8") as file_stream:
+            json.dump(baseline, file_stream, indent=4)
+        print(f"baseline saved to {SUITE_BASELINE_FILE_PATH}")
+
+
+BENCHMARKS = {
+    "assignment": benchmark_assignment,
+    "ann": benchmark_ann,
+    "encoding": benchmark_encoding,
+    "stream": benchmark_stream,
+    "quantization": benchmark_quantization,
+    "backends": benchmark_backends,
+    "suite": benchmark_suite,
+    "csv": benchmark_csv,
+}
+
+
+if __name__ == "__main__":
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or BENCHMARKS.keys()
+    for name in names:
+        BENCHMARKS[name]()
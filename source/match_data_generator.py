@@ -0,0 +1,124 @@
+import csv
+import numpy
+import os
+import sys
+from match import (MENTOR_CONFIRMED, MENTOR_EDUCATION, MENTOR_HOBBIES, MENTOR_HOURS_PER_WEEK, MENTOR_NAME,
+                   MENTOR_PROFESIONAL_EXPERIENCE, MENTOR_PROJECT_TYPE, MENTOR_STATUS, MENTOR_AREAS_OF_INTEREST,
+                   MENTORS_CSV_FILE_NAME, STUDENT_AREAS_OF_INTEREST, STUDENT_CONFIRMED, STUDENT_HOBBIES,
+                   STUDENT_HOURS_PER_WEEK, STUDENT_MENTOR_PROFESIONAL_EXPERIENCE, STUDENT_NAME,
+                   STUDENT_NON_SCHOOL_INTERESTS, STUDENT_PROJECT_TYPE, STUDENT_SPORT, STUDENT_STATUS,
+                   STUDENTS_CSV_FILE_NAME)
+
+# Writes synthetic match_data_students.csv and match_data_mentors.csv files with the registry's column layout.
+# Usage: python match_data_generator.py <students count> <mentors count> [output directory] [random seed]
+
+RANDOM_SEED = 0
+
+FIRST_NAMES = ["Иван", "Мария", "Георги", "Елена", "Димитър", "Никол", "Петър", "Виктория", "Александър", "Габриела",
+               "Мартин", "Рая", "Николай", "Симона", "Стефан", "Йоана", "Калоян", "Теодора", "Борис", "Дария"]
+LAST_NAMES = ["Иванов", "Петров", "Георгиев", "Димитров", "Стоянов", "Николов", "Христов", "Тодоров", "Колев", "Маринов"]
+
+AREAS = ["програмиране", "роботика", "изкуствен интелект", "математика", "физика", "химия", "биология", "медицина",
+         "психология", "право", "икономика", "маркетинг", "предприемачество", "финанси", "журналистика", "литература",
+         "история", "философия", "архитектура", "графичен дизайн", "фотография", "музика", "театър", "кино",
+         "екология", "доброволчество", "политология", "международни отношения", "инженерство", "образование"]
+HOBBIES = ["футбол", "баскетбол", "волейбол", "плуване", "тенис", "шах", "планинарство", "колоездене", "танци", "йога",
+           "четене на книги", "рисуване", "свирене на китара", "пиано", "готвене", "компютърни игри", "пътувания",
+           "фотография", "бягане", "фитнес"]
+PROJECT_TYPES = ["Социален проект", "Технологичен проект", "Бизнес проект", "Научен проект", "Творчески проект",
+                 "Не съм решил/а"]
+HOURS_PER_WEEK = ["1", "2", "3", "4", "5", "6", "Повече от 6"]
+
+INTEREST_TEMPLATES = ["Интересувам се от {0} и {1}.", "{0}, {1}", "Най-много ме вълнува {0}, но харесвам и {1}.",
+                      "Искам да се развивам в сферата на {0}.", "{0}"]
+EXPERIENCE_TEMPLATES = ["Работя в сферата на {0} от няколко години.", "Завършил/а съм {0}.", "{0} и {1}",
+                        "Опит в {0}, преди това {1}."]
+HOBBY_TEMPLATES = ["{0}", "{0}, {1}", "Обичам {0} и {1}.", "В свободното си време се занимавам с {0}."]
+
+STUDENT_STATUSES = ["", "", "", "", "matched", "Отпаднал - не отговаря"]
+STUDENT_CONFIRMATIONS = ["Да", "Да", "Да", "Не"]
+MENTOR_STATUSES = ["", "", "", "", "matched", "no matching!"]
+MENTOR_CONFIRMATIONS = ["", "confirmed", "confirmed", "denied"]
+
+
+def create_text(rng, templates: list[str], options: list[str]):
+    # Most people lean to a few options, like real registrations do
+    first, second = rng.choice(options, size=2, replace=False)
+    return str(rng.choice(templates)).format(first, second)
+
+
+def create_name(rng, number: int):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {number}"
+
+
+def write_csv(file_path: str, columns_count: int, rows: list[list[str]]):
+    with open(file_path, mode="w", encoding="utf-8", newline="") as file_stream:
+        writer = csv.writer(file_stream, delimiter=',', quotechar='"')
+        writer.writerow([f"Column {i + 1}" for i in range(columns_count)])
+        writer.writerows(rows)
+
+
+def create_students_csv(file_path: str, count: int, rng):
+    columns_count = max(STUDENT_NAME, STUDENT_STATUS, STUDENT_CONFIRMED, STUDENT_NON_SCHOOL_INTERESTS,
+                        STUDENT_AREAS_OF_INTEREST, STUDENT_MENTOR_PROFESIONAL_EXPERIENCE, STUDENT_SPORT,
+                        STUDENT_HOBBIES, STUDENT_PROJECT_TYPE, STUDENT_HOURS_PER_WEEK) + 1
+    rows = list()
+    for i in range(count):
+        row = [""] * columns_count
+        row[STUDENT_NAME] = create_name(rng, i)
+        row[STUDENT_STATUS] = str(rng.choice(STUDENT_STATUSES))
+        row[STUDENT_CONFIRMED] = str(rng.choice(STUDENT_CONFIRMATIONS))
+        row[STUDENT_NON_SCHOOL_INTERESTS] = create_text(rng, INTEREST_TEMPLATES, AREAS)
+        row[STUDENT_AREAS_OF_INTEREST] = create_text(rng, INTEREST_TEMPLATES, AREAS)
+        row[STUDENT_MENTOR_PROFESIONAL_EXPERIENCE] = create_text(rng, INTEREST_TEMPLATES, AREAS)
+        row[STUDENT_SPORT] = str(rng.choice(HOBBIES))
+        row[STUDENT_HOBBIES] = create_text(rng, HOBBY_TEMPLATES, HOBBIES)
+        row[STUDENT_PROJECT_TYPE] = str(rng.choice(PROJECT_TYPES))
+        row[STUDENT_HOURS_PER_WEEK] = str(rng.choice(HOURS_PER_WEEK))
+        rows.append(row)
+    write_csv(file_path, columns_count, rows)
+
+
+def create_mentors_csv(file_path: str, count: int, rng):
+    columns_count = max(MENTOR_NAME, MENTOR_STATUS, MENTOR_CONFIRMED, MENTOR_EDUCATION, MENTOR_PROFESIONAL_EXPERIENCE,
+                        MENTOR_AREAS_OF_INTEREST, MENTOR_HOBBIES, MENTOR_PROJECT_TYPE, MENTOR_HOURS_PER_WEEK) + 1
+    rows = list()
+    for i in range(count):
+        row = [""] * columns_count
+        row[MENTOR_NAME] = create_name(rng, i)
+        row[MENTOR_STATUS] = str(rng.choice(MENTOR_STATUSES))
+        row[MENTOR_CONFIRMED] = str(rng.choice(MENTOR_CONFIRMATIONS))
+        row[MENTOR_EDUCATION] = create_text(rng, EXPERIENCE_TEMPLATES, AREAS)
+        row[MENTOR_PROFESIONAL_EXPERIENCE] = create_text(rng, EXPERIENCE_TEMPLATES, AREAS)
+        row[MENTOR_AREAS_OF_INTEREST] = create_text(rng, INTEREST_TEMPLATES, AREAS)
+        row[MENTOR_HOBBIES] = create_text(rng, HOBBY_TEMPLATES, HOBBIES)
+        row[MENTOR_PROJECT_TYPE] = str(rng.choice(PROJECT_TYPES))
+        row[MENTOR_HOURS_PER_WEEK] = str(rng.choice(HOURS_PER_WEEK))
+        rows.append(row)
+    write_csv(file_path, columns_count, rows)
+
+
+def create_match_data(output_directory: str, students_count: int, mentors_count: int, random_seed: int = RANDOM_SEED):
+    # Returns the paths of the students' and the mentors' csv files
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    rng = numpy.random.default_rng(random_seed)
+    students_csv_file_path = f"{output_directory}/{STUDENTS_CSV_FILE_NAME}"
+    mentors_csv_file_path = f"{output_directory}/{MENTORS_CSV_FILE_NAME}"
+    create_students_csv(students_csv_file_path, students_count, rng)
+    create_mentors_csv(mentors_csv_file_path, mentors_count, rng)
+    return students_csv_file_path, mentors_csv_file_path
+
+
+def create_synthetic_texts(rng, count: int):
+    return [create_text(rng, INTEREST_TEMPLATES + HOBBY_TEMPLATES, AREAS + HOBBIES) for _ in range(count)]
+
+
+if __name__ == "__main__":
+    students_count = int(sys.argv[1])
+    mentors_count = int(sys.argv[2])
+    output_directory = sys.argv[3] if len(sys.argv) > 3 else os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
+    random_seed = int(sys.argv[4]) if len(sys.argv) > 4 else RANDOM_SEED
+    for file_path in create_match_data(output_directory, students_count, mentors_count, random_seed):
+        print(f"written {file_path}")
@@ -0,0 +1,52 @@
+import csv
+import numpy
+import os
+
+
+CSV_HEADER = ["student", "mentor", "interests", "hobbies", "project_type", "hours_per_week", "percent"]
+COMPONENTS = ["interests", "hobbies", "project_type", "hours_per_week"]
+
+
+class MatchRecords:
+    """
+    One record per candidate pair, stored by columns: the student and mentor are indices into the names arrays,
+    the components are the cosine similarities of the fields (hours per week in [0, 1]) and percent is the final score.
+    """
+
+    def __init__(self, students_names: numpy.ndarray, mentors_names: numpy.ndarray, students: numpy.ndarray, mentors: numpy.ndarray,
+                 components: dict[str, numpy.ndarray], percents: numpy.ndarray):
+        self.students_names = students_names
+        self.mentors_names = mentors_names
+        self.students = students
+        self.mentors = mentors
+        self.components = components
+        self.percents = percents
+
+    def __len__(self):
+        return len(self.percents)
+
+    def subset(self, mask):
+        # e.g. records.subset(records.percents >= 70) or records.subset(records.components["hobbies"] > 0.5)
+        return MatchRecords(self.students_names, self.mentors_names, self.students[mask], self.mentors[mask],
+                            {name: values[mask] for name, values in self.components.items()}, self.percents[mask])
+
+    @staticmethod
+    def load(file_path: str):
+        with numpy.load(file_path) as data:
+            return MatchRecords(data["students_names"], data["mentors_names"], data["students"], data["mentors"],
+                                {name: data[name] for name in COMPONENTS}, data["percents"])
+
+    def save(self, file_path: str):
+        # Compact binary columns, the names are stored once and the pairs refer to them by index
+        temp_file_path = f"{file_path}.tmp.npz"
+        numpy.savez_compressed(temp_file_path, students_names=self.students_names, mentors_names=self.mentors_names,
+                               students=self.students, mentors=self.mentors, percents=self.percents, **self.components)
+        os.replace(temp_file_path, file_path)
+
+    def save_csv(self, file_path: str):
+        with open(file_path, mode="w", encoding="utf-8", newline="") as file_stream:
+            writer = csv.writer(file_stream, delimiter=',', quotechar='"')
+            writer.writerow(CSV_HEADER)
+            components = [numpy.round(self.components[name].astype(numpy.float64), 4).tolist() for name in COMPONENTS]
+            writer.writerows(zip(self.students_names[self.students].tolist(), self.mentors_names[self.mentors].tolist(),
+                                 *components, self.percents.tolist()))
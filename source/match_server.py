@@ -0,0 +1,204 @@
+import json
+import os
+import traceback
+import urllib.parse
+from csv_snapshot import get_snapshots_directory
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from match import (EMBEDDING_CACHE_DIRECTORY, EMBEDDING_CACHE_MAX_ENTRIES, MATCH_SERVER_HOST, MATCH_SERVER_PORT,
+                   MENTORS_CSV_FILE_PATH, MODEL_NAME, STUDENTS_CSV_FILE_PATH, TFIDF_BACKEND, EmbeddingCache,
+                   LazyModel, TfidfEncoder, encode_people, extract_people_data, find_top_mentors, get_embedding_dtype,
+                   get_mentors_filter, get_people_matrices, get_scoring_backend, get_students_filter,
+                   iter_match_entries, load_model, score_people_matrices)
+from quantization import FLOAT32
+
+# Keeps the model and the people's embeddings in memory and answers queries over local HTTP.
+# 1. $ python match_server.py [--backend=tfidf] [--dtype=float16|int8]
+# 2. $ python match.py --client [--assign] [--ann] [--stream] (with the server's --backend and --dtype)
+#    $ curl "http://localhost:8765/top?student=<name>&n=10"
+#    $ curl "http://localhost:8765/pair?student=<name>&mentor=<name>"
+# The backend and the dtype are chosen as in match.py, so the server's results are the same as the local run's.
+# The csv files are reloaded when they change on disk.
+# Invalid queries are answered with 400, unknown people with 404 and any other error with 500, always as
+# {"error": "..."}.
+
+DEFAULT_TOP_COUNT = 10
+
+
+class RequestError(ValueError):
+    # A query that can't be answered, with the HTTP status to answer it with
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def get_flag_param(params: dict, name: str):
+    value = params.get(name, "0")
+    if value not in ["0", "1"]:
+        raise RequestError(400, f"'{name}' must be 0 or 1, got '{value}'")
+    return value == "1"
+
+
+def get_count_param(params: dict, name: str, default: int):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        count = int(value)
+    except ValueError:
+        raise RequestError(400, f"'{name}' must be an integer, got '{value}'") from None
+    if count < 1:
+        raise RequestError(400, f"'{name}' must be at least 1, got {count}")
+    return count
+
+
+def get_required_param(params: dict, name: str):
+    if name not in params:
+        raise RequestError(400, f"Missing '{name}'")
+    return params[name]
+
+
+def check_param(params: dict, name: str, expected: str):
+    # The client's choice has to be the server's one, otherwise the results would differ from a local run
+    value = params.get(name, expected)
+    if value != expected:
+        raise RequestError(400, f"The server runs with --{name}={expected}, got '{value}'")
+
+
+class MatcherState:
+    def __init__(self):
+        self.backend = get_scoring_backend()
+        self.dtype = get_embedding_dtype()
+        # The TF-IDF vectors depend on all texts of a field, so the encoder is fitted again on every reload
+        # Loaded on the first texts missing from the cache
+        self.model = LazyModel(load_model) if self.backend != TFIDF_BACKEND else None
+        self.cache = EmbeddingCache(EMBEDDING_CACHE_DIRECTORY, MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES, self.dtype)
+        self.csv_modification_times = None
+        self.students = list()
+        self.mentors = list()
+        self.students_matrices = None
+        self.mentors_matrices = None
+        self.students_indices = dict()
+        self.mentors_indices = dict()
+
+    def reload_if_changed(self):
+        csv_modification_times = (os.path.getmtime(STUDENTS_CSV_FILE_PATH), os.path.getmtime(MENTORS_CSV_FILE_PATH))
+        if csv_modification_times == self.csv_modification_times:
+            return
+
+        print("loading csv files")
+        self.students = extract_people_data(STUDENTS_CSV_FILE_PATH, get_students_filter(), get_snapshots_directory())
+        self.mentors = extract_people_data(MENTORS_CSV_FILE_PATH, get_mentors_filter(), get_snapshots_directory())
+        if self.backend == TFIDF_BACKEND:
+            model = TfidfEncoder()
+            encode_people(model, self.students + self.mentors)
+        else:
+            model = self.model
+            encode_people(model, self.students + self.mentors, self.cache)  # only new texts are encoded
+            self.cache.save()
+        self.students_matrices = self.get_matrices(model, self.students)
+        self.mentors_matrices = self.get_matrices(model, self.mentors)
+        self.students_indices = {student.name: i for i, student in enumerate(self.students)}
+        self.mentors_indices = {mentor.name: i for i, mentor in enumerate(self.mentors)}
+        self.csv_modification_times = csv_modification_times
+
+    def get_matrices(self, model, people: list):
+        if not people:
+            return None
+        matrices = get_people_matrices(model, people)
+        return matrices.quantize(self.dtype) if self.dtype != FLOAT32 else matrices
+
+    def get_student_index(self, student_name: str):
+        if student_name not in self.students_indices:
+            raise RequestError(404, f"Unknown student '{student_name}'")
+        return self.students_indices[student_name]
+
+    def get_mentor_index(self, mentor_name: str):
+        if mentor_name not in self.mentors_indices:
+            raise RequestError(404, f"Unknown mentor '{mentor_name}'")
+        return self.mentors_indices[mentor_name]
+
+    def get_matches(self, assignment_mode: bool, ann_mode: bool, stream_mode: bool):
+        if not self.students or not self.mentors:
+            return list()
+        # As in match.py, the assignment needs the full similarity matrix and isn't streamed
+        stream_mode = stream_mode and not assignment_mode
+        return list(iter_match_entries(self.students, self.mentors, self.students_matrices, self.mentors_matrices,
+                                       assignment_mode, ann_mode, stream_mode))
+
+    def get_top_mentors(self, student_name: str, count: int):
+        i_student = self.get_student_index(student_name)
+        if not self.mentors:
+            return list()
+        mentors_indices, percents = next(find_top_mentors(self.students_matrices.subset([i_student]), self.mentors_matrices))
+        return [{"mentor": self.mentors[i].name, "percent": int(p)} for i, p in zip(mentors_indices[:count], percents[:count])]
+
+    def get_pair_percent(self, student_name: str, mentor_name: str):
+        i_student = self.get_student_index(student_name)
+        i_mentor = self.get_mentor_index(mentor_name)
+        percents = score_people_matrices(self.students_matrices.subset([i_student]), self.mentors_matrices.subset([i_mentor]))
+        return {"student": student_name, "mentor": mentor_name, "percent": int(percents[0, 0])}
+
+
+class MatcherRequestHandler(BaseHTTPRequestHandler):
+    state: MatcherState = None
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        try:
+            result = self.answer(url.path, params)
+        except RequestError as ex:
+            self.send_json(ex.status, {"error": str(ex)})
+            return
+        except Exception as ex:
+            traceback.print_exc()
+            self.send_json(500, {"error": f"{type(ex).__name__}: {ex}"})
+            return
+
+        self.send_json(200, result)
+
+    def answer(self, path: str, params: dict):
+        # The query is checked before the csv files are reloaded
+        if path == "/matches":
+            check_param(params, "backend", self.state.backend)
+            check_param(params, "dtype", self.state.dtype)
+            modes = [get_flag_param(params, name) for name in ["assign", "ann", "stream"]]
+            self.state.reload_if_changed()
+            return self.state.get_matches(*modes)
+        if path == "/top":
+            student_name = get_required_param(params, "student")
+            count = get_count_param(params, "n", DEFAULT_TOP_COUNT)
+            self.state.reload_if_changed()
+            return self.state.get_top_mentors(student_name, count)
+        if path == "/pair":
+            student_name = get_required_param(params, "student")
+            mentor_name = get_required_param(params, "mentor")
+            self.state.reload_if_changed()
+            return self.state.get_pair_percent(student_name, mentor_name)
+        raise RequestError(404, f"Unknown path '{path}'")
+
+    def send_json(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_server():
+    # The model isn't thread safe, so the requests are served one at a time
+    MatcherRequestHandler.state = MatcherState()
+    MatcherRequestHandler.state.reload_if_changed()
+    server = HTTPServer((MATCH_SERVER_HOST, MATCH_SERVER_PORT), MatcherRequestHandler)
+    print(f"matcher server listening on http://{MATCH_SERVER_HOST}:{MATCH_SERVER_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    run_server()
@@ -0,0 +1,83 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time and peak traced memory of named stages, plus named counters.
+    Does nothing until it's enabled, so it can stay in the code paths.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = dict()
+        self.counters = dict()
+        self._start_wall_time = None
+        self._start_cpu_time = None
+
+    def enable(self):
+        self.enabled = True
+        self.stages = dict()
+        self.counters = dict()
+        self._start_wall_time = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+        tracemalloc.start()
+
+    def disable(self):
+        if self.enabled:
+            tracemalloc.stop()
+        self.enabled = False
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            # A stage that runs several times accumulates its times and keeps its highest peak
+            stage = self.stages.setdefault(name, {"wall_time": 0.0, "cpu_time": 0.0, "peak_memory": 0, "runs": 0})
+            stage["wall_time"] += time.perf_counter() - start_wall_time
+            stage["cpu_time"] += time.process_time() - start_cpu_time
+            stage["peak_memory"] = max(stage["peak_memory"], tracemalloc.get_traced_memory()[1] - start_memory)
+            stage["runs"] += 1
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_report(self):
+        return {
+            "total": {
+                "wall_time": time.perf_counter() - self._start_wall_time,
+                "cpu_time": time.process_time() - self._start_cpu_time,
+                "peak_memory": tracemalloc.get_traced_memory()[1] if self.enabled else 0,
+            },
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+
+    def get_summary(self, report: dict):
+        lines = [f"{'stage':<24}{'wall':>10}{'cpu':>10}{'peak memory':>14}"]
+        for name, stage in list(report["stages"].items()) + [("total", report["total"])]:
+            lines.append(f"{name:<24}{stage['wall_time']:>9.3f}s{stage['cpu_time']:>9.3f}s{stage['peak_memory'] / 2 ** 20:>10.1f} MiB")
+        for name, value in report["counters"].items():
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+    def save(self, file_path: str, extra: dict = None):
+        # Writes the JSON report and returns the short summary
+        report = self.get_report()
+        if extra:
+            report.update(extra)
+        with open(file_path, mode="w", encoding="utf-8") as file_stream:
+            json.dump(report, file_stream, indent=4)
+        return self.get_summary(report)
@@ -0,0 +1,116 @@
+import numpy
+from scipy import sparse
+
+
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT8 = "int8"
+DTYPES = [FLOAT32, FLOAT16, INT8]
+
+INT8_MAX = 127
+SPARSE_DOT_TILE_SIZE = 1024  # the rows of a sparse matrix made dense at a time in a dot product
+
+
+class QuantizedVectors:
+    """
+    A matrix of vectors (one per row) stored as float32, float16 or int8.
+    int8 vectors have a per-vector scale: vector = values * scale.
+    """
+
+    def __init__(self, values: numpy.ndarray, scales: numpy.ndarray = None):
+        self.values = values
+        self.scales = scales
+
+    @staticmethod
+    def quantize(vectors: numpy.ndarray, dtype: str):
+        vectors = numpy.asarray(vectors, dtype=numpy.float32)
+        if dtype == FLOAT32:
+            return QuantizedVectors(vectors)
+        if dtype == FLOAT16:
+            return QuantizedVectors(vectors.astype(numpy.float16))
+        if dtype == INT8:
+            scales = numpy.abs(vectors).max(axis=1) / INT8_MAX if len(vectors) > 0 else numpy.zeros(0)
+            scales = scales.astype(numpy.float32)
+            scales[scales == 0] = 1
+            values = numpy.rint(vectors / scales[:, None]).astype(numpy.int8)
+            return QuantizedVectors(values, scales)
+        raise ValueError(f"Unknown dtype '{dtype}'")
+
+    @property
+    def dtype(self):
+        return str(self.values.dtype)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, indices):
+        return QuantizedVectors(self.values[indices], self.scales[indices] if self.scales is not None else None)
+
+    def dequantize(self) -> numpy.ndarray:
+        values = self.values.astype(numpy.float32)
+        if self.scales is not None:
+            values *= self.scales[:, None]
+        return values
+
+    def dot(self, other) -> numpy.ndarray:
+        # Dot product of every row with every row of 'other'.
+        # numpy has no BLAS kernels for float16 or int8, so the products run in float32. For int8 that's still exact,
+        # the integer sums stay far below 2^24, and the per-vector scales are applied to the result.
+        products = self.values.astype(numpy.float32) @ other.values.astype(numpy.float32).T
+        if self.scales is not None:
+            products *= self.scales[:, None]
+        if other.scales is not None:
+            products *= other.scales[None, :]
+        return products
+
+
+def as_float32(vectors) -> numpy.ndarray:
+    if isinstance(vectors, QuantizedVectors):
+        return vectors.dequantize()
+    return vectors
+
+
+def to_dense_tile(tile) -> numpy.ndarray:
+    return tile.toarray() if sparse.issparse(tile) else as_float32(tile)
+
+
+def dot_sparse(a, b) -> numpy.ndarray:
+    # The products of two sparse matrices only depend on the columns that have values in both, and with those
+    # few columns BLAS on dense tiles is faster than any sparse product, so only SPARSE_DOT_TILE_SIZE rows of
+    # each matrix are made dense at a time
+    if sparse.issparse(a) and sparse.issparse(b):
+        shared_columns = numpy.intersect1d(a.indices, b.indices)
+        a, b = a[:, shared_columns], b[:, shared_columns]
+
+    products = numpy.empty((a.shape[0], b.shape[0]), dtype=numpy.float32)
+    for a_start in range(0, a.shape[0], SPARSE_DOT_TILE_SIZE):
+        a_tile = to_dense_tile(a[a_start:a_start + SPARSE_DOT_TILE_SIZE])
+        for b_start in range(0, b.shape[0], SPARSE_DOT_TILE_SIZE):
+            b_tile = to_dense_tile(b[b_start:b_start + SPARSE_DOT_TILE_SIZE])
+            products[a_start:a_start + a_tile.shape[0], b_start:b_start + b_tile.shape[0]] = a_tile @ b_tile.T
+    return products
+
+
+def dot(a, b) -> numpy.ndarray:
+    # Dot product of every row of 'a' with every row of 'b', for plain, quantized or sparse (csr_matrix) vectors
+    if sparse.issparse(a) or sparse.issparse(b):
+        return dot_sparse(a, b)
+    if isinstance(a, QuantizedVectors) or isinstance(b, QuantizedVectors):
+        if not isinstance(a, QuantizedVectors):
+            a = QuantizedVectors(a)
+        if not isinstance(b, QuantizedVectors):
+            b = QuantizedVectors(b)
+        return a.dot(b)
+    return a @ b.T
+
+
+def dot_rows(a, b) -> numpy.ndarray:
+    # Dot product of every row of 'a' with the same row of 'b'
+    if sparse.issparse(a) or sparse.issparse(b):
+        product = a.multiply(b) if sparse.issparse(a) else b.multiply(a)
+        return numpy.asarray(product.sum(axis=1), dtype=numpy.float32).ravel()
+    return numpy.einsum("ij,ij->i", as_float32(a), as_float32(b))
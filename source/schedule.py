@@ -1,9 +1,19 @@
+import datetime
+import heapq
 import math
+import numpy
 import os
 import pandas
 import json
 import random
+import sys
+import time
 import xlsxwriter
+from concurrent.futures import ProcessPoolExecutor
+from csv_reader import get_column_index, load_csv_columns
+from csv_snapshot import get_snapshots_directory
+from hall_assignment import find_balanced_assignment
+from timeline import TimelineIndex
 from xlsxwriter.workbook import Workbook
 from xlsxwriter.worksheet import Worksheet
 
@@ -14,6 +24,38 @@ CONFIG_FILE_PATH = f"{CURRENT_DIRECTORY}/{CONFIG_FILE_NAME}"
 TEAMS_FILE_NAME = "schedule_teams.csv"
 TEAMS_FILE_PATH = f"{CURRENT_DIRECTORY}/{TEAMS_FILE_NAME}"
 SCHEDULE_FILE_NAME = "schedule_{0}.xlsx"
+SEARCH_SUMMARY_FILE_NAME = "schedule_{0}_search.txt"
+SCHEDULES_FILE_NAME = "schedules.xlsx"
+CONFLICTS_FILE_NAME = "schedule_{0}_conflicts.txt"
+SCHEDULE_STATE_FILE_NAME = "schedule_{0}_state.json"
+CHANGES_FILE_NAME = "schedule_{0}_changes.txt"
+SCHEDULES_CONFLICTS_FILE_NAME = "schedules_conflicts.txt"
+SCHEDULE_SHEET_NAME = "Schedule"
+MAX_SHEET_NAME_LENGTH = 31
+
+# Search mode (--search or --search=N): N candidate schedules with the seeds random_seed, random_seed + 1, ...
+# are scored on --workers=M processes (all cores by default) and the best one is written.
+# The score is the weighted sum below, lower is better.
+# Batch mode (--batch): the config and the teams are read once, the teams are split between all seasons
+# in schedule.json in one pass and the seasons' schedules are created and written on --workers=M processes.
+# With --single-workbook all seasons are written to schedules.xlsx, a sheet per season.
+# --sheets=halls writes every hall on its own sheet.
+SEARCH_CANDIDATES_COUNT = 2000
+SEARCH_SEEDS_PER_TASK = 50
+SEARCH_SUMMARY_SIZE = 20
+MAX_END_TIME_WEIGHT = 1  # per minute of the hall that finishes last
+IMBALANCE_WEIGHT = 0.5  # per minute between the halls that finish first and last
+COORDINATOR_BREAKS_WEIGHT = 1  # per time a coordinator's teams are interrupted by another coordinator's team
+CONFLICTS_WEIGHT = 1000  # per team whose coordinator or mentor is expected in another hall at the same time
+
+# Update mode (--update): the teams of the last written schedule (schedule_<season>_state.json) are updated with
+# the current teams' csv with as few moves as possible, the other teams keep their halls, numbers and start times.
+# The moved, added and removed teams are written to schedule_<season>_changes.txt.
+
+# Conflicts: every team's coordinator and mentor are busy for the team's time. The teams of all halls
+# (and in batch mode of all seasons) are checked for people expected in two places at once, the conflicts are
+# written to schedule_<season>_conflicts.txt (schedules_conflicts.txt in batch mode).
+MINUTES_PER_DAY = 24 * 60
 
 # Config keys
 CSV = "csv"
@@ -40,15 +82,29 @@ HALLS = "halls"
 NAME = "name"
 COORDINATORS = "coordinators"
 RANDOM_SEED = "random_seed"
-
-
-def get_column_index(column):
-    # 26 number system where [A...Z] is mapped to [1...26]
-    decimal_value = 0
-    for idx in reversed(range(0, len(column))):
-        decimal_value += (ord(column[idx]) - ord("A") + 1) * math.pow(26, len(column) - idx - 1)
-
-    return int(decimal_value - 1)  # the index is the decimal value minus 1
+HALL_ASSIGNMENT = "hall_assignment"
+DATE = "date"  # optional, "YYYY-MM-DD", the seasons without a date are taken as on the same day
+
+# Hall assignments: the halls take the coordinators one after the other until they have their share of the teams
+# (the default), or the coordinators are balanced over the halls so that the last team of every hall ends about
+# the same time. The balanced one is opt-in, with "hall_assignment": "balanced" in a season's config.
+SEQUENTIAL_HALL_ASSIGNMENT = "sequential"
+BALANCED_HALL_ASSIGNMENT = "balanced"
+
+# Teams' csv
+ACTIVE = "Активен"
+TEAMS_COLUMNS = [ACTIVE_COLUMN, STUDENT_COLUMN, MENTOR_COLUMN, COORDINATOR_COLUMN, SEASON_TYPE_COLUMN]
+CATEGORICAL_TEAMS_COLUMNS = [ACTIVE_COLUMN, COORDINATOR_COLUMN, SEASON_TYPE_COLUMN]
+
+# Sheets
+SCHEDULE_SHEETS = "schedule"
+HALL_SHEETS = "halls"
+SLOT_HEADER_ROWS = 2
+SLOT_COLUMNS = 5
+SLOT_COLUMNS_TITLES = ["#", "Ученик", "Ментор", "Координатор", ""]
+NORMAL_FORMAT = "normal"
+BOLD_FORMAT = "bold"
+HEADER_FORMAT = "header"
 
 
 class Slot:
@@ -73,154 +129,588 @@ class Team:
         return f"({self.number}, {self.student_name}, {self.mentor_name}, {self.coordinator_name}, {self.start_time})"
 
 
-def get_config(season: str):
-    with open(CONFIG_FILE_PATH, mode="r", encoding="utf-8") as file_stream:
-        js = json.load(file_stream)
-        config = {
-            # csv
-            ACTIVE_COLUMN: js[CSV][ACTIVE_COLUMN],
-            STUDENT_COLUMN: js[CSV][STUDENT_COLUMN],
-            MENTOR_COLUMN: js[CSV][MENTOR_COLUMN],
-            COORDINATOR_COLUMN: js[CSV][COORDINATOR_COLUMN],
-            SEASON_TYPE_COLUMN: js[CSV][SEASON_TYPE_COLUMN],
-            # format
-            ROW_HEIGHT: js[FORMAT][ROW_HEIGHT],
-            COLUMN_WIDTH: js[FORMAT][COLUMN_WIDTH],
-            ROWS_BETWEEN_SLOTS: js[FORMAT][ROWS_BETWEEN_SLOTS],
-            COLUMNS_BETWEEN_SLOTS: js[FORMAT][COLUMNS_BETWEEN_SLOTS],
-            # season
-            SEASON_TYPES: js[season][SEASON_TYPES],
-            SLOT_SIZE: js[season][SLOT_SIZE],
-            START_TIME: js[season][START_TIME],
-            TIME_PER_TEAM_IN_MINUTES: js[season][TIME_PER_TEAM_IN_MINUTES],
-            TIME_BETWEEN_SLOTS_IN_MINUTES: js[season][TIME_BETWEEN_SLOTS_IN_MINUTES],
-            HALLS: js[season][HALLS],
-            RANDOM_SEED: js[season][RANDOM_SEED],
-        }
-
-        return config
-
-
-def get_column_name(csv_data, column_index: int):
-    column_name = csv_data.columns[column_index]
-    return column_name
-
-
-def get_column_data(csv_data, column_index: int):
-    column_name = get_column_name(csv_data, column_index)
-    column_data = [x.strip() for x in csv_data[column_name].tolist()]
-    return column_data
-
-
-def get_teams(config, csv_data):
-    active_column_index = get_column_index(config[ACTIVE_COLUMN])
-    student_column_index = get_column_index(config[STUDENT_COLUMN])
-    mentor_column_index = get_column_index(config[MENTOR_COLUMN])
-    coordinator_column_index = get_column_index(config[COORDINATOR_COLUMN])
-    season_type_column_index = get_column_index(config[SEASON_TYPE_COLUMN])
-
-    active = get_column_data(csv_data, active_column_index)
-    students = get_column_data(csv_data, student_column_index)
-    mentors = get_column_data(csv_data, mentor_column_index)
-    coordinators = get_column_data(csv_data, coordinator_column_index)
-    season_types = get_column_data(csv_data, season_type_column_index)
-
-    teams = list()
-    team_number = 0
-    team_start_time = ""
-    for i in range(len(active)):
-        if active[i] == "Активен" and season_types[i] in config[SEASON_TYPES]:
-            teams.append(Team(team_number, students[i], mentors[i], coordinators[i], team_start_time))
-
-    return teams
+def in_batch_mode():
+    return "--batch" in sys.argv[1:]
 
 
-def create_slots(config, teams: list):
-    # Group teams by coordinator
+def in_single_workbook_mode():
+    return "--single-workbook" in sys.argv[1:]
+
+
+def get_sheets_mode():
+    for arg in sys.argv[1:]:
+        if arg.startswith("--sheets="):
+            return arg[len("--sheets="):]
+    return SCHEDULE_SHEETS
+
+
+def in_update_mode():
+    return "--update" in sys.argv[1:]
+
+
+def in_search_mode():
+    return any(arg == "--search" or arg.startswith("--search=") for arg in sys.argv[1:])
+
+
+def get_search_candidates_count():
+    for arg in sys.argv[1:]:
+        if arg.startswith("--search="):
+            return int(arg[len("--search="):])
+    return SEARCH_CANDIDATES_COUNT
+
+
+def get_workers_count():
+    for arg in sys.argv[1:]:
+        if arg.startswith("--workers="):
+            return int(arg[len("--workers="):])
+    return os.cpu_count() or 1
+
+
+def load_config_json():
+    with open(CONFIG_FILE_PATH, mode="r", encoding="utf-8") as file_stream:
+        return json.load(file_stream)
+
+
+def get_seasons(js):
+    # Every section other than csv and format is a season
+    return [key for key in js if key not in [CSV, FORMAT]]
+
+
+def get_config(season: str, js=None):
+    # 'js' can hold the already loaded schedule.json
+    if js is None:
+        js = load_config_json()
+
+    config = {
+        # csv
+        ACTIVE_COLUMN: js[CSV][ACTIVE_COLUMN],
+        STUDENT_COLUMN: js[CSV][STUDENT_COLUMN],
+        MENTOR_COLUMN: js[CSV][MENTOR_COLUMN],
+        COORDINATOR_COLUMN: js[CSV][COORDINATOR_COLUMN],
+        SEASON_TYPE_COLUMN: js[CSV][SEASON_TYPE_COLUMN],
+        # format
+        ROW_HEIGHT: js[FORMAT][ROW_HEIGHT],
+        COLUMN_WIDTH: js[FORMAT][COLUMN_WIDTH],
+        ROWS_BETWEEN_SLOTS: js[FORMAT][ROWS_BETWEEN_SLOTS],
+        COLUMNS_BETWEEN_SLOTS: js[FORMAT][COLUMNS_BETWEEN_SLOTS],
+        # season
+        SEASON_TYPES: js[season][SEASON_TYPES],
+        SLOT_SIZE: js[season][SLOT_SIZE],
+        START_TIME: js[season][START_TIME],
+        TIME_PER_TEAM_IN_MINUTES: js[season][TIME_PER_TEAM_IN_MINUTES],
+        TIME_BETWEEN_SLOTS_IN_MINUTES: js[season][TIME_BETWEEN_SLOTS_IN_MINUTES],
+        HALLS: js[season][HALLS],
+        RANDOM_SEED: js[season][RANDOM_SEED],
+        HALL_ASSIGNMENT: js[season].get(HALL_ASSIGNMENT, SEQUENTIAL_HALL_ASSIGNMENT),
+        DATE: js[season].get(DATE),
+    }
+
+    return config
+
+
+def read_teams_data(config, csv_file_path: str = TEAMS_FILE_PATH, snapshots_directory: str = None):
+    # Only the teams' columns are read, the ones with a few distinct values as categories.
+    # Returns the columns by their config keys.
+    indices = {key: get_column_index(config[key]) for key in TEAMS_COLUMNS}
+    if snapshots_directory is not None:
+        return get_snapshot_teams_data(indices, load_csv_columns(csv_file_path, snapshots_directory))
+
+    dtypes = {index: str for index in indices.values()}
+    dtypes.update({indices[key]: "category" for key in CATEGORICAL_TEAMS_COLUMNS})
+    columns = sorted(dtypes)
+    csv_data = pandas.read_csv(csv_file_path, usecols=columns, dtype=dtypes, na_filter=False)
+    return {key: csv_data.iloc[:, columns.index(index)] for key, index in indices.items()}
+
+
+def get_snapshot_teams_data(indices: dict, csv_columns):
+    # The snapshot's columns are already coded, every one becomes a categorical without the header and the blank rows
+    rows = csv_columns.get_rows(1, start=1)
+    teams_data = dict()
+    for key, index in indices.items():
+        codes, categories = csv_columns.get_column(index)
+        teams_data[key] = pandas.Series(pandas.Categorical.from_codes(codes[rows], categories))
+    return teams_data
+
+
+def get_stripped_categories(column):
+    # The categories' codes of the rows and the stripped categories, every distinct value is stripped once
+    return column.cat.codes.to_numpy(), numpy.array([x.strip() for x in column.cat.categories], dtype=object)
+
+
+def get_stripped_values(column, rows):
+    if isinstance(column.dtype, pandas.CategoricalDtype):
+        codes, categories = get_stripped_categories(column)
+        return categories[codes[rows]].tolist()
+    return [x.strip() for x in column.to_numpy()[rows].tolist()]
+
+
+def get_teams_mask(teams_data: dict, season_types: list):
+    # The active rows of the season types, the comparisons are done on the categories
+    active_codes, active_categories = get_stripped_categories(teams_data[ACTIVE_COLUMN])
+    season_type_codes, season_type_categories = get_stripped_categories(teams_data[SEASON_TYPE_COLUMN])
+    return ((active_categories == ACTIVE)[active_codes] &
+            numpy.isin(season_type_categories, season_types)[season_type_codes])
+
+
+def create_teams(teams_data: dict, mask):
+    # Only the rows in the mask become teams, the slots set their numbers and start times
+    rows = numpy.flatnonzero(mask)
+    students = get_stripped_values(teams_data[STUDENT_COLUMN], rows)
+    mentors = get_stripped_values(teams_data[MENTOR_COLUMN], rows)
+    coordinators = get_stripped_values(teams_data[COORDINATOR_COLUMN], rows)
+    return [Team(0, student, mentor, coordinator, "") for student, mentor, coordinator in zip(students, mentors, coordinators)]
+
+
+def get_teams(config, teams_data: dict):
+    return create_teams(teams_data, get_teams_mask(teams_data, config[SEASON_TYPES]))
+
+
+def partition_teams(configs: dict, teams_data: dict):
+    # Returns the teams of every season (configs maps the seasons to their configs), a row goes to every season
+    # of its season type and every season gets its own teams.
+    # The active rows and their values are found once and grouped by their season type's code, every season
+    # takes the groups of its season types.
+    active_codes, active_categories = get_stripped_categories(teams_data[ACTIVE_COLUMN])
+    rows = numpy.flatnonzero((active_categories == ACTIVE)[active_codes])
+    season_type_codes, season_type_categories = get_stripped_categories(teams_data[SEASON_TYPE_COLUMN])
+    rows_codes = season_type_codes[rows]
+    order = numpy.argsort(rows_codes, kind="stable")
+    bounds = numpy.searchsorted(rows_codes[order], numpy.arange(len(season_type_categories) + 1))
+    students = get_stripped_values(teams_data[STUDENT_COLUMN], rows)
+    mentors = get_stripped_values(teams_data[MENTOR_COLUMN], rows)
+    coordinators = get_stripped_values(teams_data[COORDINATOR_COLUMN], rows)
+
+    teams_by_season = dict()
+    for season, config in configs.items():
+        codes = numpy.flatnonzero(numpy.isin(season_type_categories, config[SEASON_TYPES]))
+        # The season's rows in the csv order
+        positions = numpy.sort(numpy.concatenate([order[bounds[code]:bounds[code + 1]] for code in codes] + [order[:0]]))
+        teams_by_season[season] = [Team(0, students[i], mentors[i], coordinators[i], "") for i in positions.tolist()]
+    return teams_by_season
+
+
+def group_teams_by_coordinator(teams: list):
+    # The coordinators are kept in the order of their first team
     teams_by_coordinator = dict()
     for team in teams:
         coordinator_name = team.coordinator_name.lower()
         if coordinator_name not in teams_by_coordinator:
             teams_by_coordinator[coordinator_name] = list()
         teams_by_coordinator[coordinator_name].append(team)
+    return teams_by_coordinator
 
-    # Move the halls' specified coordinators to the end of the coordinators' list
-    halls = config[HALLS]
-    coordinators_names = list(teams_by_coordinator.keys())
-    random.shuffle(coordinators_names)
+
+def get_halls_coordinators(hall):
+    return [x.lower() for x in hall[COORDINATORS]]
+
+
+def get_pinned_halls_names(halls: list):
+    # The hall of every specified coordinator, the first one for a coordinator specified for several halls,
+    # as it takes the coordinator first with both hall assignments
+    pinned = dict()
+    for hall in halls:
+        for coordinator in get_halls_coordinators(hall):
+            pinned.setdefault(coordinator, hall[NAME])
+    return pinned
+
+
+def move_halls_coordinators_to_end(coordinators_names: list, halls: list):
+    # Every hall's specified coordinator is moved to the end of the list, one after the other, so the moved ones
+    # end up in the order of their last move, after all the others
+    coordinators = set(coordinators_names)
+    last_moves = dict()
+    move = 0
     for hall in halls:
-        coordinators = [x.lower() for x in hall[COORDINATORS]]
-        for coordinator in coordinators:
-            if coordinator in coordinators_names:
-                coordinators_names.remove(coordinator)
-                coordinators_names.append(coordinator)
-
-    # Group teams by hall
-    last_coordinator_index = -1
-    coordinators_count = len(coordinators_names)
+        for coordinator in get_halls_coordinators(hall):
+            if coordinator in coordinators:
+                last_moves[coordinator] = move
+                move += 1
+
+    not_moved = [x for x in coordinators_names if x not in last_moves]
+    return not_moved + sorted(last_moves, key=last_moves.get)
+
+
+class CoordinatorsQueue:
+    """
+    The coordinators that aren't in a hall yet, in the order the halls take them.
+    A hall's specified coordinators are moved to the queue's front before the hall takes its coordinators from it.
+    The queue is the part of the coordinators' list after the last taken coordinator, and it behaves exactly like
+    removing a coordinator from that list and inserting it right after the last taken one, without the list's
+    O(n) removals and insertions.
+    """
+
+    def __init__(self, coordinators_names: list):
+        self.order = coordinators_names
+        self.next_index = 0  # the order's coordinators before it are taken or moved to the front
+        self.front = dict()  # the coordinators moved to the front, the last one is the first in the queue
+        self.in_order = set(coordinators_names)
+        self.taken = set()
+
+    def _skip_moved(self):
+        while self.next_index < len(self.order) and self.order[self.next_index] not in self.in_order:
+            self.next_index += 1
+
+    def is_empty(self):
+        self._skip_moved()
+        return not self.front and self.next_index == len(self.order)
+
+    def pop(self):
+        self._skip_moved()
+        if self.front:
+            coordinator = next(reversed(self.front))
+            del self.front[coordinator]
+        else:
+            coordinator = self.order[self.next_index]
+            self.in_order.discard(coordinator)
+        self.taken.add(coordinator)
+        return coordinator
+
+    def move_to_front(self, coordinator: str):
+        if coordinator in self.taken:
+            # Removing an already taken coordinator shifts the list left, so the first coordinator in the queue
+            # ends up among the taken ones, and the removed one is inserted in its place
+            if self.is_empty():
+                return
+            self.pop()
+            self.taken.discard(coordinator)
+        elif coordinator in self.front:
+            del self.front[coordinator]
+        else:
+            self.in_order.discard(coordinator)
+        self.front[coordinator] = None
+
+
+def assign_teams_to_halls(teams: list, teams_by_coordinator: dict, coordinators_names: list, halls: list):
+    # Every hall takes whole coordinators from the queue until it has its share of the teams
+    teams_count_per_hall = math.ceil(len(teams) / len(halls))
+    queue = CoordinatorsQueue(coordinators_names)
     teams_by_hall_name = dict()
     for hall in halls:
-        # Move this hall's specified coordinators to the start of the coordinators' list
-        # This will ensure that these coordinators will belong to this hall
-        coordinators = [x.lower() for x in hall[COORDINATORS]]
-        for coordinator in coordinators:
-            if coordinator in coordinators_names:
-                coordinators_names.remove(coordinator)
-                coordinators_names.insert(last_coordinator_index + 1, coordinator)
+        # This hall's specified coordinators go first, so that they belong to this hall
+        for coordinator in get_halls_coordinators(hall):
+            if coordinator in teams_by_coordinator:
+                queue.move_to_front(coordinator)
 
         teams_in_hall = list()
-        for i_coordinator in range(last_coordinator_index + 1, coordinators_count):
-            last_coordinator_index = i_coordinator
-            coordinator_name = coordinators_names[i_coordinator]
-            teams_in_hall += teams_by_coordinator[coordinator_name]
-            teams_in_hall_count = len(teams_in_hall)
-            teams_count_per_hall = math.ceil(len(teams) / len(halls))
-            if teams_in_hall_count >= teams_count_per_hall or i_coordinator == coordinators_count - 1:
+        while not queue.is_empty():
+            teams_in_hall += teams_by_coordinator[queue.pop()]
+            if len(teams_in_hall) >= teams_count_per_hall or queue.is_empty():
                 random.shuffle(teams_in_hall)
-                hall_name = hall[NAME]
-                teams_by_hall_name[hall_name] = teams_in_hall
                 break
+        teams_by_hall_name[hall[NAME]] = teams_in_hall
+
+    return teams_by_hall_name
+
+
+def get_start_offsets_in_minutes(config, indices):
+    # The start of the i-th team of a hall after the hall's start. Every team after the first one in a slot starts
+    # time_per_team_in_minutes after the previous one and every slot starts time_between_slots_in_minutes later.
+    slot_indices = indices // config[SLOT_SIZE]
+    return (config[TIME_PER_TEAM_IN_MINUTES] * (indices - slot_indices) +
+            config[TIME_BETWEEN_SLOTS_IN_MINUTES] * slot_indices)
+
+
+def get_hall_duration_in_minutes(config, teams_count: int):
+    # From the hall's start until its last team finishes
+    if teams_count == 0:
+        return 0
+    return get_start_offsets_in_minutes(config, teams_count - 1) + config[TIME_PER_TEAM_IN_MINUTES]
+
+
+def assign_teams_to_halls_balanced(config, teams_by_coordinator: dict, coordinators_names: list, halls: list):
+    # The coordinators' teams stay together. A coordinator specified for several halls goes to the first of them.
+    coordinators_indices = {name: i for i, name in enumerate(coordinators_names)}
+    pinned = dict()
+    for i_hall, hall in enumerate(halls):
+        for coordinator in get_halls_coordinators(hall):
+            if coordinator in teams_by_coordinator:
+                pinned.setdefault(coordinators_indices[coordinator], i_hall)
+
+    sizes = [len(teams_by_coordinator[name]) for name in coordinators_names]
+    halls_indices = find_balanced_assignment(sizes, len(halls), pinned, lambda count: get_hall_duration_in_minutes(config, count))
+
+    teams_by_hall_name = dict()
+    for i_hall, hall in enumerate(halls):
+        # The hall's specified coordinators go first, in the same order as with the sequential assignment
+        specified = [x for x in dict.fromkeys(reversed(get_halls_coordinators(hall)))
+                     if x in coordinators_indices and halls_indices[coordinators_indices[x]] == i_hall]
+        others = [x for i, x in enumerate(coordinators_names) if halls_indices[i] == i_hall and x not in specified]
+        teams_in_hall = [team for name in specified + others for team in teams_by_coordinator[name]]
+        random.shuffle(teams_in_hall)
+        teams_by_hall_name[hall[NAME]] = teams_in_hall
+
+    return teams_by_hall_name
+
+
+def get_start_times(config, teams_count: int):
+    offsets_in_minutes = get_start_offsets_in_minutes(config, numpy.arange(teams_count))
+
+    start_time = pandas.to_datetime(config[START_TIME])
+    start_seconds = (start_time - start_time.normalize()).total_seconds()
+    seconds = (start_seconds + offsets_in_minutes * 60) % (24 * 60 * 60)
+    minutes = (seconds // 60).astype(numpy.int64)
+
+    # Only the distinct times are formatted, the halls share them
+    unique_minutes, inverse = numpy.unique(minutes, return_inverse=True)
+    formatted = [f"{m // 60:02d}:{m % 60:02d}" for m in unique_minutes.tolist()]
+    return [formatted[i] for i in inverse.tolist()]
+
+
+def get_start_in_minutes(config):
+    # The halls' start from the midnight of the season's date, or of any day when there's no date
+    start_time = datetime.time.fromisoformat(config[START_TIME])
+    minutes = start_time.hour * 60 + start_time.minute + start_time.second / 60
+    if config[DATE] is not None:
+        minutes += datetime.date.fromisoformat(config[DATE]).toordinal() * MINUTES_PER_DAY
+    return minutes
+
+
+def add_to_timeline(timeline: TimelineIndex, config, teams_by_hall_name: dict, season: str = None, with_labels: bool = True):
+    # Every team's coordinator and mentor are busy from the team's start for time_per_team_in_minutes.
+    # The teams are in their halls' order. The labels are (season, hall name, team's position, team).
+    start = get_start_in_minutes(config)
+    offsets = get_start_offsets_in_minutes(config, numpy.arange(max([len(x) for x in teams_by_hall_name.values()], default=0))).tolist()
+    time_per_team = config[TIME_PER_TEAM_IN_MINUTES]
+    for hall_name, teams_in_hall in teams_by_hall_name.items():
+        starts = [start + x for x in offsets[:len(teams_in_hall)]]
+        ends = [x + time_per_team for x in starts]
+        labels = [(season, hall_name, i + 1, team) for i, team in enumerate(teams_in_hall)] if with_labels else None
+        coordinators = [team.coordinator_name.lower() for team in teams_in_hall]
+        timeline.add_many(coordinators, starts, ends, labels)
+
+        # The mentors, unless they are their team's coordinator
+        mentors = [team.mentor_name.lower() for team in teams_in_hall]
+        teams_indices = [i for i, mentor in enumerate(mentors) if mentor and mentor != coordinators[i]]
+        timeline.add_many([mentors[i] for i in teams_indices], [starts[i] for i in teams_indices], [ends[i] for i in teams_indices],
+                          [labels[i] for i in teams_indices] if with_labels else None)
+
+
+def get_teams_by_hall_name(slots_by_hall_name: dict):
+    return {hall_name: [team for slot in slots for team in slot.teams] for hall_name, slots in slots_by_hall_name.items()}
+
+
+def format_minutes(minutes: float):
+    minutes = int(minutes) % MINUTES_PER_DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_timeline_label(label, start: float):
+    season, hall_name, number, team = label
+    return f"{season} {hall_name} #{number} {team.student_name} ({format_minutes(start)})"
+
+
+def write_conflicts(timeline: TimelineIndex, file_name: str):
+    # Returns the number of conflicts. An old conflicts' file is removed when there are none.
+    overlaps = timeline.find_overlaps()
+    if not overlaps:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        return 0
+
+    lines = [f"{x.person}: {format_timeline_label(x.other_label, x.other_start)} and {format_timeline_label(x.label, x.start)}"
+             for x in overlaps]
+    with open(file_name, mode="w", encoding="utf-8") as file_stream:
+        file_stream.write(os.linesep.join(lines) + os.linesep)
+    print(f"{len(overlaps)} conflicts, see {file_name}")
+    return len(overlaps)
+
+
+def assign_teams(config, teams: list, teams_by_coordinator: dict = None):
+    # Returns the shuffled teams of every hall, this is where the random seed matters.
+    # 'teams_by_coordinator' can hold the already grouped teams.
+    halls = config[HALLS]
+    if teams_by_coordinator is None:
+        teams_by_coordinator = group_teams_by_coordinator(teams)
+
+    # Shuffle the coordinators and move the halls' specified coordinators to the end of the list
+    coordinators_names = list(teams_by_coordinator.keys())
+    random.shuffle(coordinators_names)
+    coordinators_names = move_halls_coordinators_to_end(coordinators_names, halls)
+
+    if config[HALL_ASSIGNMENT] == BALANCED_HALL_ASSIGNMENT:
+        teams_by_hall_name = assign_teams_to_halls_balanced(config, teams_by_coordinator, coordinators_names, halls)
+    else:
+        teams_by_hall_name = assign_teams_to_halls(teams, teams_by_coordinator, coordinators_names, halls)
+    return teams_by_hall_name
+
+
+def create_slots(config, teams: list):
+    return create_halls_slots(config, assign_teams(config, teams))
+
 
-    # Create slots by hall
+def create_halls_slots(config, teams_by_hall_name: dict):
+    # The halls' teams get their numbers and start times from their positions
+    halls = config[HALLS]
     slot_size = config[SLOT_SIZE]
-    start_time = config[START_TIME]
-    time_per_team_in_minutes = config[TIME_PER_TEAM_IN_MINUTES]
-    time_between_slots_in_minutes = config[TIME_BETWEEN_SLOTS_IN_MINUTES]
+    start_times = get_start_times(config, max([len(x) for x in teams_by_hall_name.values()], default=0))
     slots_by_hall_name = dict()
     for hall in halls:
         hall_name = hall[NAME]
-        slots_by_hall_name[hall_name] = list()
         teams_in_hall = teams_by_hall_name[hall_name]
-        teams_in_hall_count = len(teams_in_hall)
-        teams_in_slot = list()
-        slot_number = 1
-        team_number = 1
-        minutes_to_add = 0  # This keeps the time accumulated after each team has finished their presenting
-        for i_team in range(0, teams_in_hall_count):
-            team = teams_in_hall[i_team]
-
-            time_offset_in_minutes = minutes_to_add + time_between_slots_in_minutes * (slot_number - 1)
-            time_offset = pandas.Timedelta(minutes=time_offset_in_minutes)
-            team_start_time = pandas.to_datetime(start_time) + time_offset
-            team.start_time = team_start_time.strftime("%H:%M")
-            team.number = team_number
-
-            minutes_to_add += time_per_team_in_minutes if team_number % slot_size != 0 else 0
-            team_number += 1
-            teams_in_slot.append(team)
-            teams_in_slot_count = len(teams_in_slot)
-            is_slot_full = (teams_in_slot_count == slot_size)
-            is_last_team = (i_team == teams_in_hall_count - 1)
-            if is_slot_full or is_last_team:
-                slot = Slot(hall_name, slot_number, teams_in_slot)
-                slots_by_hall_name[hall_name].append(slot)
-                teams_in_slot = list()
-                slot_number += 1
+        for i_team, team in enumerate(teams_in_hall):
+            team.number = i_team + 1
+            team.start_time = start_times[i_team]
+
+        slots_by_hall_name[hall_name] = [Slot(hall_name, i_slot // slot_size + 1, teams_in_hall[i_slot:i_slot + slot_size])
+                                         for i_slot in range(0, len(teams_in_hall), slot_size)]
 
     return slots_by_hall_name
 
 
-def populate_sheet(config, workbook: Workbook, worksheet: Worksheet, slots_by_hall_name: dict):
+def get_teams_keys(teams: list):
+    # A team is the same one in the updated teams when its student and mentor are, the repeated ones
+    # are told apart by their order. The keys are strings, which the garbage collector doesn't track.
+    keys = [f"{team.student_name.lower()}\x1f{team.mentor_name.lower()}" for team in teams]
+    if len(set(keys)) < len(keys):
+        occurrences = dict()
+        for i, key in enumerate(keys):
+            occurrences[key] = occurrences.get(key, 0) + 1
+            if occurrences[key] > 1:
+                keys[i] = f"{key}\x1f{occurrences[key]}"
+    return keys
+
+
+def get_halls_teams_keys(teams_by_hall_name: dict):
+    # The keys of the halls' teams, by hall
+    teams = [team for teams_in_hall in teams_by_hall_name.values() for team in teams_in_hall]
+    keys = iter(get_teams_keys(teams))
+    return {hall_name: [next(keys) for _ in teams_in_hall] for hall_name, teams_in_hall in teams_by_hall_name.items()}
+
+
+def save_schedule_state(season: str, slots_by_hall_name: dict):
+    # The halls' teams in order, for the incremental updates
+    state = {hall_name: [[team.student_name, team.mentor_name, team.coordinator_name] for team in teams_in_hall]
+             for hall_name, teams_in_hall in get_teams_by_hall_name(slots_by_hall_name).items()}
+    file_name = SCHEDULE_STATE_FILE_NAME.format(season).lower()
+    temp_file_name = f"{file_name}.tmp"
+    with open(temp_file_name, mode="w", encoding="utf-8") as file_stream:
+        json.dump(state, file_stream, ensure_ascii=False)
+    os.replace(temp_file_name, file_name)
+
+
+def load_schedule_state(config, season: str):
+    file_name = SCHEDULE_STATE_FILE_NAME.format(season).lower()
+    if not os.path.exists(file_name):
+        raise ValueError(f"There's no {file_name}, create the {season} schedule first")
+
+    with open(file_name, mode="r", encoding="utf-8") as file_stream:
+        state = json.load(file_stream)
+    halls_names = [hall[NAME] for hall in config[HALLS]]
+    if list(state) != halls_names:
+        raise ValueError(f"{file_name} has the halls {list(state)}, the config has {halls_names}, create the {season} schedule again")
+    return {hall_name: [Team(0, student, mentor, coordinator, "") for student, mentor, coordinator in teams_in_hall]
+            for hall_name, teams_in_hall in state.items()}
+
+
+def update_halls_teams(old_teams_by_hall_name: dict, teams: list, halls: list):
+    """
+    Updates the halls' teams with as few moves as possible. The removed teams leave holes, which take
+    the added teams first. An added team of a coordinator specified for a hall (in 'halls', the season's config)
+    goes to that hall, as with a new schedule. Any other added team goes to the hall with most of its coordinator's
+    teams, unless that would make the halls' difference in teams bigger than before, then to the hall with fewest teams.
+    The holes left go to the halls' last teams, and the last teams of the biggest hall (except the ones specified
+    for it) move to the smallest one until the halls are as balanced as before.
+    Every team that isn't removed, added or moved keeps its hall and position, so its number and start time.
+    """
+    teams_by_key = dict(zip(get_teams_keys(teams), teams))
+    halls_names = list(old_teams_by_hall_name)
+    pinned = {coordinator: hall_name for coordinator, hall_name in get_pinned_halls_names(halls).items()
+              if hall_name in old_teams_by_hall_name}
+
+    # The kept teams get their updated data
+    old_keys = get_halls_teams_keys(old_teams_by_hall_name)
+    positions = {hall_name: [teams_by_key.get(key) for key in keys] for hall_name, keys in old_keys.items()}
+    kept_keys = {key for keys in old_keys.values() for key in keys if key in teams_by_key}
+    added = [team for key, team in teams_by_key.items() if key not in kept_keys]
+
+    old_counts = [len(x) for x in old_teams_by_hall_name.values()]
+    max_imbalance = max(max(old_counts, default=0) - min(old_counts, default=0), 1)
+    counts = {hall_name: sum(1 for team in teams_in_hall if team is not None) for hall_name, teams_in_hall in positions.items()}
+    holes = {hall_name: [i for i, team in enumerate(teams_in_hall) if team is None] for hall_name, teams_in_hall in positions.items()}
+    for hall_holes in holes.values():
+        heapq.heapify(hall_holes)
+    coordinators_halls = dict()
+    for hall_name, teams_in_hall in positions.items():
+        for team in teams_in_hall:
+            if team is not None:
+                coordinator_halls = coordinators_halls.setdefault(team.coordinator_name.lower(), dict())
+                coordinator_halls[hall_name] = coordinator_halls.get(hall_name, 0) + 1
+
+    for team in added:
+        coordinator_halls = coordinators_halls.setdefault(team.coordinator_name.lower(), dict())
+        hall_name = pinned.get(team.coordinator_name.lower())
+        if hall_name is None:
+            hall_name = max(coordinator_halls, key=coordinator_halls.get, default=None)
+            if hall_name is None or (not holes[hall_name] and counts[hall_name] + 1 - min(counts.values()) > max_imbalance):
+                hall_name = min(halls_names, key=lambda x: counts[x])
+
+        if holes[hall_name]:
+            positions[hall_name][heapq.heappop(holes[hall_name])] = team
+        else:
+            positions[hall_name].append(team)
+        counts[hall_name] += 1
+        coordinator_halls[hall_name] = coordinator_halls.get(hall_name, 0) + 1
+
+    # The halls' last teams fill the holes left
+    for hall_name, teams_in_hall in positions.items():
+        while True:
+            while teams_in_hall and teams_in_hall[-1] is None:
+                teams_in_hall.pop()
+            while holes[hall_name] and holes[hall_name][0] >= len(teams_in_hall):
+                heapq.heappop(holes[hall_name])
+            if not holes[hall_name]:
+                break
+            teams_in_hall[heapq.heappop(holes[hall_name])] = teams_in_hall.pop()
+
+    # Keep the balance
+    while halls_names:
+        biggest = max(halls_names, key=lambda x: len(positions[x]))
+        smallest = min(halls_names, key=lambda x: len(positions[x]))
+        if len(positions[biggest]) - len(positions[smallest]) <= max_imbalance:
+            break
+        # The last team that isn't specified for the hall moves, the hall's last team takes its place
+        teams_in_hall = positions[biggest]
+        i = next((i for i in range(len(teams_in_hall) - 1, -1, -1)
+                  if pinned.get(teams_in_hall[i].coordinator_name.lower()) != biggest), None)
+        if i is None:
+            break
+        team = teams_in_hall[i]
+        last_team = teams_in_hall.pop()
+        if i < len(teams_in_hall):
+            teams_in_hall[i] = last_team
+        positions[smallest].append(team)
+
+    return positions
+
+
+def get_schedule_changes(config, old_teams_by_hall_name: dict, teams_by_hall_name: dict):
+    # The removed, added and moved teams, with their halls, numbers and start times
+    start_times = get_start_times(config, max([len(x) for x in list(old_teams_by_hall_name.values()) + list(teams_by_hall_name.values())], default=0))
+    old_places = {key: (hall_name, i, team) for hall_name, keys in get_halls_teams_keys(old_teams_by_hall_name).items()
+                  for i, (key, team) in enumerate(zip(keys, old_teams_by_hall_name[hall_name]))}
+    places = {key: (hall_name, i, team) for hall_name, keys in get_halls_teams_keys(teams_by_hall_name).items()
+              for i, (key, team) in enumerate(zip(keys, teams_by_hall_name[hall_name]))}
+
+    def format_team(team: Team):
+        return f"{team.student_name} ({team.mentor_name}, {team.coordinator_name})"
+
+    def format_place(hall_name: str, i: int):
+        return f"{hall_name} #{i + 1} {start_times[i]}"
+
+    changes = list()
+    for key, (hall_name, i, team) in old_places.items():
+        if key not in places:
+            changes.append(f"removed: {format_team(team)}, {format_place(hall_name, i)}")
+    for key, (hall_name, i, team) in places.items():
+        if key not in old_places:
+            changes.append(f"added: {format_team(team)}, {format_place(hall_name, i)}")
+        elif old_places[key][:2] != (hall_name, i):
+            changes.append(f"moved: {format_team(team)}, {format_place(*old_places[key][:2])} -> {format_place(hall_name, i)}")
+    return changes
+
+
+def create_formats(workbook: Workbook):
+    # The cells' formats, once per workbook
     normal_format = workbook.add_format({
         "border": 1,
         "border_color": "black",
@@ -248,64 +738,277 @@ def populate_sheet(config, workbook: Workbook, worksheet: Worksheet, slots_by_ha
         "bg_color": "#DCE5F2"
     })
 
-    halls = config[HALLS]
-    halls_count = len(halls)
+    return {NORMAL_FORMAT: normal_format, BOLD_FORMAT: bold_format, HEADER_FORMAT: header_format}
+
+
+def populate_sheet(config, workbook: Workbook, worksheet: Worksheet, slots_by_hall_name: dict, formats: dict = None, halls: list = None):
+    # The halls' slots are side by side and every hall's slots go down. The rows are written in order, every row
+    # once, so that the sheet can be written in constant memory mode.
+    # 'formats' can hold the workbook's already created formats, 'halls' the halls to write (all by default).
+    if formats is None:
+        formats = create_formats(workbook)
+    if halls is None:
+        halls = config[HALLS]
+
     slot_size = config[SLOT_SIZE]
-    slot_header_rows = 2
-    slot_columns = 5
-    rows_between_slots = config[ROWS_BETWEEN_SLOTS]
-    columns_between_slots = config[COLUMNS_BETWEEN_SLOTS]
+    slot_rows = slot_size + SLOT_HEADER_ROWS + config[ROWS_BETWEEN_SLOTS]
+    hall_columns = SLOT_COLUMNS + config[COLUMNS_BETWEEN_SLOTS]
     row_height = config[ROW_HEIGHT]
-    column_width = config[COLUMN_WIDTH]
-
-    for i_hall in range(0, halls_count):
-        hall_name = halls[i_hall][NAME]
-        slots = slots_by_hall_name[hall_name]
-        slots_count = len(slots)
-        for i_slot in range(0, slots_count):
-            start_row = i_slot * (slot_size + slot_header_rows + rows_between_slots)
-            start_col = i_hall * (slot_columns + columns_between_slots)
-            end_col = start_col + (slot_columns - 1)
-
-            # Resize columns
-            worksheet.set_column(start_col, end_col, column_width)
-
-            # Write header
-            worksheet.merge_range(start_row, start_col, start_row, end_col, f"Зала {hall_name} (ЧАСТ {i_slot + 1})", header_format)
-            row = start_row + 1
-            worksheet.write(row, start_col, "#", bold_format)
-            worksheet.write(row, start_col + 1, "Ученик", bold_format)
-            worksheet.write(row, start_col + 2, "Ментор", bold_format)
-            worksheet.write(row, start_col + 3, "Координатор", bold_format)
-            worksheet.write(row, start_col + 4, "", bold_format)
-
-            # Write teams
-            teams = slots[i_slot].teams
-            teams_count = len(teams)
-            for i_team in range(teams_count):
-                team = teams[i_team]
-                row = start_row + i_team + 2
-                worksheet.set_row(row, row_height)
-                worksheet.write(row, start_col, team.number, normal_format)
-                worksheet.write(row, start_col + 1, team.student_name, normal_format)
-                worksheet.write(row, start_col + 2, team.mentor_name, normal_format)
-                worksheet.write(row, start_col + 3, team.coordinator_name, normal_format)
-                worksheet.write(row, start_col + 4, team.start_time, normal_format)
+    halls_slots = [slots_by_hall_name[hall[NAME]] for hall in halls]
+
+    # Resize the columns of the halls with slots
+    for i_hall, slots in enumerate(halls_slots):
+        if slots:
+            start_col = i_hall * hall_columns
+            worksheet.set_column(start_col, start_col + SLOT_COLUMNS - 1, config[COLUMN_WIDTH])
+
+    slots_count = max([len(x) for x in halls_slots], default=0)
+    for i_slot in range(slots_count):
+        start_row = i_slot * slot_rows
+        # The slots with this number and their first columns
+        slots = [(i_hall * hall_columns, halls[i_hall][NAME], x[i_slot]) for i_hall, x in enumerate(halls_slots) if i_slot < len(x)]
+
+        # Write headers
+        for start_col, hall_name, _ in slots:
+            worksheet.merge_range(start_row, start_col, start_row, start_col + SLOT_COLUMNS - 1,
+                                  f"Зала {hall_name} (ЧАСТ {i_slot + 1})", formats[HEADER_FORMAT])
+        for start_col, _, _ in slots:
+            worksheet.write_row(start_row + 1, start_col, SLOT_COLUMNS_TITLES, formats[BOLD_FORMAT])
+
+        # Write teams, with the typed writes, write() would check every string for numbers, urls and formulas
+        normal_format = formats[NORMAL_FORMAT]
+        for i_team in range(max(len(slot.teams) for _, _, slot in slots)):
+            row = start_row + SLOT_HEADER_ROWS + i_team
+            worksheet.set_row(row, row_height)
+            for start_col, _, slot in slots:
+                if i_team < len(slot.teams):
+                    team = slot.teams[i_team]
+                    worksheet.write_number(row, start_col, team.number, normal_format)
+                    worksheet.write_string(row, start_col + 1, team.student_name, normal_format)
+                    worksheet.write_string(row, start_col + 2, team.mentor_name, normal_format)
+                    worksheet.write_string(row, start_col + 3, team.coordinator_name, normal_format)
+                    worksheet.write_string(row, start_col + 4, team.start_time, normal_format)
+
+
+def get_sheet_name(name: str):
+    # Excel's sheet names are up to 31 characters, without []:*?/\
+    return "".join("_" if c in "[]:*?/\\" else c for c in name)[:MAX_SHEET_NAME_LENGTH]
+
+
+class ScheduleWorkbook:
+    """
+    A schedule workbook written with xlsxwriter's constant memory mode: every row is flushed to the file
+    as soon as the next one starts, so the memory doesn't grow with the teams' count.
+    The formats are created once and the workbook can have several sheets (a sheet per season or per hall).
+    """
+
+    def __init__(self, file_path: str):
+        self.workbook = xlsxwriter.Workbook(file_path, {"constant_memory": True})
+        self.formats = create_formats(self.workbook)
+
+    def add_sheet(self, config, name: str, slots_by_hall_name: dict, halls: list = None):
+        worksheet = self.workbook.add_worksheet(get_sheet_name(name))
+        populate_sheet(config, self.workbook, worksheet, slots_by_hall_name, self.formats, halls)
+
+    def add_schedule(self, config, slots_by_hall_name: dict, name: str = None):
+        # One sheet with all halls, or a sheet per hall when --sheets=halls. 'name' is the season's name
+        # for the workbooks with several seasons.
+        if get_sheets_mode() == HALL_SHEETS:
+            for hall in config[HALLS]:
+                hall_name = hall[NAME] if name is None else f"{name} {hall[NAME]}"
+                self.add_sheet(config, hall_name, slots_by_hall_name, [hall])
+        else:
+            self.add_sheet(config, SCHEDULE_SHEET_NAME if name is None else name, slots_by_hall_name)
+
+    def close(self):
+        self.workbook.close()
+
+
+class ScheduleScore:
+    def __init__(self, seed: int, max_end_time: float, imbalance: float, coordinator_breaks: int, conflicts: int):
+        self.seed = seed
+        self.max_end_time = max_end_time
+        self.imbalance = imbalance
+        self.coordinator_breaks = coordinator_breaks
+        self.conflicts = conflicts
+        self.total = (max_end_time * MAX_END_TIME_WEIGHT +
+                      imbalance * IMBALANCE_WEIGHT +
+                      coordinator_breaks * COORDINATOR_BREAKS_WEIGHT +
+                      conflicts * CONFLICTS_WEIGHT)
+
+    def __repr__(self):
+        return (f"seed {self.seed}: score {self.total:g} (last hall ends after {self.max_end_time:g} min, "
+                f"{self.imbalance:g} min between the halls, {self.coordinator_breaks} coordinator breaks, "
+                f"{self.conflicts} conflicts)")
+
+
+def score_schedule(config, seed: int, teams_by_hall_name: dict):
+    durations = list()
+    coordinator_breaks = 0
+    for teams_in_hall in teams_by_hall_name.values():
+        coordinators = [team.coordinator_name.lower() for team in teams_in_hall]
+        durations.append(get_hall_duration_in_minutes(config, len(coordinators)))
+        # Every coordinator's teams in a row would have (coordinators - 1) changes between neighbouring teams
+        changes = sum(1 for a, b in zip(coordinators, coordinators[1:]) if a != b)
+        coordinator_breaks += changes - max(len(set(coordinators)) - 1, 0)
+
+    timeline = TimelineIndex()
+    add_to_timeline(timeline, config, teams_by_hall_name, with_labels=False)
+    return ScheduleScore(seed, max(durations, default=0), max(durations, default=0) - min(durations, default=0),
+                         coordinator_breaks, timeline.count_overlaps())
+
+
+_search_config = None
+_search_teams = None
+_search_teams_by_coordinator = None
+
+
+def _init_search_worker(config, teams: list):
+    global _search_config, _search_teams, _search_teams_by_coordinator
+    _search_config = config
+    _search_teams = teams
+    _search_teams_by_coordinator = group_teams_by_coordinator(teams)
+
+
+def _score_seeds(seeds: list[int]):
+    # Only the halls' teams are scored, the slots and the start times follow from them
+    scores = list()
+    for seed in seeds:
+        random.seed(seed)
+        teams_by_hall_name = assign_teams(_search_config, _search_teams, _search_teams_by_coordinator)
+        scores.append(score_schedule(_search_config, seed, teams_by_hall_name))
+    return scores
+
+
+def search_seeds(config, teams: list, seeds: list[int], workers_count: int):
+    # Returns the scores of all seeds, best first
+    tasks = [seeds[i:i + SEARCH_SEEDS_PER_TASK] for i in range(0, len(seeds), SEARCH_SEEDS_PER_TASK)]
+    if workers_count > 1:
+        with ProcessPoolExecutor(max_workers=workers_count, initializer=_init_search_worker, initargs=(config, teams)) as executor:
+            scores = [score for task_scores in executor.map(_score_seeds, tasks) for score in task_scores]
+    else:
+        _init_search_worker(config, teams)
+        scores = [score for task in tasks for score in _score_seeds(task)]
+
+    scores.sort(key=lambda score: (score.total, score.seed))
+    return scores
+
+
+def load_teams(config):
+    return get_teams(config, read_teams_data(config, snapshots_directory=get_snapshots_directory()))
+
+
+def write_schedule(config, season: str, slots_by_hall_name: dict):
+    workbook = ScheduleWorkbook(SCHEDULE_FILE_NAME.format(season).lower())
+    workbook.add_schedule(config, slots_by_hall_name)
+    workbook.close()
+    save_schedule_state(season, slots_by_hall_name)
+
+
+def write_season_conflicts(config, season: str, slots_by_hall_name: dict):
+    timeline = TimelineIndex()
+    add_to_timeline(timeline, config, get_teams_by_hall_name(slots_by_hall_name), season)
+    write_conflicts(timeline, CONFLICTS_FILE_NAME.format(season).lower())
 
 
 def create_schedule(season: str):
     config = get_config(season)
-    random.seed(config[RANDOM_SEED])
+    slots_by_hall_name = create_season_schedule(config, season, load_teams(config))
+    write_season_conflicts(config, season, slots_by_hall_name)
+
+
+def update_schedule(season: str):
+    config = get_config(season)
+    old_teams_by_hall_name = load_schedule_state(config, season)
+    teams = load_teams(config)
+
+    start = time.perf_counter()
+    teams_by_hall_name = update_halls_teams(old_teams_by_hall_name, teams, config[HALLS])
+    changes = get_schedule_changes(config, old_teams_by_hall_name, teams_by_hall_name)
+    slots_by_hall_name = create_halls_slots(config, teams_by_hall_name)
+    elapsed = time.perf_counter() - start
+
+    write_schedule(config, season, slots_by_hall_name)
+    with open(CHANGES_FILE_NAME.format(season).lower(), mode="w", encoding="utf-8") as file_stream:
+        file_stream.write("".join(x + os.linesep for x in changes))
+    write_season_conflicts(config, season, slots_by_hall_name)
+    print(f"{season}: {len(changes)} changed teams, updated in {elapsed * 1000:.1f} ms")
+
 
-    csv_data = pandas.read_csv(TEAMS_FILE_PATH)
-    teams = get_teams(config, csv_data)
+def search_schedule(season: str):
+    config = get_config(season)
+    teams = load_teams(config)
+    seeds = list(range(config[RANDOM_SEED], config[RANDOM_SEED] + get_search_candidates_count()))
+    scores = search_seeds(config, teams, seeds, get_workers_count())
+
+    best = scores[0]
+    random.seed(best.seed)
     slots_by_hall_name = create_slots(config, teams)
-    workbook = xlsxwriter.Workbook(SCHEDULE_FILE_NAME.format(season).lower())
-    worksheet = workbook.add_worksheet("Schedule")
-    populate_sheet(config, workbook, worksheet, slots_by_hall_name)
-    workbook.close()
+    write_schedule(config, season, slots_by_hall_name)
+    write_season_conflicts(config, season, slots_by_hall_name)
+
+    summary = [f"{i + 1}. {score}" for i, score in enumerate(scores[:SEARCH_SUMMARY_SIZE])]
+    summary_file_name = SEARCH_SUMMARY_FILE_NAME.format(season).lower()
+    with open(summary_file_name, mode="w", encoding="utf-8") as file_stream:
+        file_stream.write(f"{len(scores)} candidates, set random_seed to {best.seed} to get the best one again{os.linesep}")
+        file_stream.write(os.linesep.join(summary) + os.linesep)
+    print(f"{season}: {len(scores)} candidates, best {best}")
+
+
+def create_season_schedule(config, season: str, teams: list):
+    random.seed(config[RANDOM_SEED])
+    slots_by_hall_name = create_slots(config, teams)
+    write_schedule(config, season, slots_by_hall_name)
+    return slots_by_hall_name
+
+
+def create_schedules():
+    # Batch mode: one read of the config and the teams for all seasons
+    js = load_config_json()
+    configs = {season: get_config(season, js) for season in get_seasons(js)}
+    # The csv columns are the same for all seasons
+    teams_by_season = partition_teams(configs, read_teams_data(next(iter(configs.values())), snapshots_directory=get_snapshots_directory()))
+
+    seasons = list(configs)
+    workers_count = min(get_workers_count(), len(seasons))
+    slots_by_season = dict()
+    if in_single_workbook_mode():
+        # One file, so the seasons are written one after the other
+        workbook = ScheduleWorkbook(SCHEDULES_FILE_NAME)
+        for season in seasons:
+            random.seed(configs[season][RANDOM_SEED])
+            slots_by_season[season] = create_slots(configs[season], teams_by_season[season])
+            workbook.add_schedule(configs[season], slots_by_season[season], season)
+            save_schedule_state(season, slots_by_season[season])
+        workbook.close()
+    elif workers_count > 1:
+        with ProcessPoolExecutor(max_workers=workers_count) as executor:
+            futures = {season: executor.submit(create_season_schedule, configs[season], season, teams_by_season[season])
+                       for season in seasons}
+            slots_by_season = {season: future.result() for season, future in futures.items()}
+    else:
+        for season in seasons:
+            slots_by_season[season] = create_season_schedule(configs[season], season, teams_by_season[season])
+
+    for season in seasons:
+        print(f"{season}: {len(teams_by_season[season])} teams")
+
+    # The people's conflicts across all halls and seasons
+    timeline = TimelineIndex()
+    for season in seasons:
+        add_to_timeline(timeline, configs[season], get_teams_by_hall_name(slots_by_season[season]), season)
+    write_conflicts(timeline, SCHEDULES_CONFLICTS_FILE_NAME)
 
 
 if __name__ == "__main__":
-    create_schedule(SOFIA)
-    create_schedule(ONLINE)
+    if in_update_mode():
+        for season in [SOFIA, ONLINE]:
+            update_schedule(season)
+    elif in_batch_mode() and not in_search_mode():
+        create_schedules()
+    else:
+        for season in [SOFIA, ONLINE]:
+            if in_search_mode():
+                search_schedule(season)
+            else:
+                create_schedule(season)
@@ -0,0 +1,424 @@
+import copy
+import math
+import pandas
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xlsxwriter
+from csv_reader import get_column_index
+from schedule import (ACTIVE_COLUMN, BALANCED_HALL_ASSIGNMENT, COLUMN_WIDTH, COLUMNS_BETWEEN_SLOTS, COORDINATOR_COLUMN,
+                      COORDINATORS, HALL_ASSIGNMENT, HALLS, MENTOR_COLUMN, NAME, ONLINE, RANDOM_SEED, ROW_HEIGHT,
+                      ROWS_BETWEEN_SLOTS, SEASON_TYPE_COLUMN, SEASON_TYPES, SEQUENTIAL_HALL_ASSIGNMENT, SLOT_SIZE, SOFIA,
+                      START_TIME, STUDENT_COLUMN, TIME_BETWEEN_SLOTS_IN_MINUTES, TIME_PER_TEAM_IN_MINUTES,
+                      ScheduleWorkbook, Slot, Team, create_halls_slots, create_slots, get_config,
+                      get_hall_duration_in_minutes, get_schedule_changes, get_teams, get_teams_by_hall_name,
+                      get_workers_count, read_teams_data, search_seeds, update_halls_teams)
+from schedule_data_generator import create_teams_data
+from timeline import TimelineIndex
+
+# Usage: python schedule_benchmark.py [benchmark name...]
+# Runs all benchmarks when no name is given.
+
+TEAMS_COUNTS = [1000, 5000, 20000]
+HALLS_TEAMS_COUNT = 1000
+HALLS_COUNTS = [2, 3, 5]
+SEARCH_TEAMS_COUNT = 1000
+SEARCH_CANDIDATES_COUNT = 2000
+WORKBOOK_TEAMS_COUNTS = [1000, 10000, 100000]
+TEAMS_DATA_ROWS_COUNTS = [1000, 10000, 100000]
+TEAMS_DATA_EXTRA_COLUMNS_COUNT = 30
+TIMELINE_TEAMS_COUNTS = [10000, 100000, 1000000]
+TIMELINE_TEAMS_PER_PERSON = 3
+UPDATE_REPEATS = 5
+
+
+def create_slots_with_lists(config, teams: list):
+    # create_slots before the coordinators' queue and the vectorized start times, kept for comparison
+    # Group teams by coordinator
+    teams_by_coordinator = dict()
+    for team in teams:
+        coordinator_name = team.coordinator_name.lower()
+        if coordinator_name not in teams_by_coordinator:
+            teams_by_coordinator[coordinator_name] = list()
+        teams_by_coordinator[coordinator_name].append(team)
+
+    # Move the halls' specified coordinators to the end of the coordinators' list
+    halls = config[HALLS]
+    coordinators_names = list(teams_by_coordinator.keys())
+    random.shuffle(coordinators_names)
+    for hall in halls:
+        coordinators = [x.lower() for x in hall[COORDINATORS]]
+        for coordinator in coordinators:
+            if coordinator in coordinators_names:
+                coordinators_names.remove(coordinator)
+                coordinators_names.append(coordinator)
+
+    # Group teams by hall
+    last_coordinator_index = -1
+    coordinators_count = len(coordinators_names)
+    teams_by_hall_name = dict()
+    for hall in halls:
+        # Move this hall's specified coordinators to the start of the coordinators' list
+        # This will ensure that these coordinators will belong to this hall
+        coordinators = [x.lower() for x in hall[COORDINATORS]]
+        for coordinator in coordinators:
+            if coordinator in coordinators_names:
+                coordinators_names.remove(coordinator)
+                coordinators_names.insert(last_coordinator_index + 1, coordinator)
+
+        teams_in_hall = list()
+        for i_coordinator in range(last_coordinator_index + 1, coordinators_count):
+            last_coordinator_index = i_coordinator
+            coordinator_name = coordinators_names[i_coordinator]
+            teams_in_hall += teams_by_coordinator[coordinator_name]
+            teams_in_hall_count = len(teams_in_hall)
+            teams_count_per_hall = math.ceil(len(teams) / len(halls))
+            if teams_in_hall_count >= teams_count_per_hall or i_coordinator == coordinators_count - 1:
+                random.shuffle(teams_in_hall)
+                hall_name = hall[NAME]
+                teams_by_hall_name[hall_name] = teams_in_hall
+                break
+
+    # Create slots by hall
+    slot_size = config[SLOT_SIZE]
+    start_time = config[START_TIME]
+    time_per_team_in_minutes = config[TIME_PER_TEAM_IN_MINUTES]
+    time_between_slots_in_minutes = config[TIME_BETWEEN_SLOTS_IN_MINUTES]
+    slots_by_hall_name = dict()
+    for hall in halls:
+        hall_name = hall[NAME]
+        slots_by_hall_name[hall_name] = list()
+        teams_in_hall = teams_by_hall_name[hall_name]
+        teams_in_hall_count = len(teams_in_hall)
+        teams_in_slot = list()
+        slot_number = 1
+        team_number = 1
+        minutes_to_add = 0  # This keeps the time accumulated after each team has finished their presenting
+        for i_team in range(0, teams_in_hall_count):
+            team = teams_in_hall[i_team]
+
+            time_offset_in_minutes = minutes_to_add + time_between_slots_in_minutes * (slot_number - 1)
+            time_offset = pandas.Timedelta(minutes=time_offset_in_minutes)
+            team_start_time = pandas.to_datetime(start_time) + time_offset
+            team.start_time = team_start_time.strftime("%H:%M")
+            team.number = team_number
+
+            minutes_to_add += time_per_team_in_minutes if team_number % slot_size != 0 else 0
+            team_number += 1
+            teams_in_slot.append(team)
+            teams_in_slot_count = len(teams_in_slot)
+            is_slot_full = (teams_in_slot_count == slot_size)
+            is_last_team = (i_team == teams_in_hall_count - 1)
+            if is_slot_full or is_last_team:
+                slot = Slot(hall_name, slot_number, teams_in_slot)
+                slots_by_hall_name[hall_name].append(slot)
+                teams_in_slot = list()
+                slot_number += 1
+
+    return slots_by_hall_name
+
+
+def populate_sheet_cell_by_cell(config, workbook, worksheet, slots_by_hall_name: dict):
+    # populate_sheet before the rows were written in order, kept for comparison
+    normal_format = workbook.add_format({
+        "border": 1,
+        "border_color": "black",
+        "align": "center",
+        "valign": "vcenter",
+        "text_wrap": True
+    })
+
+    bold_format = workbook.add_format({
+        "border": 1,
+        "border_color": "black",
+        "align": "center",
+        "valign": "vcenter",
+        "text_wrap": True,
+        "bold": True
+    })
+
+    header_format = workbook.add_format({
+        "border": 1,
+        "border_color": "black",
+        "align": "center",
+        "valign": "vcenter",
+        "text_wrap": True,
+        "bold": True,
+        "bg_color": "#DCE5F2"
+    })
+
+    halls = config[HALLS]
+    halls_count = len(halls)
+    slot_size = config[SLOT_SIZE]
+    slot_header_rows = 2
+    slot_columns = 5
+    rows_between_slots = config[ROWS_BETWEEN_SLOTS]
+    columns_between_slots = config[COLUMNS_BETWEEN_SLOTS]
+    row_height = config[ROW_HEIGHT]
+    column_width = config[COLUMN_WIDTH]
+
+    for i_hall in range(0, halls_count):
+        hall_name = halls[i_hall][NAME]
+        slots = slots_by_hall_name[hall_name]
+        slots_count = len(slots)
+        for i_slot in range(0, slots_count):
+            start_row = i_slot * (slot_size + slot_header_rows + rows_between_slots)
+            start_col = i_hall * (slot_columns + columns_between_slots)
+            end_col = start_col + (slot_columns - 1)
+
+            # Resize columns
+            worksheet.set_column(start_col, end_col, column_width)
+
+            # Write header
+            worksheet.merge_range(start_row, start_col, start_row, end_col, f"Зала {hall_name} (ЧАСТ {i_slot + 1})", header_format)
+            row = start_row + 1
+            worksheet.write(row, start_col, "#", bold_format)
+            worksheet.write(row, start_col + 1, "Ученик", bold_format)
+            worksheet.write(row, start_col + 2, "Ментор", bold_format)
+            worksheet.write(row, start_col + 3, "Координатор", bold_format)
+            worksheet.write(row, start_col + 4, "", bold_format)
+
+            # Write teams
+            teams = slots[i_slot].teams
+            teams_count = len(teams)
+            for i_team in range(teams_count):
+                team = teams[i_team]
+                row = start_row + i_team + 2
+                worksheet.set_row(row, row_height)
+                worksheet.write(row, start_col, team.number, normal_format)
+                worksheet.write(row, start_col + 1, team.student_name, normal_format)
+                worksheet.write(row, start_col + 2, team.mentor_name, normal_format)
+                worksheet.write(row, start_col + 3, team.coordinator_name, normal_format)
+                worksheet.write(row, start_col + 4, team.start_time, normal_format)
+
+
+
+def get_teams_from_all_columns(config, csv_file_path: str):
+    # get_teams on the whole csv before the columns were pruned, kept for comparison
+    csv_data = pandas.read_csv(csv_file_path)
+
+    def get_column_data(column_index: int):
+        return [x.strip() for x in csv_data[csv_data.columns[column_index]].tolist()]
+
+    active = get_column_data(get_column_index(config[ACTIVE_COLUMN]))
+    students = get_column_data(get_column_index(config[STUDENT_COLUMN]))
+    mentors = get_column_data(get_column_index(config[MENTOR_COLUMN]))
+    coordinators = get_column_data(get_column_index(config[COORDINATOR_COLUMN]))
+    season_types = get_column_data(get_column_index(config[SEASON_TYPE_COLUMN]))
+
+    teams = list()
+    for i in range(len(active)):
+        if active[i] == "Активен" and season_types[i] in config[SEASON_TYPES]:
+            teams.append(Team(0, students[i], mentors[i], coordinators[i], ""))
+    return teams
+
+
+def get_slots_summary(slots_by_hall_name: dict):
+    return [(hall_name, slot.number, [(team.number, team.student_name, team.mentor_name, team.coordinator_name, team.start_time) for team in slot.teams])
+            for hall_name, slots in slots_by_hall_name.items() for slot in slots]
+
+
+def benchmark_slots():
+    print("create_slots on synthetic teams (sequential hall assignment): with the queue and vectorized times vs with lists")
+    for teams_count in TEAMS_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            teams_data = read_teams_data(get_config(SOFIA), create_teams_data(directory, teams_count))
+
+        for season in [SOFIA, ONLINE]:
+            config = get_config(season)
+            config[HALL_ASSIGNMENT] = SEQUENTIAL_HALL_ASSIGNMENT  # the only one the old version has
+            teams = get_teams(config, teams_data)
+
+            random.seed(config[RANDOM_SEED])
+            start = time.perf_counter()
+            slots = create_slots(config, copy.deepcopy(teams))
+            slots_time = time.perf_counter() - start
+
+            random.seed(config[RANDOM_SEED])
+            start = time.perf_counter()
+            slots_with_lists = create_slots_with_lists(config, copy.deepcopy(teams))
+            slots_with_lists_time = time.perf_counter() - start
+
+            same = get_slots_summary(slots) == get_slots_summary(slots_with_lists)
+            print(f"{teams_count} rows, {season} ({len(teams)} teams): {slots_time:.3f}s vs {slots_with_lists_time:.3f}s, "
+                  f"{'same' if same else 'DIFFERENT'} slots")
+
+
+def benchmark_halls():
+    print(f"hall assignment ({HALLS_TEAMS_COUNT} rows, sofia's teams): the halls' durations in minutes, sequential vs balanced")
+    with tempfile.TemporaryDirectory() as directory:
+        config = get_config(SOFIA)
+        teams = get_teams(config, read_teams_data(config, create_teams_data(directory, HALLS_TEAMS_COUNT)))
+
+    for halls_count in HALLS_COUNTS:
+        # The configured halls with their coordinators, plus halls without specified coordinators
+        halls = config[HALLS][:halls_count] + [{NAME: f"HALL {i}", COORDINATORS: []} for i in range(len(config[HALLS]), halls_count)]
+        line = f"{halls_count} halls:"
+        for hall_assignment in [SEQUENTIAL_HALL_ASSIGNMENT, BALANCED_HALL_ASSIGNMENT]:
+            halls_config = dict(config)
+            halls_config[HALLS] = halls
+            halls_config[HALL_ASSIGNMENT] = hall_assignment
+            random.seed(config[RANDOM_SEED])
+            start = time.perf_counter()
+            slots_by_hall_name = create_slots(halls_config, copy.deepcopy(teams))
+            elapsed = time.perf_counter() - start
+            durations = [get_hall_duration_in_minutes(config, sum(len(slot.teams) for slot in slots)) for slots in slots_by_hall_name.values()]
+            line += f" {hall_assignment} {durations} in {elapsed:.3f}s,"
+        print(line.rstrip(","))
+
+
+def benchmark_search():
+    print(f"search ({SEARCH_TEAMS_COUNT} rows, sofia, {get_workers_count()} workers): candidates vs one schedule run")
+    config = get_config(SOFIA)
+    with tempfile.TemporaryDirectory() as directory:
+        teams_csv_file_path = create_teams_data(directory, SEARCH_TEAMS_COUNT)
+
+        # What a manual re-run does: read the teams, create the slots and write the workbook
+        start = time.perf_counter()
+        teams = get_teams(config, read_teams_data(config, teams_csv_file_path))
+        random.seed(config[RANDOM_SEED])
+        workbook = ScheduleWorkbook(f"{directory}/schedule.xlsx")
+        workbook.add_schedule(config, create_slots(config, teams))
+        workbook.close()
+        run_time = time.perf_counter() - start
+
+    seeds = list(range(SEARCH_CANDIDATES_COUNT))
+    start = time.perf_counter()
+    scores = search_seeds(config, teams, seeds, get_workers_count())
+    search_time = time.perf_counter() - start
+    print(f"one run {run_time:.3f}s, {len(seeds)} candidates {search_time:.3f}s ({len(seeds) / search_time:.0f} per second), best {scores[0]}")
+
+
+def write_cell_by_cell(config, file_path: str, slots_by_hall_name: dict):
+    workbook = xlsxwriter.Workbook(file_path)
+    populate_sheet_cell_by_cell(config, workbook, workbook.add_worksheet("Schedule"), slots_by_hall_name)
+    workbook.close()
+
+
+def write_in_constant_memory(config, file_path: str, slots_by_hall_name: dict):
+    workbook = ScheduleWorkbook(file_path)
+    workbook.add_schedule(config, slots_by_hall_name)
+    workbook.close()
+
+
+def benchmark_workbook():
+    print("workbook (sofia, all rows' teams): write time and peak python memory, in constant memory vs cell by cell")
+    config = get_config(SOFIA)
+    config[SEASON_TYPES] = get_config(SOFIA)[SEASON_TYPES] + get_config(ONLINE)[SEASON_TYPES]
+    with tempfile.TemporaryDirectory() as directory:
+        for teams_count in WORKBOOK_TEAMS_COUNTS:
+            teams = get_teams(config, read_teams_data(config, create_teams_data(directory, teams_count)))
+            random.seed(config[RANDOM_SEED])
+            slots_by_hall_name = create_slots(config, teams)
+
+            line = f"{len(teams)} teams:"
+            for name, write in [("constant memory", write_in_constant_memory), ("cell by cell", write_cell_by_cell)]:
+                file_path = f"{directory}/schedule.xlsx"
+                start = time.perf_counter()
+                write(config, file_path, slots_by_hall_name)
+                elapsed = time.perf_counter() - start
+
+                tracemalloc.start()
+                write(config, file_path, slots_by_hall_name)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                line += f" {name} {elapsed:.3f}s {peak / 2 ** 20:.1f} MB,"
+            print(line.rstrip(","))
+
+
+def benchmark_teams():
+    print(f"teams' loading (sofia, {TEAMS_DATA_EXTRA_COLUMNS_COUNT} other answers' columns): pruned typed columns vs the whole csv")
+    config = get_config(SOFIA)
+    with tempfile.TemporaryDirectory() as directory:
+        for rows_count in TEAMS_DATA_ROWS_COUNTS:
+            csv_file_path = create_teams_data(directory, rows_count, extra_columns_count=TEAMS_DATA_EXTRA_COLUMNS_COUNT)
+
+            start = time.perf_counter()
+            teams = get_teams(config, read_teams_data(config, csv_file_path))
+            teams_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            teams_from_all_columns = get_teams_from_all_columns(config, csv_file_path)
+            teams_from_all_columns_time = time.perf_counter() - start
+
+            same = ([(x.student_name, x.mentor_name, x.coordinator_name) for x in teams] ==
+                    [(x.student_name, x.mentor_name, x.coordinator_name) for x in teams_from_all_columns])
+            print(f"{rows_count} rows ({len(teams)} teams): {teams_time:.3f}s vs {teams_from_all_columns_time:.3f}s, "
+                  f"{'same' if same else 'DIFFERENT'} teams")
+
+
+def benchmark_timeline():
+    print(f"timeline index: random teams of 5 min in a day, {TIMELINE_TEAMS_PER_PERSON} per person")
+    rng = random.Random(0)
+    for teams_count in TIMELINE_TEAMS_COUNTS:
+        people = [f"person {rng.randrange(teams_count // TIMELINE_TEAMS_PER_PERSON)}" for _ in range(teams_count)]
+        starts = [float(rng.randrange(0, 24 * 60, 5)) for _ in range(teams_count)]
+        ends = [x + 5 for x in starts]
+
+        start = time.perf_counter()
+        timeline = TimelineIndex()
+        timeline.add_many(people, starts, ends)
+        overlaps_count = timeline.count_overlaps()
+        count_time = time.perf_counter() - start
+
+        queries = [(rng.choice(people), float(rng.randrange(0, 24 * 60, 5))) for _ in range(1000)]
+        start = time.perf_counter()
+        free = sum(timeline.is_free(person, query_start, query_start + 5) for person, query_start in queries)
+        query_time = time.perf_counter() - start
+        print(f"{teams_count} teams: index and overlaps {count_time:.3f}s ({overlaps_count} overlaps), "
+              f"1000 free time queries {query_time:.3f}s ({free} free)")
+
+
+def benchmark_update():
+    print(f"update (sofia, one team drops out and one is added): incremental vs a new schedule, "
+          f"best of {UPDATE_REPEATS} times and changed teams")
+    config = get_config(SOFIA)
+    for teams_count in TEAMS_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            teams = get_teams(config, read_teams_data(config, create_teams_data(directory, teams_count)))
+        random.seed(config[RANDOM_SEED])
+        old_teams_by_hall_name = get_teams_by_hall_name(create_slots(config, copy.deepcopy(teams)))
+
+        rng = random.Random(0)
+        updated_teams = list(teams)
+        updated_teams.pop(rng.randrange(len(updated_teams)))
+        updated_teams.append(Team(0, "Нов ученик", "Нов ментор", updated_teams[0].coordinator_name, ""))
+
+        update_time = math.inf
+        create_time = math.inf
+        for _ in range(UPDATE_REPEATS):
+            new_teams = copy.deepcopy(updated_teams)
+            start = time.perf_counter()
+            teams_by_hall_name = update_halls_teams(old_teams_by_hall_name, new_teams, config[HALLS])
+            create_halls_slots(config, teams_by_hall_name)
+            update_time = min(update_time, time.perf_counter() - start)
+
+            new_teams = copy.deepcopy(updated_teams)
+            random.seed(config[RANDOM_SEED])
+            start = time.perf_counter()
+            slots_by_hall_name = create_slots(config, new_teams)
+            create_time = min(create_time, time.perf_counter() - start)
+
+        update_changes = get_schedule_changes(config, old_teams_by_hall_name, teams_by_hall_name)
+        create_changes = get_schedule_changes(config, old_teams_by_hall_name, get_teams_by_hall_name(slots_by_hall_name))
+        print(f"{len(teams)} teams: update {update_time * 1000:.1f} ms, {len(update_changes)} changed, "
+              f"new schedule {create_time * 1000:.1f} ms, {len(create_changes)} changed")
+
+
+BENCHMARKS = {
+    "slots": benchmark_slots,
+    "halls": benchmark_halls,
+    "search": benchmark_search,
+    "workbook": benchmark_workbook,
+    "teams": benchmark_teams,
+    "timeline": benchmark_timeline,
+    "update": benchmark_update,
+}
+
+
+if __name__ == "__main__":
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or BENCHMARKS.keys()
+    for name in names:
+        BENCHMARKS[name]()
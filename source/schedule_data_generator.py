@@ -0,0 +1,61 @@
+import csv
+import os
+import random
+import sys
+from csv_reader import get_column_index
+from schedule import (ACTIVE_COLUMN, COORDINATOR_COLUMN, COORDINATORS, HALLS, MENTOR_COLUMN, ONLINE, SEASON_TYPE_COLUMN,
+                      SEASON_TYPES, SOFIA, STUDENT_COLUMN, TEAMS_FILE_NAME, get_config)
+
+# Writes a synthetic schedule_teams.csv with the column layout from schedule.json.
+# Usage: python schedule_data_generator.py <teams count> [output directory] [random seed]
+
+RANDOM_SEED = 0
+TEAMS_PER_COORDINATOR = 8
+ACTIVE = "Активен"
+INACTIVE = "Неактивен"
+INACTIVE_RATIO = 0.1
+EXTRA_COLUMN_WORDS = ["проект", "ментор", "среща", "идея", "екип", "цел", "резултат", "време", "въпрос", "отговор"]
+EXTRA_COLUMN_MAX_WORDS = 20
+
+
+def create_teams_data(output_directory: str, teams_count: int, random_seed: int = RANDOM_SEED, extra_columns_count: int = 0):
+    # Returns the path of the teams' csv file. The teams are spread over both seasons and their coordinators
+    # include the halls' specified ones. 'extra_columns_count' free text columns, like the export's other answers,
+    # are added after the schedule's columns.
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    rng = random.Random(random_seed)
+    extra_rng = random.Random(random_seed + 1)  # the teams don't depend on the extra columns
+    sofia_config = get_config(SOFIA)
+    online_config = get_config(ONLINE)
+    columns = {name: get_column_index(sofia_config[name])
+               for name in [ACTIVE_COLUMN, STUDENT_COLUMN, MENTOR_COLUMN, COORDINATOR_COLUMN, SEASON_TYPE_COLUMN]}
+    season_types = sofia_config[SEASON_TYPES] + online_config[SEASON_TYPES]
+    halls_coordinators = [c for hall in sofia_config[HALLS] + online_config[HALLS] for c in hall[COORDINATORS]]
+    coordinators_count = max(len(halls_coordinators), teams_count // TEAMS_PER_COORDINATOR)
+    coordinators = halls_coordinators + [f"Координатор {i}" for i in range(coordinators_count - len(halls_coordinators))]
+
+    csv_file_path = f"{output_directory}/{TEAMS_FILE_NAME}"
+    with open(csv_file_path, mode="w", encoding="utf-8", newline="") as file_stream:
+        writer = csv.writer(file_stream, delimiter=',', quotechar='"')
+        columns_count = max(columns.values()) + 1 + extra_columns_count
+        writer.writerow([f"Column {i + 1}" for i in range(columns_count)])
+        for i in range(teams_count):
+            row = [""] * columns_count
+            row[columns[ACTIVE_COLUMN]] = INACTIVE if rng.random() < INACTIVE_RATIO else ACTIVE
+            row[columns[STUDENT_COLUMN]] = f"Ученик {i}"
+            row[columns[MENTOR_COLUMN]] = f"Ментор {i}"
+            row[columns[COORDINATOR_COLUMN]] = rng.choice(coordinators)
+            row[columns[SEASON_TYPE_COLUMN]] = rng.choice(season_types)
+            for j in range(columns_count - extra_columns_count, columns_count):
+                row[j] = " ".join(extra_rng.choices(EXTRA_COLUMN_WORDS, k=extra_rng.randint(1, EXTRA_COLUMN_MAX_WORDS)))
+            writer.writerow(row)
+    return csv_file_path
+
+
+if __name__ == "__main__":
+    teams_count = int(sys.argv[1])
+    output_directory = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
+    random_seed = int(sys.argv[3]) if len(sys.argv) > 3 else RANDOM_SEED
+    print(f"written {create_teams_data(output_directory, teams_count, random_seed)}")
@@ -1,10 +1,10 @@
 import io
-import math
 import os
-import csv
 import docx
 import matplotlib.pyplot as plt
 import numpy
+from csv_reader import get_column_index, read_records
+from csv_snapshot import get_snapshots_directory
 
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
@@ -13,15 +13,6 @@ RESPONSES_FILE_NAME = "self_evaluations.csv"
 RESPONSES_FILE_PATH = f"{CURRENT_DIRECTORY}/{RESPONSES_FILE_NAME}"
 
 
-def get_column_index(column):
-    # 26 number system where [A...Z] is mapped to [1...26]
-    decimal_value = 0
-    for idx in reversed(range(0, len(column))):
-        decimal_value += (ord(column[idx]) - ord("A") + 1) * math.pow(26, len(column) - idx - 1)
-
-    return int(decimal_value - 1)  # the index is the decimal value minus 1
-
-
 IMPORTANT_THINGS = get_column_index("AI")
 STUDENT_NAME = get_column_index("AJ")
 SEND_TO_MENTOR = get_column_index("AK")
@@ -69,6 +60,16 @@ column_titles[34] = "Напиши най - важните 3 неща за теб
 column_titles[35] = "Казвам се..."
 column_titles[36] = "Съгласен съм резултатът от моя тест да бъде даден за информация на моя ментор"
 
+# The [Важност] and [Увереност] answers are in the columns [SCORES_START, SCORES_END)
+SCORES_START = 2
+SCORES_END = 34
+RESPONSES_COLUMNS = {
+    "important_things": IMPORTANT_THINGS,
+    "student_name": STUDENT_NAME,
+    "send_to_mentor": SEND_TO_MENTOR,
+    "scores": list(range(SCORES_START, SCORES_END)),
+}
+
 
 def create_bar_chart(title, bar_labels, data):
     x = numpy.arange(len(bar_labels))  # the label locations
@@ -97,7 +98,12 @@ def create_bar_chart(title, bar_labels, data):
     return fig_bytes
 
 
-def try_create_doc(student_name, row_data, file_path):
+def get_scores(record, start, end):
+    # The answers in every second column of [start, end)
+    return [int(x) for x in record.scores[start - SCORES_START:end - SCORES_START:2]]
+
+
+def try_create_doc(student_name, record, file_path):
     doc = docx.Document()
 
     # heading
@@ -106,13 +112,13 @@ def try_create_doc(student_name, row_data, file_path):
     # 3 important things
     p = doc.add_paragraph()
     p.add_run(f"{column_titles[IMPORTANT_THINGS]}").bold = True
-    doc.add_paragraph(f'"{row_data[IMPORTANT_THINGS]}"')
+    doc.add_paragraph(f'"{record.important_things}"')
 
     # communication
     bar_labels = [x.replace(" ", "\n") for x in column_titles[2:12:2]]
     data = {
-        "Важност - начало": [int(x) for x in row_data[2:12:2]],
-        "Увереност - начало": [int(x) for x in row_data[3:12:2]],
+        "Важност - начало": get_scores(record, 2, 12),
+        "Увереност - начало": get_scores(record, 3, 12),
     }
 
     png = create_bar_chart("Комуникация", bar_labels, data)
@@ -122,8 +128,8 @@ def try_create_doc(student_name, row_data, file_path):
     # business skills
     bar_labels = [x.replace(" ", "\n") for x in column_titles[12:24:2]]
     data = {
-        "Важност - начало": [int(x) for x in row_data[12:24:2]],
-        "Увереност - начало": [int(x) for x in row_data[13:24:2]],
+        "Важност - начало": get_scores(record, 12, 24),
+        "Увереност - начало": get_scores(record, 13, 24),
     }
 
     png = create_bar_chart("Бизнес умения", bar_labels, data)
@@ -132,8 +138,8 @@ def try_create_doc(student_name, row_data, file_path):
     # personal effectiveness
     bar_labels = [x.replace(" ", "\n") for x in column_titles[24:34:2]]
     data = {
-        "Важност - начало": [int(x) for x in row_data[24:34:2]],
-        "Увереност - начало": [int(x) for x in row_data[25:34:2]],
+        "Важност - начало": get_scores(record, 24, 34),
+        "Увереност - начало": get_scores(record, 25, 34),
     }
 
     png = create_bar_chart("Лична ефективност", bar_labels, data)
@@ -147,21 +153,15 @@ def create_docs(output_directory, responses_file_path):
     if not os.path.exists(output_directory):
         os.mkdir(output_directory)
 
-    with open(responses_file_path, encoding="utf-8", mode="r") as fstream:
-        reader = csv.reader(fstream, delimiter=',', quotechar='"')
-
-        for idx, row in enumerate(reader):
-            if idx == 0:
-                continue  # skip first row
-
-            student_name = row[STUDENT_NAME].replace("/", "").strip()
-            file_path = ""
-            if row[SEND_TO_MENTOR].startswith("Не"):
-                file_path = f"{output_directory}/{student_name}_НЕ.docx".replace("\\", "/")
-            else:
-                file_path = f"{output_directory}/{student_name}.docx".replace("\\", "/")
+    for record in read_records(responses_file_path, RESPONSES_COLUMNS, snapshots_directory=get_snapshots_directory()):
+        student_name = record.student_name.replace("/", "").strip()
+        file_path = ""
+        if record.send_to_mentor.startswith("Не"):
+            file_path = f"{output_directory}/{student_name}_НЕ.docx".replace("\\", "/")
+        else:
+            file_path = f"{output_directory}/{student_name}.docx".replace("\\", "/")
 
-            try_create_doc(student_name, row, file_path)
+        try_create_doc(student_name, record, file_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+import hashlib
+import numpy
+import os
+
+
+def hash_fields(*fields):
+    return hashlib.sha256("\x1f".join(str(field) for field in fields).encode("utf-8")).hexdigest()
+
+
+class SimilarityState:
+    """
+    The similarity percents of the last matching run together with a content hash of every student (row) and mentor (column).
+    'signature' identifies the model and weights the percents were computed with.
+    """
+
+    def __init__(self, signature: str, students_hashes: list[str], mentors_hashes: list[str], percents: numpy.ndarray):
+        self.signature = signature
+        self.students_hashes = students_hashes
+        self.mentors_hashes = mentors_hashes
+        self.percents = percents
+
+    @staticmethod
+    def load(file_path: str, signature: str):
+        # Returns None when there's no state or it was computed with a different model or weights
+        if not os.path.exists(file_path):
+            return None
+
+        with numpy.load(file_path) as data:
+            if str(data["signature"]) != signature:
+                return None
+            return SimilarityState(signature, data["students_hashes"].tolist(), data["mentors_hashes"].tolist(), data["percents"])
+
+    def save(self, file_path: str):
+        temp_file_path = f"{file_path}.tmp.npz"
+        numpy.savez(temp_file_path, signature=numpy.array(self.signature),
+                    students_hashes=numpy.array(self.students_hashes, dtype=str),
+                    mentors_hashes=numpy.array(self.mentors_hashes, dtype=str),
+                    percents=self.percents)
+        os.replace(temp_file_path, file_path)
+
+
+def update_similarity_state(previous: SimilarityState, signature: str, students_hashes: list[str], mentors_hashes: list[str], score):
+    """
+    Builds the similarity state for the current people, reusing the percents of the unchanged ones from 'previous'.
+    score(students_indices, mentors_indices) computes the percents block of the given rows and columns.
+    Returns the new state and the number of students and mentors that had to be scored.
+    """
+    percents = numpy.zeros((len(students_hashes), len(mentors_hashes)), dtype=numpy.int16)
+    previous_rows = dict()
+    previous_cols = dict()
+    if previous is not None:
+        previous_rows = {h: i for i, h in enumerate(previous.students_hashes)}
+        previous_cols = {h: i for i, h in enumerate(previous.mentors_hashes)}
+
+    kept_students = [i for i, h in enumerate(students_hashes) if h in previous_rows]
+    kept_mentors = [i for i, h in enumerate(mentors_hashes) if h in previous_cols]
+    new_students = [i for i, h in enumerate(students_hashes) if h not in previous_rows]
+    new_mentors = [i for i, h in enumerate(mentors_hashes) if h not in previous_cols]
+
+    # Rows and columns of people that are gone are simply not copied over
+    if kept_students and kept_mentors:
+        rows = [previous_rows[students_hashes[i]] for i in kept_students]
+        cols = [previous_cols[mentors_hashes[i]] for i in kept_mentors]
+        percents[numpy.ix_(kept_students, kept_mentors)] = previous.percents[numpy.ix_(rows, cols)]
+
+    all_mentors = list(range(len(mentors_hashes)))
+    if new_students and all_mentors:
+        percents[new_students, :] = score(new_students, all_mentors)
+    if kept_students and new_mentors:
+        percents[numpy.ix_(kept_students, new_mentors)] = score(kept_students, new_mentors)
+
+    state = SimilarityState(signature, list(students_hashes), list(mentors_hashes), percents)
+    return state, len(new_students), len(new_mentors)
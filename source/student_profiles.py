@@ -1,7 +1,7 @@
 import os
-import csv
 import docx
-import math
+from csv_reader import get_column_index, read_records
+from csv_snapshot import get_snapshots_directory
 
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)).replace("\\", "/")
@@ -10,15 +10,6 @@ REGISTER_FILE_NAME = "student_register.csv"
 REGISTER_FILE_PATH = f"{CURRENT_DIRECTORY}/{REGISTER_FILE_NAME}"
 
 
-def get_column_index(column):
-    # 26 number system where [A...Z] is mapped to [1...26]
-    decimal_value = 0
-    for idx in reversed(range(0, len(column))):
-        decimal_value += (ord(column[idx]) - ord("A") + 1) * math.pow(26, len(column) - idx - 1)
-
-    return int(decimal_value - 1)  # the index is the decimal value minus 1
-
-
 CONFIRMED = get_column_index("O")
 STUDENT_NAME = get_column_index("AF")
 AGE = get_column_index("AL")
@@ -71,9 +62,17 @@ column_titles = {
     HEARD_OF_ABLE_MENTOR: "Научил/а за ABLE Mentor от?"
 }
 
+# The columns that go in the profile's table, in the columns' order
+ANSWER_COLUMNS = [idx for idx in sorted(column_titles) if idx != CONFIRMED and idx != STUDENT_NAME and idx <= HEARD_OF_ABLE_MENTOR]
+REGISTER_COLUMNS = {
+    "confirmed": CONFIRMED,
+    "student_name": STUDENT_NAME,
+    "answers": ANSWER_COLUMNS,
+}
+
 
-def try_create_doc(row_data, file_path):
-    if row_data[CONFIRMED] != "Да":
+def try_create_doc(record, file_path):
+    if record.confirmed != "Да":
         return False
 
     doc = docx.Document()
@@ -81,18 +80,10 @@ def try_create_doc(row_data, file_path):
 
     table = doc.add_table(rows=0, cols=2)
 
-    for idx in range(0, len(row_data)):
-        if (idx == CONFIRMED or
-            idx == STUDENT_NAME or
-                idx not in column_titles):
-            continue
-
-        if idx > HEARD_OF_ABLE_MENTOR:
-            break
-
+    for idx, answer in zip(ANSWER_COLUMNS, record.answers):
         table_row = table.add_row().cells
         table_row[0].text = column_titles[idx]
-        table_row[1].text = row_data[idx]
+        table_row[1].text = answer
 
     doc.save(file_path)
     return True
@@ -104,18 +95,11 @@ def create_docs():
 
     doc_counter = 1  # Start a simple counter for numbering the files
 
-    with open(REGISTER_FILE_PATH, encoding="utf-8", mode="r") as fstream:
-        reader = csv.reader(fstream, delimiter=',', quotechar='"')
-
-        for idx, row in enumerate(reader):
-            if idx == 0:
-                continue
-
-            student_name = row[STUDENT_NAME]
-            file_path = f"{OUTPUT_DIRECTORY}/{doc_counter}_{student_name}.docx"
+    for record in read_records(REGISTER_FILE_PATH, REGISTER_COLUMNS, snapshots_directory=get_snapshots_directory()):
+        file_path = f"{OUTPUT_DIRECTORY}/{doc_counter}_{record.student_name}.docx"
 
-            if try_create_doc(row, file_path):
-                doc_counter += 1  # Increment the counter only if the document is created successfully
+        if try_create_doc(record, file_path):
+            doc_counter += 1  # Increment the counter only if the document is created successfully
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+import numpy
+import pytest
+
+from encoding_pool import EncodingPool
+
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from match import MODEL_NAME, load_model  # noqa: E402
+
+BATCH_SIZE = 8
+# The workers run torch on one thread each and match.py's serial model on all of them, the sums can be
+# ordered differently, so the embeddings are compared with a tolerance
+RELATIVE_TOLERANCE = 1e-4
+ABSOLUTE_TOLERANCE = 1e-5
+
+
+def create_texts(count: int):
+    # Many texts of the same length, so that the order of the ties decides which texts share a batch
+    rng = numpy.random.default_rng(0)
+    words = ["robotics", "music", "chess", "biology", "art", "web", "games", "history", "math", "data"]
+    return [" ".join(rng.choice(words, size=rng.integers(1, 4))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("workers_count", [1, 2])
+def test_encode_equals_serial_encode(workers_count: int):
+    texts = create_texts(BATCH_SIZE * 10 + 3)
+    serial_embeddings = load_model().encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True)
+
+    with EncodingPool(MODEL_NAME, workers_count, BATCH_SIZE) as pool:
+        embeddings = pool.encode(texts)
+    numpy.testing.assert_allclose(embeddings, serial_embeddings, rtol=RELATIVE_TOLERANCE, atol=ABSOLUTE_TOLERANCE)
+
+
+def test_encode_single_text():
+    serial_embedding = load_model().encode("robotics and music")
+
+    with EncodingPool(MODEL_NAME, 1, BATCH_SIZE) as pool:
+        embedding = pool.encode("robotics and music")
+    numpy.testing.assert_allclose(embedding, serial_embedding, rtol=RELATIVE_TOLERANCE, atol=ABSOLUTE_TOLERANCE)
@@ -0,0 +1,47 @@
+from schedule import HALLS, SOFIA, Team, get_config, update_halls_teams
+
+
+def create_team(student_name: str, coordinator_name: str):
+    return Team(0, student_name, f"{student_name} mentor", coordinator_name, "")
+
+
+def get_halls_students(teams_by_hall_name: dict):
+    return {hall_name: [team.student_name for team in teams] for hall_name, teams in teams_by_hall_name.items()}
+
+
+def create_old_teams_by_hall_name():
+    # OPERA and BALLROOM as in schedule.json, "Али" is specified for OPERA and "Биляна" for BALLROOM
+    return {
+        "OPERA": [create_team("S1", "Али"), create_team("S2", "Али"), create_team("S3", "Друг")],
+        "BALLROOM": [create_team("S4", "Биляна"), create_team("S5", "Биляна")],
+    }
+
+
+def test_added_team_of_specified_coordinator_goes_to_its_hall():
+    # The hole S3 leaves in OPERA doesn't take the team of a coordinator specified for BALLROOM
+    old_teams_by_hall_name = create_old_teams_by_hall_name()
+    teams = [team for hall_teams in old_teams_by_hall_name.values() for team in hall_teams if team.student_name != "S3"]
+    teams.append(create_team("S6", "Биляна"))
+
+    teams_by_hall_name = update_halls_teams(old_teams_by_hall_name, teams, get_config(SOFIA)[HALLS])
+    assert get_halls_students(teams_by_hall_name) == {"OPERA": ["S1", "S2"], "BALLROOM": ["S4", "S5", "S6"]}
+
+
+def test_added_teams_of_other_coordinators_fill_the_holes():
+    old_teams_by_hall_name = create_old_teams_by_hall_name()
+    teams = [team for hall_teams in old_teams_by_hall_name.values() for team in hall_teams if team.student_name != "S3"]
+    teams.append(create_team("S6", "Нов"))
+
+    teams_by_hall_name = update_halls_teams(old_teams_by_hall_name, teams, get_config(SOFIA)[HALLS])
+    assert get_halls_students(teams_by_hall_name) == {"OPERA": ["S1", "S2", "S6"], "BALLROOM": ["S4", "S5"]}
+
+
+def test_balance_keeps_specified_coordinators_teams():
+    # BALLROOM gets too big, its team of another coordinator moves to OPERA, the specified ones stay
+    old_teams_by_hall_name = create_old_teams_by_hall_name()
+    old_teams_by_hall_name["BALLROOM"].append(create_team("S6", "Друг"))
+    teams = [team for hall_teams in old_teams_by_hall_name.values() for team in hall_teams]
+    teams += [create_team("S7", "Биляна"), create_team("S8", "Биляна")]
+
+    teams_by_hall_name = update_halls_teams(old_teams_by_hall_name, teams, get_config(SOFIA)[HALLS])
+    assert get_halls_students(teams_by_hall_name) == {"OPERA": ["S1", "S2", "S3", "S6"], "BALLROOM": ["S4", "S5", "S8", "S7"]}
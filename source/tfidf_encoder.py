@@ -0,0 +1,97 @@
+import numpy
+import zlib
+from scipy import sparse
+
+
+DEFAULT_DIMENSION = 2 ** 12
+DEFAULT_NGRAM_SIZES = (2, 3, 4)
+
+
+class SparseRow:
+    """
+    One row of a sparse matrix, the columns of its non-zero values and the values (views into the matrix's arrays).
+    It's what a person keeps of a sparse encoded field, a row of a csr_matrix costs a lot more to take out.
+    """
+
+    __slots__ = ("indices", "data", "dimension")
+
+    def __init__(self, indices: numpy.ndarray, data: numpy.ndarray, dimension: int):
+        self.indices = indices
+        self.data = data
+        self.dimension = dimension
+
+
+def split_rows(matrix: sparse.csr_matrix) -> list[SparseRow]:
+    bounds = matrix.indptr.tolist()
+    return [SparseRow(matrix.indices[start:end], matrix.data[start:end], matrix.shape[1])
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def stack_rows(rows: list[SparseRow]) -> sparse.csr_matrix:
+    indptr = numpy.zeros(len(rows) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(row.indices) for row in rows], out=indptr[1:])
+    indices = numpy.concatenate([row.indices for row in rows]) if rows else numpy.zeros(0, dtype=numpy.int32)
+    data = numpy.concatenate([row.data for row in rows]) if rows else numpy.zeros(0, dtype=numpy.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), rows[0].dimension if rows else 0))
+
+
+def normalize_sparse_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    # L2 normalizes the rows in place, empty rows stay empty
+    norms = numpy.sqrt(numpy.asarray(matrix.multiply(matrix).sum(axis=1), dtype=numpy.float32).ravel())
+    norms[norms == 0] = 1
+    matrix.data /= numpy.repeat(norms, numpy.diff(matrix.indptr))
+    return matrix
+
+
+class TfidfEncoder:
+    """
+    TF-IDF over character n-grams, a lightweight alternative to the SentenceTransformer models with the same encode().
+    The n-grams are taken inside words only (padded with spaces), which works for Bulgarian and English alike, and
+    hashed into 'dimension' columns, so no vocabulary has to be kept. A text has a few hundred n-grams out of the
+    thousands of columns, so the vectors are sparse (scipy csr_matrix) and never dense.
+    The IDF is fitted on the texts of every encode() call, so all texts of a field have to be encoded together.
+    """
+
+    def __init__(self, dimension: int = DEFAULT_DIMENSION, ngram_sizes: tuple = DEFAULT_NGRAM_SIZES):
+        self.dimension = dimension
+        self.ngram_sizes = ngram_sizes
+        self._ngram_columns = dict()
+
+    def _get_columns(self, text: str):
+        columns = list()
+        for word in text.lower().split():
+            padded_word = f" {word} "
+            for size in self.ngram_sizes:
+                for start in range(0, max(1, len(padded_word) - size + 1)):
+                    ngram = padded_word[start:start + size]
+                    column = self._ngram_columns.get(ngram)
+                    if column is None:
+                        column = zlib.crc32(ngram.encode("utf-8")) % self.dimension  # stable across runs, unlike hash()
+                        self._ngram_columns[ngram] = column
+                    columns.append(column)
+        return columns
+
+    def encode(self, texts: list[str], convert_to_numpy: bool = True, **kwargs) -> sparse.csr_matrix:
+        # Returns the L2 normalized vectors as a sparse (texts x dimension) float32 matrix, a single text's as a SparseRow
+        if isinstance(texts, str):
+            return split_rows(self.encode([texts]))[0]
+
+        # The counts are built from (row, column) pairs, the repeated pairs are summed
+        rows = list()
+        columns = list()
+        for row, text in enumerate(texts):
+            text_columns = self._get_columns(text)
+            rows += [row] * len(text_columns)
+            columns += text_columns
+        vectors = sparse.csr_matrix((numpy.ones(len(columns), dtype=numpy.float32),
+                                     (numpy.array(rows, dtype=numpy.int64), numpy.array(columns, dtype=numpy.int64))),
+                                    shape=(len(texts), self.dimension))
+        vectors.sum_duplicates()
+
+        # Sublinear tf: 1 + log(count), only the non-zero counts are stored
+        vectors.data = numpy.log(vectors.data) + 1
+        document_frequencies = numpy.bincount(vectors.indices, minlength=self.dimension)
+        inverse_document_frequencies = numpy.log((1 + len(texts)) / (1 + document_frequencies)) + 1
+        vectors.data *= inverse_document_frequencies.astype(numpy.float32)[vectors.indices]
+
+        return normalize_sparse_rows(vectors)
@@ -0,0 +1,118 @@
+import numpy
+
+
+class Overlap:
+    def __init__(self, person: str, start: float, end: float, label, other_start: float, other_end: float, other_label):
+        self.person = person
+        self.start = start
+        self.end = end
+        self.label = label
+        self.other_start = other_start
+        self.other_end = other_end
+        self.other_label = other_label
+
+    def __repr__(self):
+        return f"({self.person}, {self.label} [{self.start:g}, {self.end:g}), {self.other_label} [{self.other_start:g}, {self.other_end:g}))"
+
+
+class TimelineIndex:
+    """
+    The people's busy intervals [start, end), from any number of halls, seasons and events.
+    The intervals are sorted by person and start once, in O(n log n), after the last addition. A sweep over them
+    with the running latest end finds every interval that starts before an earlier one of the same person ends,
+    and a binary search answers whether a person is free at a given time.
+    """
+
+    def __init__(self):
+        self.people_codes = dict()
+        self.people = list()
+        self.codes = list()
+        self.starts = list()
+        self.ends = list()
+        self.labels = list()
+        self._index = None
+
+    def add(self, person: str, start: float, end: float, label=None):
+        code = self.people_codes.get(person)
+        if code is None:
+            code = self.people_codes[person] = len(self.people)
+            self.people.append(person)
+        self.codes.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.labels.append(label)
+        self._index = None
+
+    def add_many(self, people: list, starts: list, ends: list, labels: list = None):
+        for person in people:
+            if person not in self.people_codes:
+                self.people_codes[person] = len(self.people)
+                self.people.append(person)
+        self.codes += [self.people_codes[person] for person in people]
+        self.starts += starts
+        self.ends += ends
+        self.labels += labels if labels is not None else [None] * len(people)
+        self._index = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _get_index(self):
+        # The intervals' order by person and start, their starts and ends, and the running latest end within
+        # every person's intervals with the interval it belongs to
+        if self._index is None:
+            codes = numpy.array(self.codes, dtype=numpy.int64)
+            starts = numpy.array(self.starts, dtype=numpy.float64)
+            ends = numpy.array(self.ends, dtype=numpy.float64)
+            order = numpy.lexsort((starts, codes))
+            codes, starts, ends = codes[order], starts[order], ends[order]
+
+            # Shifting every person's times past the previous person's ones keeps the running maximum
+            # within the person's intervals
+            positions = numpy.arange(len(order))
+            latest_positions = positions
+            if len(order):
+                span = ends.max() - starts.min() + 1
+                shifted_ends = codes * span + (ends - starts.min())
+                latest_ends = numpy.maximum.accumulate(shifted_ends)
+                latest_positions = numpy.maximum.accumulate(numpy.where(shifted_ends == latest_ends, positions, 0))
+            self._index = (order, codes, starts, ends, latest_positions)
+        return self._index
+
+    def find_overlaps(self):
+        # Every interval that starts before an earlier (or equal) interval of the same person ends,
+        # with the earlier interval that ends last
+        order, codes, starts, ends, latest_positions = self._get_index()
+        if len(order) < 2:
+            return []
+
+        previous = latest_positions[:-1]
+        overlapping = (codes[1:] == codes[previous]) & (starts[1:] < ends[previous])
+        overlaps = list()
+        for i in (numpy.flatnonzero(overlapping) + 1).tolist():
+            j = int(previous[i - 1])
+            overlaps.append(Overlap(self.people[codes[i]], float(starts[i]), float(ends[i]), self.labels[order[i]],
+                                    float(starts[j]), float(ends[j]), self.labels[order[j]]))
+        return overlaps
+
+    def count_overlaps(self):
+        order, codes, starts, ends, latest_positions = self._get_index()
+        if len(order) < 2:
+            return 0
+        previous = latest_positions[:-1]
+        return int(numpy.count_nonzero((codes[1:] == codes[previous]) & (starts[1:] < ends[previous])))
+
+    def is_free(self, person: str, start: float, end: float):
+        # Whether none of the person's intervals overlaps [start, end)
+        code = self.people_codes.get(person)
+        if code is None:
+            return True
+
+        order, codes, starts, ends, latest_positions = self._get_index()
+        first = numpy.searchsorted(codes, code, side="left")
+        last = numpy.searchsorted(codes, code, side="right")
+        # The person's intervals that start before 'end', the latest of them has to end by 'start'
+        position = first + numpy.searchsorted(starts[first:last], end, side="left")
+        if position == first:
+            return True
+        return bool(ends[latest_positions[position - 1]] <= start)